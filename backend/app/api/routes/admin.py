@@ -1,35 +1,96 @@
 from fastapi import APIRouter, Depends
 from ...config import settings
 from ...deps import get_tenant_id
-from ...services.registry import load_records, rewrite_records
+from ...services.registry import load_records, update_records
+from ...services.vectorstore import get_embed_cache, query_embed_stats
+from ...services.executors import executor_stats
+from ...services.answer_cache import get_answer_cache
+from ...services.sse import stream_stats
+from ...services.circuit_breaker import breaker_stats
+from ...services.admission import get_llm_limiter
+from ...services.singleflight import singleflight_stats
 
 router = APIRouter()
 
 @router.post("/admin/registry/cleanup")
 def cleanup_registry(tenant_id: str = Depends(get_tenant_id)):
-    records = load_records(settings.app_data_dir)
+    records = load_records(settings.app_data_dir, tenant_id=tenant_id)
+    taken = {r.get("file_id") for r in records}
 
-    fixed = []
-    changed = 0
+    updates = {}
+    conflicts = []
+    skipped = 0
 
     for r in records:
-        # keep other tenants untouched
-        if r.get("tenant_id") != tenant_id:
-            fixed.append(r)
+        fid = r.get("file_id")
+        if not isinstance(fid, str):
+            # no file_id to address the row by; nothing we can fix here
+            skipped += 1
             continue
 
-        fr = dict(r)
+        fix = {}
+        if fid.endswith(".pdf"):
+            new_id = fid[:-4]
+            if new_id in taken:
+                # renaming would collide with another record (unique per tenant); leave both as they are
+                conflicts.append({"file_id": fid, "conflicts_with": new_id})
+            else:
+                fix["file_id"] = new_id
+                taken.discard(fid)
+                taken.add(new_id)
 
-        fid = fr.get("file_id")
-        if isinstance(fid, str) and fid.endswith(".pdf"):
-            fr["file_id"] = fid[:-4]
-            changed += 1
+        if not r.get("filename") and r.get("stored_name"):
+            fix["filename"] = r["stored_name"]
 
-        if not fr.get("filename"):
-            fr["filename"] = fr.get("stored_name")
-            changed += 1
+        if fix:
+            updates[(tenant_id, fid)] = fix
 
-        fixed.append(fr)
+    # only this tenant's rows are touched, in one transaction
+    changed = update_records(settings.app_data_dir, updates)
+    return {"tenant_id": tenant_id, "changed": changed, "conflicts": conflicts, "skipped": skipped}
 
-    rewrite_records(settings.app_data_dir, fixed)
-    return {"tenant_id": tenant_id, "changed": changed}
+
+@router.get("/admin/embed-cache/stats")
+def embed_cache_stats(tenant_id: str = Depends(get_tenant_id)):
+    cache = get_embed_cache()
+    if cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **cache.stats()}
+
+
+@router.get("/admin/query-batcher/stats")
+def query_batcher_stats(tenant_id: str = Depends(get_tenant_id)):
+    return query_embed_stats()
+
+
+@router.get("/admin/executors/stats")
+def executors_stats(tenant_id: str = Depends(get_tenant_id)):
+    return executor_stats()
+
+
+@router.get("/admin/answer-cache/stats")
+def answer_cache_stats(tenant_id: str = Depends(get_tenant_id)):
+    cache = get_answer_cache()
+    if cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **cache.stats()}
+
+
+@router.get("/admin/streams/stats")
+def streams_stats(tenant_id: str = Depends(get_tenant_id)):
+    return stream_stats.stats()
+
+
+@router.get("/admin/llm/breakers")
+def llm_breakers(tenant_id: str = Depends(get_tenant_id)):
+    return breaker_stats()
+
+
+@router.get("/admin/llm/queue")
+def llm_queue(tenant_id: str = Depends(get_tenant_id)):
+    return get_llm_limiter().stats()
+
+
+@router.get("/admin/singleflight/stats")
+def inflight_stats(tenant_id: str = Depends(get_tenant_id)):
+    return singleflight_stats()
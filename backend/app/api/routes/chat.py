@@ -1,11 +1,29 @@
 import logging
-from fastapi import APIRouter, Depends
+from typing import Dict
+
+from fastapi import APIRouter, Depends, HTTPException
+from starlette.concurrency import run_in_threadpool
 
 from ...deps import get_tenant_id
 from ...schemas.chat import ChatRequest, ChatResponse, Citation
-from ...services.rag import retrieve, build_context, make_citations
+from ...services.rag import (
+    MIN_CONTINUATION_TOKENS,
+    UnknownFiles,
+    build_context,
+    continuation_prompt,
+    continuation_sep,
+    make_citations,
+    remaining_tokens,
+    aretrieve,
+    resolve_file_ids,
+)
 from ...services.guardrails import should_refuse
-from ...services.llm import llm_generate
+from ...services.llm import allm_generate
+from ...services.admission import QueueFull, QueueTimeout, allm_slot
+from ...services.answer_cache import get_answer_cache
+from ...services.singleflight import flight_key, get_chat_flights
+from ...services.summaries import get_summary, is_document_summary_request
+from ...services.vectorstore import embed_query
 from ...services.timing import T
 from ...config import settings
 
@@ -53,7 +71,7 @@ def is_summary_question(q: str) -> bool:
 
 
 @router.post("/chat", response_model=ChatResponse)
-def chat(req: ChatRequest, tenant_id: str = Depends(get_tenant_id)):
+async def chat(req: ChatRequest, tenant_id: str = Depends(get_tenant_id)):
     t = T("chat")
 
     summary_mode = is_summary_question(req.question)
@@ -69,24 +87,80 @@ def chat(req: ChatRequest, tenant_id: str = Depends(get_tenant_id)):
         summary_mode,
     )
 
-    pairs = retrieve(
-        req.question,
-        top_k=top_k,
-        file_ids=req.file_ids,
-        tenant_id=tenant_id,
+    try:
+        file_ids = await run_in_threadpool(resolve_file_ids, req.file_ids, tenant_id=tenant_id)
+    except UnknownFiles as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+    flights = get_chat_flights()
+    if flights is None:
+        return await _answer(req, tenant_id, file_ids, summary_mode=summary_mode, top_k=top_k, t=t)
+
+    # Identical requests in flight wait for one retrieval + generation
+    return await flights.do(
+        flight_key(tenant_id, file_ids, req.question, top_k=top_k, max_tokens=req.max_tokens),
+        lambda: _answer(req, tenant_id, file_ids, summary_mode=summary_mode, top_k=top_k, t=t),
     )
-    t.mark(f"retrieve pairs={len(pairs)}")
 
+
+def _prepare(req: ChatRequest, tenant_id: str, file_ids, *, top_k: int, t: T) -> Dict:
+    """
+    Blocking part of /chat before retrieval (summary store, embedding, answer
+    cache), run on the threadpool. Returns {"response": ChatResponse} when no
+    LLM call is needed, else the query embedding and cache scope.
+    """
+    # "Tell me about this pdf" (the whole question, nothing more specific) on
+    # one document: serve its stored map-reduce summary
+    if file_ids and len(file_ids) == 1 and is_document_summary_request(req.question):
+        try:
+            summary = get_summary(tenant_id=tenant_id, file_id=file_ids[0])
+        except Exception:
+            log.exception("summary lookup failed, answering from retrieval")
+            summary = None
+        if summary:
+            t.mark("summary_store")
+            return {"response": ChatResponse(answer=summary, refused=False, citations=[])}
+
+    cache = get_answer_cache()
+    cache_scope = qvec = None
+
+    # Nothing ingested in scope: skip embedding + search, refuse below
+    if file_ids != []:
+        qvec = embed_query(req.question)
+        t.mark("embed_query")
+
+        if cache is not None:
+            cache_scope = cache.scope(tenant_id, file_ids, top_k=top_k, max_tokens=req.max_tokens)
+            hit = cache.get(cache_scope, qvec)
+            if hit:
+                t.mark("answer_cache_hit")
+                return {
+                    "response": ChatResponse(
+                        answer=hit["answer"],
+                        refused=False,
+                        citations=[Citation(**c) for c in hit["citations"]],
+                    )
+                }
+
+    return {"cache": cache, "cache_scope": cache_scope, "qvec": qvec}
+
+
+def _plan(req: ChatRequest, pairs, *, summary_mode: bool, t: T) -> Dict:
+    """Refusal check and prompt for the retrieved (doc, score) pairs."""
     docs = [p[0] for p in pairs]
     scores = [p[1] for p in pairs]
 
-    if should_refuse(docs):
+    # Summary questions match no chunk in particular, so only the score
+    # check is skipped for them.
+    if should_refuse(docs, None if summary_mode else scores):
         t.mark("refuse_check")
-        return ChatResponse(
-            answer="I don't have enough information in the uploaded document(s) to answer that.",
-            refused=True,
-            citations=[],
-        )
+        return {
+            "response": ChatResponse(
+                answer="I don't have enough information in the uploaded document(s) to answer that.",
+                refused=True,
+                citations=[],
+            )
+        }
 
     context = build_context(docs)
     t.mark("build_context")
@@ -106,20 +180,51 @@ QUESTION:
 
 ANSWER:"""
 
-    answer = (llm_generate(prompt, max_tokens=req.max_tokens) or "").strip()
-    t.mark("llm_generate")
+    return {"prompt": prompt, "context": context, "citations": make_citations(docs, scores)}
 
-    # Retry once if too short (prevents 1-liners)
-    if len(answer) < 120 and context.strip():
-        retry_prompt = (
-            prompt
-            + "\n\nIMPORTANT: Expand the answer. Minimum 6 sentences OR 8 bullet points. Be specific."
-        )
-        answer = (llm_generate(retry_prompt, max_tokens=req.max_tokens) or "").strip()
-        t.mark("llm_generate_retry")
 
-    citations = [Citation(**c) for c in make_citations(docs, scores)]
+async def _answer(req: ChatRequest, tenant_id: str, file_ids, *, summary_mode: bool, top_k: int, t: T) -> ChatResponse:
+    looked_up = await run_in_threadpool(_prepare, req, tenant_id, file_ids, top_k=top_k, t=t)
+    if "response" in looked_up:
+        return looked_up["response"]
+
+    # Search on the event loop over the shared async Qdrant client
+    pairs = []
+    if file_ids != []:
+        pairs = await aretrieve(embedding=looked_up["qvec"], top_k=top_k, file_ids=file_ids, tenant_id=tenant_id)
+    t.mark(f"retrieve pairs={len(pairs)}")
+
+    plan = {**looked_up, **_plan(req, pairs, summary_mode=summary_mode, t=t)}
+    if "response" in plan:
+        return plan["response"]
+    prompt = plan["prompt"]
+
+    # One LLM slot for the answer and its continuation (per-tenant fair queue);
+    # waiting happens on the event loop, not on a threadpool thread
+    try:
+        async with allm_slot(tenant_id):
+            t.mark("llm_slot")
+            answer = (await allm_generate(prompt, max_tokens=req.max_tokens) or "").strip()
+            t.mark("llm_generate")
+
+            # Too short (prevents 1-liners): extend the answer instead of regenerating it,
+            # within what's left of max_tokens
+            budget = remaining_tokens(req.max_tokens, answer)
+            if len(answer) < 120 and plan["context"].strip() and budget >= MIN_CONTINUATION_TOKENS:
+                more = (await allm_generate(continuation_prompt(prompt, answer), max_tokens=budget) or "").rstrip()
+                answer = (answer + continuation_sep(answer, more) + more).strip()
+                t.mark("llm_generate_continue")
+    except QueueFull as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "1"})
+    except QueueTimeout as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
+
+    cits = plan["citations"]
+    citations = [Citation(**c) for c in cits]
     t.mark("make_citations")
 
+    if plan["cache_scope"] is not None and answer:
+        await run_in_threadpool(plan["cache"].put, plan["cache_scope"], plan["qvec"], answer=answer, citations=cits)
+
     log.info("DONE /chat")
     return ChatResponse(answer=answer, refused=False, citations=citations)
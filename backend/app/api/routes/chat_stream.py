@@ -1,13 +1,31 @@
-import json
 import logging
-from fastapi import APIRouter, Depends
-from fastapi.responses import StreamingResponse
+import time
+from typing import Dict
+
+from fastapi import APIRouter, Depends, HTTPException
+from starlette.concurrency import run_in_threadpool
 
 from ...deps import get_tenant_id
 from ...schemas.chat import ChatRequest
-from ...services.rag import retrieve, build_context, make_citations
+from ...services.rag import (
+    MIN_CONTINUATION_TOKENS,
+    UnknownFiles,
+    build_context,
+    continuation_prompt,
+    continuation_sep,
+    make_citations,
+    remaining_tokens,
+    aretrieve,
+    resolve_file_ids,
+)
 from ...services.guardrails import should_refuse
-from ...services.llm import llm_stream
+from ...services.llm import allm_stream
+from ...services.admission import LLM_QUEUE_STATUS_SECONDS, LLM_QUEUE_TIMEOUT_SECONDS, QueueFull, get_llm_limiter
+from ...services.answer_cache import get_answer_cache
+from ...services.summaries import get_summary, is_document_summary_request
+from ...services.vectorstore import embed_query
+from ...services.singleflight import flight_key, get_stream_flights
+from ...services.sse import SSE_FLUSH_BYTES, EventStreamResponse, TokenCoalescer, sse, track_stream
 from ...services.timing import T
 from ...config import settings
 
@@ -38,8 +56,39 @@ Output must be plain text.
 """
 
 
-def sse(event: dict) -> str:
-    return f"data: {json.dumps(event, ensure_ascii=False)}\n\n"
+def replay_answer(answer: str, citations: list, *, model: str = None, flush_bytes: int = None, **meta):
+    """
+    Streams a ready answer (answer cache, stored summary) with the same event
+    sequence as a live generation, in token frames of ~flush_bytes.
+    `meta` is added to the meta event.
+    """
+    yield sse(
+        {
+            "type": "meta",
+            "citations": citations,
+            "provider": settings.llm_provider,
+            "model": model,
+            **meta,
+        }
+    )
+    step = max(1, SSE_FLUSH_BYTES if flush_bytes is None else int(flush_bytes))
+    for i in range(0, len(answer), step):
+        yield sse({"type": "token", "token": answer[i : i + step]})
+    yield sse({"type": "final", "answer": answer})
+    yield sse({"type": "done"})
+
+
+async def _continued(answer: str, tokens):
+    # continuation tokens, the first one joined onto `answer` with the right separator
+    first = True
+    try:
+        async for token in tokens:
+            if first:
+                token = continuation_sep(answer, token) + token
+                first = False
+            yield token
+    finally:
+        await tokens.aclose()
 
 
 def is_summary_question(q: str) -> bool:
@@ -60,7 +109,7 @@ def is_summary_question(q: str) -> bool:
 
 
 @router.post("/chat/stream")
-def chat_stream(req: ChatRequest, tenant_id: str = Depends(get_tenant_id)):
+async def chat_stream(req: ChatRequest, tenant_id: str = Depends(get_tenant_id)):
     t = T("chat_stream")
 
     summary_mode = is_summary_question(req.question)
@@ -77,12 +126,100 @@ def chat_stream(req: ChatRequest, tenant_id: str = Depends(get_tenant_id)):
         summary_mode,
     )
 
-    pairs = retrieve(
-        req.question,
-        top_k=top_k,
-        file_ids=req.file_ids,
-        tenant_id=tenant_id,
+    try:
+        file_ids = await run_in_threadpool(resolve_file_ids, req.file_ids, tenant_id=tenant_id)
+    except UnknownFiles as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+    flights = get_stream_flights()
+    if flights is None:
+        return await _stream_answer(req, tenant_id, file_ids, summary_mode=summary_mode, top_k=top_k, t=t)
+
+    # Identical requests in flight share one retrieval + generation: followers
+    # get the leader's stream from its first frame, the leader's errors (429) too
+    flight, leader = flights.join(
+        flight_key(tenant_id, file_ids, req.question, top_k=top_k, max_tokens=req.max_tokens)
     )
+    if not leader:
+        await run_in_threadpool(flight.wait_ready)
+        t.mark("singleflight_follow")
+        return EventStreamResponse(flight.subscribe(), on_close=flight.leave)
+
+    try:
+        resp = await _stream_answer(req, tenant_id, file_ids, summary_mode=summary_mode, top_k=top_k, t=t)
+    except BaseException as e:
+        flight.fail(e)
+        raise
+    flight.publish(resp.body_iterator, on_close=resp.on_close)
+    return EventStreamResponse(flight.subscribe(), on_close=flight.leave)
+
+
+def _prepare(req: ChatRequest, tenant_id: str, file_ids, *, top_k: int, t: T) -> Dict:
+    """
+    Blocking part before retrieval (summary store, embedding, answer cache),
+    run on the threadpool. Returns {"response": ...} for a ready answer, else
+    the query embedding and cache scope.
+    """
+    # "Tell me about this pdf" (the whole question, nothing more specific) on
+    # one document: serve its stored map-reduce summary
+    if file_ids and len(file_ids) == 1 and is_document_summary_request(req.question):
+        try:
+            summary = get_summary(tenant_id=tenant_id, file_id=file_ids[0])
+        except Exception:
+            log.exception("summary lookup failed, answering from retrieval")
+            summary = None
+        if summary:
+            t.mark("summary_store")
+            return {
+                "response": EventStreamResponse(
+                    replay_answer(
+                        summary,
+                        [],
+                        model=getattr(settings, "gemini_model", None) or getattr(settings, "ollama_model", None),
+                        flush_bytes=req.stream_flush_bytes,
+                        summary=True,
+                    ),
+                )
+            }
+
+    cache = get_answer_cache()
+    cache_scope = qvec = None
+
+    # Nothing ingested in scope: skip embedding + search, refuse below
+    if file_ids != []:
+        qvec = embed_query(req.question)
+        t.mark("embed_query")
+
+        if cache is not None:
+            cache_scope = cache.scope(tenant_id, file_ids, top_k=top_k, max_tokens=req.max_tokens)
+            hit = cache.get(cache_scope, qvec)
+            if hit:
+                t.mark("answer_cache_hit")
+                return {
+                    "response": EventStreamResponse(
+                        replay_answer(
+                            hit["answer"],
+                            hit["citations"],
+                            model=getattr(settings, "gemini_model", None) or getattr(settings, "ollama_model", None),
+                            flush_bytes=req.stream_flush_bytes,
+                            cached=True,
+                        ),
+                    )
+                }
+
+    return {"cache": cache, "cache_scope": cache_scope, "qvec": qvec}
+
+
+async def _stream_answer(req: ChatRequest, tenant_id: str, file_ids, *, summary_mode: bool, top_k: int, t: T) -> EventStreamResponse:
+    looked_up = await run_in_threadpool(_prepare, req, tenant_id, file_ids, top_k=top_k, t=t)
+    if "response" in looked_up:
+        return looked_up["response"]
+    cache, cache_scope, qvec = looked_up["cache"], looked_up["cache_scope"], looked_up["qvec"]
+
+    # Search on the event loop over the shared async Qdrant client
+    pairs = []
+    if file_ids != []:
+        pairs = await aretrieve(embedding=qvec, top_k=top_k, file_ids=file_ids, tenant_id=tenant_id)
     t.mark(f"retrieve pairs={len(pairs)}")
 
     docs = [p[0] for p in pairs]
@@ -91,7 +228,24 @@ def chat_stream(req: ChatRequest, tenant_id: str = Depends(get_tenant_id)):
     citations = make_citations(docs, scores)
     t.mark("make_citations")
 
-    def gen():
+    co = TokenCoalescer(flush_ms=req.stream_flush_ms, flush_bytes=req.stream_flush_bytes)
+
+    # Summary questions match no chunk in particular, so only the score
+    # check is skipped for them.
+    refuse = should_refuse(docs, None if summary_mode else scores)
+
+    # Place in the (per-tenant fair) LLM queue, taken before the response
+    # starts so a full queue is a plain 429
+    ticket = None
+    if not refuse:
+        try:
+            ticket = get_llm_limiter().enqueue(tenant_id)
+        except QueueFull as e:
+            raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "1"})
+
+    # Async generator: the stream is served on the event loop, not a threadpool
+    # thread, so open streams are bounded by connections rather than threads.
+    async def gen():
         # Send provider/model info too (frontend can show it if you want)
         yield sse(
             {
@@ -103,7 +257,7 @@ def chat_stream(req: ChatRequest, tenant_id: str = Depends(get_tenant_id)):
         )
         t.mark("sent_meta")
 
-        if should_refuse(docs):
+        if refuse:
             msg = "I don't have enough information in the uploaded document(s) to answer that."
             yield sse({"type": "refused", "answer": msg})
             yield sse({"type": "final", "answer": msg})
@@ -129,39 +283,65 @@ QUESTION:
 
 ANSWER:"""
 
+        # Wait for an LLM slot, reporting the queue position meanwhile
+        if not ticket.granted:
+            deadline = time.monotonic() + LLM_QUEUE_TIMEOUT_SECONDS
+            position = ticket.position()
+            yield sse({"type": "status", "state": "queued", "position": position})
+            while not await ticket.await_turn(LLM_QUEUE_STATUS_SECONDS):
+                if LLM_QUEUE_TIMEOUT_SECONDS > 0 and time.monotonic() >= deadline and ticket.limiter.give_up(ticket):
+                    msg = "The assistant is busy right now; please try again in a moment."
+                    yield sse({"type": "refused", "answer": msg})
+                    yield sse({"type": "final", "answer": msg})
+                    yield sse({"type": "done"})
+                    t.mark("queue_timeout")
+                    return
+                if ticket.position() != position:
+                    position = ticket.position()
+                    yield sse({"type": "status", "state": "queued", "position": position})
+            yield sse({"type": "status", "state": "generating"})
+            t.mark("llm_slot")
+
         t.mark("llm_call_start")
 
         try:
-            first = True
-            emitted_any = False
-            full_answer = ""
-
-            for token in llm_stream(prompt, max_tokens=req.max_tokens):
-                if first:
+            async for frame in co.stream(allm_stream(prompt, tenant_id=tenant_id, max_tokens=req.max_tokens)):
+                if co.frames == 1:
                     t.mark("llm_first_token")
-                    first = False
-                emitted_any = True
-                full_answer += token
-                yield sse({"type": "token", "token": token})
+                yield frame
 
+            emitted_any = co.tokens > 0
             if not emitted_any:
-                full_answer = "I don't have enough information in the uploaded document(s) to answer that."
-                yield sse({"type": "token", "token": full_answer})
-
-            # Retry once if too short (prevents one-liners)
-            if len(full_answer.strip()) < 160 and context.strip():
-                retry_prompt = (
-                    prompt
-                    + "\n\nIMPORTANT: Expand. Minimum 6–9 sentences OR 10 bullet points. Be specific and grounded."
-                )
-                full_answer = ""
-                for token in llm_stream(retry_prompt, max_tokens=req.max_tokens):
-                    full_answer += token
+                frame = co.add("I don't have enough information in the uploaded document(s) to answer that.")
+                if frame:
+                    yield frame
+
+            # Too short (prevents one-liners): continue the answer the user is
+            # already reading and stream the extra tokens, within max_tokens
+            full_answer = co.text()
+            budget = remaining_tokens(req.max_tokens, full_answer)
+            if emitted_any and len(full_answer.strip()) < 160 and context.strip() and budget >= MIN_CONTINUATION_TOKENS:
+                frame = co.flush()
+                if frame:
+                    yield frame
+                t.mark("llm_continue_start")
+                more = allm_stream(continuation_prompt(prompt, full_answer), tenant_id=tenant_id, max_tokens=budget)
+                async for frame in co.stream(_continued(full_answer, more)):
+                    yield frame
+                full_answer = co.text()
+
+            frame = co.flush()
+            if frame:
+                yield frame
 
             # Always send final full answer
             yield sse({"type": "final", "answer": full_answer.strip()})
 
-            t.mark("llm_stream_done")
+            if cache_scope is not None and emitted_any and full_answer.strip():
+                # put() reads the registry (file versions); keep that off the event loop
+                await run_in_threadpool(cache.put, cache_scope, qvec, answer=full_answer.strip(), citations=citations)
+
+            t.mark(f"llm_stream_done tokens={co.tokens} frames={co.frames}")
             yield sse({"type": "done"})
 
         except Exception as e:
@@ -171,4 +351,12 @@ ANSWER:"""
             yield sse({"type": "final", "answer": msg})
             yield sse({"type": "done"})
 
-    return StreamingResponse(gen(), media_type="text/event-stream")
+        finally:
+            ticket.release()
+
+    # Closing gen() on disconnect closes the upstream LLM stream (see track_stream);
+    # the LLM slot is returned when the response ends, however it ends
+    return EventStreamResponse(
+        track_stream(gen(), co=co, max_tokens=req.max_tokens),
+        on_close=ticket.release if ticket is not None else None,
+    )
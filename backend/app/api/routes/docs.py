@@ -1,10 +1,13 @@
-from fastapi import APIRouter, Depends, HTTPException
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query
 from qdrant_client import QdrantClient
 from qdrant_client.http import models as rest
 
 from ...config import settings
 from ...deps import get_tenant_id
-from ...services.registry import load_records, rewrite_records
+from ...services.registry import delete_record, list_records, update_records
+from ...services.jobs import get_job_store
+from ...services.qdrant_admin import qdrant_client
 
 router = APIRouter()
 
@@ -51,19 +54,41 @@ def qdrant_delete_for_file(client: QdrantClient, *, tenant_id: str, file_id: str
 
 
 @router.get("/documents")
-def documents(tenant_id: str = Depends(get_tenant_id)):
-    # Load from registry.jsonl
-    recs = [r for r in load_records(settings.app_data_dir) if r.get("tenant_id") == tenant_id]
-
-    client = QdrantClient(url=settings.qdrant_url)
+def documents(
+    tenant_id: str = Depends(get_tenant_id),
+    sort: str = Query("created_at", description="created_at | filename | num_chunks"),
+    order: str = Query("desc", pattern="^(asc|desc)$"),
+    limit: int = Query(1000, ge=1, le=1000),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+):
+    # Chunk counts live in the registry (kept up to date by ingest/delete),
+    # so this is a registry read with no per-document Qdrant round trips.
+    try:
+        recs, next_cursor = list_records(
+            settings.app_data_dir,
+            tenant_id=tenant_id,
+            sort=sort,
+            order=order,
+            limit=limit,
+            cursor=cursor,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    # Records written before counts were tracked: count once and backfill.
+    legacy = [r for r in recs if r.get("num_chunks") is None]
+    if legacy:
+        client = qdrant_client()
+        backfill = {}
+        for r in legacy:
+            r["num_chunks"] = qdrant_count_for_file(client, tenant_id=tenant_id, file_id=r["file_id"])
+            backfill[(tenant_id, r["file_id"])] = {"num_chunks": r["num_chunks"]}
+        update_records(settings.app_data_dir, backfill)
 
     enriched = []
     for r in recs:
-        fid = r.get("file_id")
-        if not fid:
-            continue  # skip corrupted record
-
-        n = qdrant_count_for_file(client, tenant_id=tenant_id, file_id=fid)
+        fid = r["file_id"]
+        n = int(r.get("num_chunks") or 0)
         enriched.append(
             {
                 "tenant_id": tenant_id,
@@ -76,25 +101,18 @@ def documents(tenant_id: str = Depends(get_tenant_id)):
             }
         )
 
-    # sort newest first if created_at exists
-    enriched.sort(key=lambda x: (x["created_at"] or ""), reverse=True)
-
-    return {"tenant_id": tenant_id, "docs": enriched}
+    return {"tenant_id": tenant_id, "docs": enriched, "next_cursor": next_cursor}
 
 
 @router.delete("/documents/{file_id}")
 def delete_document(file_id: str, tenant_id: str = Depends(get_tenant_id)):
-    # 1) remove from registry
-    all_recs = load_records(settings.app_data_dir)
-    tenant_recs = [r for r in all_recs if r.get("tenant_id") == tenant_id]
+    # 0) stop queued/running ingest + summarize jobs, so none re-adds points or a summary afterwards
+    get_job_store().cancel_for_file(tenant_id=tenant_id, file_id=file_id)
 
-    exists = any(r.get("file_id") == file_id for r in tenant_recs)
-    if not exists:
+    # 1) remove from registry
+    if not delete_record(settings.app_data_dir, tenant_id=tenant_id, file_id=file_id):
         raise HTTPException(status_code=404, detail="File not found in registry.")
 
-    new_all = [r for r in all_recs if not (r.get("tenant_id") == tenant_id and r.get("file_id") == file_id)]
-    rewrite_records(settings.app_data_dir, new_all)
-
     # 2) delete pdf from disk
     pdf_path = settings.uploads_dir / f"{file_id}.pdf"
     if pdf_path.exists():
@@ -106,7 +124,7 @@ def delete_document(file_id: str, tenant_id: str = Depends(get_tenant_id)):
         parsed_path.unlink()
 
     # 3) delete vectors from qdrant
-    client = QdrantClient(url=settings.qdrant_url)
+    client = qdrant_client()
     qdrant_delete_for_file(client, tenant_id=tenant_id, file_id=file_id)
 
     return {"tenant_id": tenant_id, "file_id": file_id, "deleted": True}
@@ -0,0 +1,54 @@
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query
+
+from ...config import settings
+from ...deps import get_tenant_id
+from ...schemas.jobs import JobListResponse, JobResponse
+from ...services.jobs import get_job_store
+
+router = APIRouter()
+
+
+@router.post("/jobs/ingest/{file_id}", response_model=JobResponse)
+def enqueue_ingest(
+    file_id: str,
+    tenant_id: str = Depends(get_tenant_id),
+    force: bool = Query(False, description="If true, delete existing chunks and re-ingest"),
+):
+    pdf_path = settings.uploads_dir / f"{file_id}.pdf"
+    if not pdf_path.exists():
+        raise HTTPException(status_code=404, detail="PDF not found. Upload first.")
+
+    store = get_job_store()
+
+    # one active ingest per file: return the existing job instead of queueing a duplicate
+    active = store.find_active(tenant_id=tenant_id, file_id=file_id)
+    if active:
+        return active
+
+    return store.enqueue(tenant_id=tenant_id, file_id=file_id, force=force)
+
+
+@router.get("/jobs", response_model=JobListResponse)
+def list_jobs(
+    tenant_id: str = Depends(get_tenant_id),
+    status: Optional[str] = Query(None, description="queued | running | done | failed | cancelled"),
+    limit: int = Query(50, ge=1, le=500),
+):
+    return {"tenant_id": tenant_id, "jobs": get_job_store().list(tenant_id=tenant_id, status=status, limit=limit)}
+
+
+@router.get("/jobs/{job_id}", response_model=JobResponse)
+def get_job(job_id: str, tenant_id: str = Depends(get_tenant_id)):
+    job = get_job_store().get(job_id, tenant_id=tenant_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found.")
+    return job
+
+
+@router.post("/jobs/{job_id}/cancel", response_model=JobResponse)
+def cancel_job(job_id: str, tenant_id: str = Depends(get_tenant_id)):
+    job = get_job_store().cancel(job_id, tenant_id=tenant_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found.")
+    return job
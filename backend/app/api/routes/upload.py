@@ -5,11 +5,11 @@ from datetime import datetime
 from ...config import settings
 from ...deps import get_tenant_id
 from ...schemas.upload import UploadResponse
-from ...services.registry import append_record
-from ...services.pdf_loader import extract_pdf_text_by_page
-from ...services.chunker import chunk_pages
-from ...services.vectorstore import upsert_docs
-from ...services.mlflow_logger import Timer, log_ingest
+from ...services.registry import append_record, find_by_sha256
+from ...services.ingest_pipeline import ingest_file
+from ...services.executors import run_io
+from ...services.jobs import get_job_store
+from ...services.uploads import UploadTooLarge, save_upload, link_duplicate
 
 router = APIRouter()
 
@@ -19,6 +19,7 @@ async def upload_pdf(
     file: UploadFile = File(...),
     tenant_id: str = Depends(get_tenant_id),
     ingest: bool = Query(False),
+    background: bool = Query(False, description="With ingest=true: queue a background job instead of ingesting inline"),
 ):
     if not file.filename.lower().endswith(".pdf"):
         raise HTTPException(status_code=400, detail="Only PDF files are supported.")
@@ -27,51 +28,52 @@ async def upload_pdf(
 
     file_id = str(uuid.uuid4())
     out_path = settings.uploads_dir / f"{file_id}.pdf"
-    out_path.write_bytes(await file.read())
-
-    append_record(
-        settings.app_data_dir,
-        {
-            "tenant_id": tenant_id,
-            "file_id": file_id,
-            "filename": file.filename,
-            "stored_name": out_path.name,
-            "created_at": datetime.utcnow().isoformat() + "Z",
-        },
+    try:
+        size_bytes, sha256 = await save_upload(file, out_path)
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+
+    # Same bytes already uploaded by this tenant? Share the stored PDF on disk.
+    original = find_by_sha256(settings.app_data_dir, tenant_id=tenant_id, sha256=sha256)
+    if original and not link_duplicate(settings.uploads_dir / f"{original['file_id']}.pdf", out_path):
+        original = None
+
+    record = {
+        "tenant_id": tenant_id,
+        "file_id": file_id,
+        "filename": file.filename,
+        "stored_name": out_path.name,
+        "size_bytes": size_bytes,
+        "sha256": sha256,
+        "created_at": datetime.utcnow().isoformat() + "Z",
+        "num_chunks": 0,
+    }
+    if original:
+        record["alias_of"] = original["file_id"]
+    append_record(settings.app_data_dir, record)
+
+    resp = UploadResponse(
+        file_id=file_id,
+        filename=file.filename,
+        duplicate_of=original["file_id"] if original else None,
     )
 
-    resp = UploadResponse(file_id=file_id, filename=file.filename)
+    if ingest and background:
+        job = get_job_store().enqueue(tenant_id=tenant_id, file_id=file_id)
+        resp.job_id = job["job_id"]
+        return resp
 
     if ingest:
         try:
-            pages = extract_pdf_text_by_page(out_path)
-
-            docs = chunk_pages(
-                pages,
-                chunk_size=settings.chunk_size,
-                chunk_overlap=settings.chunk_overlap,
-                source_name=out_path.name,
-                file_id=file_id,
-                tenant_id=tenant_id,
-            )
-
-            with Timer() as t:
-                num_added = upsert_docs(docs)
-
-            log_ingest(
-                file_id=file_id,
-                filename=out_path.name,
-                num_pages=len(pages),
-                num_chunks=num_added,
-                chunk_size=settings.chunk_size,
-                overlap=settings.chunk_overlap,
-                collection=settings.collection_name,
-                elapsed=t.dt,
-            )
+            # Parse/chunk/embed/upsert is blocking; run it on the ingest I/O pool
+            # (PDF parsing itself goes to the parse process pool) so this worker's
+            # event loop keeps serving /health and streaming chats meanwhile.
+            res = await run_io(ingest_file, tenant_id=tenant_id, file_id=file_id)
 
             resp.ingested = True
-            resp.num_pages = len(pages)
-            resp.num_chunks = num_added
+            resp.num_pages = res["num_pages"]
+            resp.num_chunks = res["num_chunks"]
+            resp.embed_batches = res.get("embed_batches", [])
 
         except Exception as e:
             msg = str(e)
@@ -1,6 +1,13 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from .config import settings
 from .services.mlflow_logger import setup_mlflow
+from .services.jobs import start_workers, stop_workers
+from .services.qdrant_admin import close_async_client, close_clients
+from .services.llm import close_llm_clients
+from .services.vectorstore import bootstrap_collection
+from .services.uploads import LimitUploadSize
 from .api.routes.chat import router as chat_router
 from .api.routes.chat_stream import router as chat_stream_router
 from .api.routes.debug import router as debug_router
@@ -10,22 +17,42 @@ from .api.routes.health import router as health_router
 from .api.routes.upload import router as upload_router
 from .api.routes.docs import router as docs_router
 from .api.routes.ingest import router as ingest_router
+from .api.routes.jobs import router as jobs_router
 import logging
 logging.basicConfig(level=logging.INFO)
 
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    try:
+        bootstrap_collection()
+    except Exception:
+        # Qdrant may not be up yet; get_vectorstore() retries on first use
+        logging.getLogger("startup").exception("Qdrant bootstrap failed")
+    start_workers()
+    yield
+    stop_workers()
+    close_clients()
+    await close_async_client()
+    await close_llm_clients()
+
+
 def create_app() -> FastAPI:
-    app = FastAPI(title="PDF RAG API", version="0.3.0")
+    app = FastAPI(title="PDF RAG API", version="0.3.0", lifespan=lifespan)
 
     settings.uploads_dir.mkdir(parents=True, exist_ok=True)
     settings.parsed_dir.mkdir(parents=True, exist_ok=True)
 
     setup_mlflow(settings.mlflow_tracking_uri)
 
+    # Oversized uploads are refused while they arrive, not after being spooled
+    app.add_middleware(LimitUploadSize, paths=("/upload",))
+
     app.include_router(health_router, tags=["health"])
     app.include_router(upload_router, tags=["pdf"])
     app.include_router(docs_router, tags=["pdf"])
     app.include_router(ingest_router, tags=["rag"])
+    app.include_router(jobs_router, tags=["rag"])
     app.include_router(chat_router, tags=["chat"])
     app.include_router(chat_stream_router, tags=["chat"])
     app.include_router(debug_router, tags=["debug"])
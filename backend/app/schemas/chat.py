@@ -7,6 +7,9 @@ class ChatRequest(BaseModel):
     top_k: int = Field(default=8, ge=1, le=30)
     use_rerank: bool = True  # placeholder, not used yet
     max_tokens: int = Field(default=512, ge=64, le=2048)
+    # /chat/stream token coalescing window (None = server default, 0 = every token)
+    stream_flush_ms: Optional[int] = Field(default=None, ge=0, le=2000)
+    stream_flush_bytes: Optional[int] = Field(default=None, ge=0, le=65536)
 
 class Citation(BaseModel):
     source: str
@@ -1,6 +1,12 @@
-from typing import Optional
+from typing import List, Optional
 from pydantic import BaseModel
 
+class EmbedBatchStats(BaseModel):
+    batch: int
+    size: int
+    seconds: float
+    texts_per_sec: Optional[float] = None
+
 class IngestResponse(BaseModel):
     file_id: str
     num_pages: Optional[int] = None
@@ -8,3 +14,7 @@ class IngestResponse(BaseModel):
     collection: str
     ingested: bool = True
     already_ingested: bool = False
+    num_upserted: Optional[int] = None
+    num_unchanged: Optional[int] = None
+    num_deleted: Optional[int] = None
+    embed_batches: List[EmbedBatchStats] = []
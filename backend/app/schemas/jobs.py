@@ -0,0 +1,24 @@
+from typing import Any, Dict, List, Optional
+from pydantic import BaseModel
+
+class JobResponse(BaseModel):
+    job_id: str
+    tenant_id: str
+    file_id: str
+    kind: str
+    status: str
+    force: bool = False
+    cancel_requested: bool = False
+    pages_parsed: int = 0
+    chunks_embedded: int = 0
+    chunks_upserted: int = 0
+    attempts: int = 0
+    error: Optional[str] = None
+    result: Optional[Dict[str, Any]] = None
+    created_at: str
+    started_at: Optional[str] = None
+    finished_at: Optional[str] = None
+
+class JobListResponse(BaseModel):
+    tenant_id: str
+    jobs: List[JobResponse]
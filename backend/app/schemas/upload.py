@@ -1,9 +1,14 @@
-from typing import Optional
+from typing import List, Optional
 from pydantic import BaseModel
 
+from .ingest import EmbedBatchStats
+
 class UploadResponse(BaseModel):
     file_id: str
     filename: str
     ingested: bool = False
     num_pages: Optional[int] = None
     num_chunks: Optional[int] = None
+    embed_batches: List[EmbedBatchStats] = []
+    job_id: Optional[str] = None
+    duplicate_of: Optional[str] = None
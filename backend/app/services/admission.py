@@ -0,0 +1,285 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager, contextmanager
+from typing import AsyncIterator, Deque, Dict, Iterator, Optional
+
+from ..config import settings
+
+log = logging.getLogger("admission")
+
+# Generations allowed to run against the LLM backend at once (per process, 0 = no cap).
+# Default by provider: a local Ollama handles ~one generation at a time, a
+# hosted API many.
+_DEFAULT_CONCURRENCY = {"ollama": "1", "gemini": "32"}
+LLM_MAX_CONCURRENCY = int(
+    getattr(settings, "llm_max_concurrency", None)
+    or os.getenv("LLM_MAX_CONCURRENCY")
+    or _DEFAULT_CONCURRENCY.get((getattr(settings, "llm_provider", None) or "ollama").lower().strip(), "1")
+)
+# Requests allowed to wait for a slot, in total and per tenant; beyond that /chat answers 429 at once
+LLM_MAX_QUEUE = int(getattr(settings, "llm_max_queue", None) or os.getenv("LLM_MAX_QUEUE", "32"))
+LLM_MAX_QUEUE_PER_TENANT = int(getattr(settings, "llm_max_queue_per_tenant", None) or os.getenv("LLM_MAX_QUEUE_PER_TENANT", "8"))
+# Longest a request waits for a slot before giving up
+LLM_QUEUE_TIMEOUT_SECONDS = float(getattr(settings, "llm_queue_timeout_seconds", None) or os.getenv("LLM_QUEUE_TIMEOUT_SECONDS", "120"))
+# How often /chat/stream reports the queue position while waiting
+LLM_QUEUE_STATUS_SECONDS = float(getattr(settings, "llm_queue_status_seconds", None) or os.getenv("LLM_QUEUE_STATUS_SECONDS", "1"))
+
+
+class QueueFull(RuntimeError):
+    pass
+
+
+class QueueTimeout(RuntimeError):
+    pass
+
+
+class Ticket:
+    """
+    A place in the LLM queue. Waitable from a worker thread (`wait`) or from
+    the event loop (`await_turn`); `release()` gives the slot (or the place in
+    the queue) back and is safe to call more than once.
+    """
+
+    def __init__(self, limiter: "FairLimiter", tenant_id: str):
+        self.limiter = limiter
+        self.tenant_id = tenant_id
+        self.enqueued_at = time.monotonic()
+        self.granted = False
+        self.released = False
+
+        self._event = threading.Event()
+        self._async_waiters = []
+
+    def _grant(self) -> None:
+        # called with the limiter lock held
+        self.granted = True
+        self._event.set()
+        for loop, fut in self._async_waiters:
+            loop.call_soon_threadsafe(_set_done, fut)
+        self._async_waiters.clear()
+
+    def position(self) -> int:
+        """1-based place in the queue (0 once the ticket holds a slot)."""
+        return self.limiter.position(self)
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        return self._event.wait(timeout)
+
+    async def await_turn(self, timeout: Optional[float] = None) -> bool:
+        """True once the ticket holds a slot, False if `timeout` passed first."""
+        loop = asyncio.get_running_loop()
+        fut = loop.create_future()
+        with self.limiter._lock:
+            if self.granted:
+                return True
+            self._async_waiters.append((loop, fut))
+        try:
+            await asyncio.wait_for(fut, timeout)
+            return True
+        except asyncio.TimeoutError:
+            return self.granted
+        finally:
+            with self.limiter._lock:
+                if (loop, fut) in self._async_waiters:
+                    self._async_waiters.remove((loop, fut))
+
+    def release(self) -> None:
+        self.limiter.release(self)
+
+
+def _set_done(fut: asyncio.Future) -> None:
+    if not fut.done():
+        fut.set_result(True)
+
+
+class FairLimiter:
+    """
+    Bounded concurrency in front of the LLM backend with round-robin fair
+    queueing between tenants: each free slot goes to the next tenant in turn
+    (FIFO within a tenant), so one tenant's burst can't hold everyone else
+    back. Enqueueing past `max_queue` (or `max_queue_per_tenant`) fails at
+    once with QueueFull. max_concurrency <= 0 means no cap (nothing queues).
+    """
+
+    def __init__(self, *, max_concurrency: int, max_queue: int, max_queue_per_tenant: int):
+        self.max_concurrency = max(0, int(max_concurrency))
+        self.max_queue = max(0, int(max_queue))
+        self.max_queue_per_tenant = max(0, int(max_queue_per_tenant))
+
+        self._lock = threading.Lock()
+        self.active = 0
+        # tenant -> waiting tickets; key order is the round-robin order
+        self._queues: "OrderedDict[str, Deque[Ticket]]" = OrderedDict()
+        self._queued = 0
+
+        self.granted = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.wait_seconds_total = 0.0
+
+    def enqueue(self, tenant_id: str, *, bounded: bool = True) -> Ticket:
+        """
+        Takes a place in the queue (or a free slot straight away). Raises
+        QueueFull if the queue is at its limits; background work passes
+        bounded=False to wait regardless.
+        """
+        ticket = Ticket(self, tenant_id)
+        with self._lock:
+            if self._has_room() and not self._queued:
+                self._start(ticket)
+                return ticket
+
+            q = self._queues.get(tenant_id)
+            if bounded and (self._queued >= self.max_queue or (q is not None and len(q) >= self.max_queue_per_tenant)):
+                self.rejected += 1
+                raise QueueFull("LLM backend is busy; too many requests are waiting. Retry shortly.")
+
+            if q is None:
+                q = self._queues[tenant_id] = deque()
+            q.append(ticket)
+            self._queued += 1
+        return ticket
+
+    def try_acquire(self, tenant_id: str) -> Optional[Ticket]:
+        """A slot right now if one is free and nobody is waiting, else None (never queues)."""
+        with self._lock:
+            if not (self._has_room() and not self._queued):
+                return None
+            ticket = Ticket(self, tenant_id)
+            self._start(ticket)
+            return ticket
+
+    def _has_room(self) -> bool:
+        return not self.max_concurrency or self.active < self.max_concurrency
+
+    def _start(self, ticket: Ticket) -> None:
+        self.active += 1
+        self.granted += 1
+        self.wait_seconds_total += time.monotonic() - ticket.enqueued_at
+        ticket._grant()
+
+    def _dispatch(self) -> None:
+        while self._has_room() and self._queues:
+            tenant_id, q = self._queues.popitem(last=False)
+            ticket = q.popleft()
+            self._queued -= 1
+            if q:
+                # still waiting: back of the round-robin
+                self._queues[tenant_id] = q
+            self._start(ticket)
+
+    def release(self, ticket: Ticket) -> None:
+        with self._lock:
+            if ticket.released:
+                return
+            ticket.released = True
+            if ticket.granted:
+                self.active -= 1
+            else:
+                q = self._queues.get(ticket.tenant_id)
+                if q is not None and ticket in q:
+                    q.remove(ticket)
+                    self._queued -= 1
+                    if not q:
+                        del self._queues[ticket.tenant_id]
+            self._dispatch()
+
+    def give_up(self, ticket: Ticket) -> bool:
+        """Drops a ticket whose wait timed out; False if it got a slot in the meantime."""
+        with self._lock:
+            if ticket.granted:
+                return False
+            self.timed_out += 1
+        self.release(ticket)
+        return True
+
+    def position(self, ticket: Ticket) -> int:
+        """
+        Tickets served before this one, plus one. Slots go round-robin over
+        tenants, so a ticket i-th in its tenant's queue waits for up to i+1
+        tickets of each tenant ahead of it in the rotation and i of the rest.
+        """
+        with self._lock:
+            if ticket.granted or ticket.released:
+                return 0
+            q = self._queues.get(ticket.tenant_id)
+            if q is None or ticket not in q:
+                return 0
+            i = q.index(ticket)
+            ahead = i
+            before = True
+            for tenant_id, other in self._queues.items():
+                if tenant_id == ticket.tenant_id:
+                    before = False
+                    continue
+                ahead += min(len(other), i + 1 if before else i)
+            return ahead + 1
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "max_concurrency": self.max_concurrency,
+                "max_queue": self.max_queue,
+                "max_queue_per_tenant": self.max_queue_per_tenant,
+                "active": self.active,
+                "queued": self._queued,
+                "queued_by_tenant": {t: len(q) for t, q in self._queues.items()},
+                "granted": self.granted,
+                "rejected": self.rejected,
+                "timed_out": self.timed_out,
+                "avg_wait_seconds": round(self.wait_seconds_total / self.granted, 4) if self.granted else 0.0,
+            }
+
+
+_LIMITER: Optional[FairLimiter] = None
+_LIMITER_LOCK = threading.Lock()
+
+
+def get_llm_limiter() -> FairLimiter:
+    global _LIMITER
+    if _LIMITER is None:
+        with _LIMITER_LOCK:
+            if _LIMITER is None:
+                _LIMITER = FairLimiter(
+                    max_concurrency=LLM_MAX_CONCURRENCY,
+                    max_queue=LLM_MAX_QUEUE,
+                    max_queue_per_tenant=LLM_MAX_QUEUE_PER_TENANT,
+                )
+    return _LIMITER
+
+
+@contextmanager
+def llm_slot(tenant_id: str, *, bounded: bool = True, timeout: Optional[float] = None) -> Iterator[Ticket]:
+    """
+    Blocking `with llm_slot(tenant_id):` for work on worker threads
+    (summary builds). Raises QueueFull / QueueTimeout.
+    """
+    timeout = LLM_QUEUE_TIMEOUT_SECONDS if timeout is None else timeout
+    limiter = get_llm_limiter()
+    ticket = limiter.enqueue(tenant_id, bounded=bounded)
+    try:
+        if not ticket.wait(timeout if timeout > 0 else None) and limiter.give_up(ticket):
+            raise QueueTimeout(f"Waited {timeout:.0f}s for the LLM backend; retry shortly.")
+        yield ticket
+    finally:
+        ticket.release()
+
+
+@asynccontextmanager
+async def allm_slot(tenant_id: str, *, timeout: Optional[float] = None) -> AsyncIterator[Ticket]:
+    """`async with allm_slot(tenant_id):` waits on the event loop, not on a thread."""
+    timeout = LLM_QUEUE_TIMEOUT_SECONDS if timeout is None else timeout
+    limiter = get_llm_limiter()
+    ticket = limiter.enqueue(tenant_id)
+    try:
+        if not await ticket.await_turn(timeout if timeout > 0 else None) and limiter.give_up(ticket):
+            raise QueueTimeout(f"Waited {timeout:.0f}s for the LLM backend; retry shortly.")
+        yield ticket
+    finally:
+        ticket.release()
@@ -0,0 +1,171 @@
+from __future__ import annotations
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from ..config import settings
+from .registry import tenant_file_versions
+
+ANSWER_CACHE_ENABLED = (getattr(settings, "answer_cache_enabled", None) or os.getenv("ANSWER_CACHE_ENABLED", "true")).lower() in ("1", "true", "yes")
+# Minimum cosine similarity between question embeddings to reuse an answer
+ANSWER_CACHE_THRESHOLD = float(getattr(settings, "answer_cache_threshold", None) or os.getenv("ANSWER_CACHE_THRESHOLD", "0.97"))
+ANSWER_CACHE_TTL_SECONDS = float(getattr(settings, "answer_cache_ttl_seconds", None) or os.getenv("ANSWER_CACHE_TTL_SECONDS", "3600"))
+ANSWER_CACHE_MAX_ENTRIES = int(getattr(settings, "answer_cache_max_entries", None) or os.getenv("ANSWER_CACHE_MAX_ENTRIES", "1000"))
+
+
+def _normalize(vec: List[float]) -> np.ndarray:
+    v = np.asarray(vec, dtype=np.float32)
+    n = float(np.linalg.norm(v))
+    return v / n if n else v
+
+
+class _Scope:
+    """Entry ids of one scope and their normalized embeddings, one row each."""
+
+    __slots__ = ("ids", "mat")
+
+    def __init__(self, ids: List[int], mat: np.ndarray):
+        # Replaced, never modified in place, so get() can use a snapshot outside the lock
+        self.ids = ids
+        self.mat = mat
+
+
+class AnswerCache:
+    """
+    In-process semantic cache of chat answers.
+
+    Entries are grouped by scope (tenant, sorted file_ids, top_k, max_tokens)
+    and matched on cosine similarity of the question embedding. Each entry
+    remembers the registry versions (ingested_at) of the files it was answered
+    from; a lookup against a different set (re-ingest, delete, new file in a
+    whole-tenant scope) is a miss and drops the entry. Because the versions
+    come from the shared registry, this holds across worker processes too.
+
+    A lookup is one matrix-vector product over the scope's embeddings,
+    computed outside the lock.
+    """
+
+    def __init__(self, *, threshold: float, ttl_seconds: float, max_entries: int):
+        self.threshold = float(threshold)
+        self.ttl = float(ttl_seconds)
+        self.max_entries = max(1, int(max_entries))
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._lock = threading.Lock()
+        self._seq = 0
+        # entry id -> entry, in LRU order (oldest first)
+        self._entries: "OrderedDict[int, Dict]" = OrderedDict()
+        self._scopes: Dict[tuple, _Scope] = {}
+
+    @staticmethod
+    def scope(tenant_id: str, file_ids: Optional[List[str]], *, top_k: int, max_tokens: int) -> tuple:
+        return (tenant_id, tuple(sorted(file_ids)) if file_ids else None, int(top_k), int(max_tokens))
+
+    @staticmethod
+    def _fingerprint(tenant_id: str, file_ids: Optional[tuple]) -> tuple:
+        versions = tenant_file_versions(settings.app_data_dir, tenant_id=tenant_id)
+        fids = file_ids if file_ids is not None else sorted(versions)
+        return tuple((f, versions.get(f)) for f in fids)
+
+    def _drop(self, eid: int) -> None:
+        e = self._entries.pop(eid, None)
+        if e is None:
+            return
+        sc = self._scopes.get(e["scope"])
+        if sc is not None:
+            i = sc.ids.index(eid)
+            if len(sc.ids) == 1:
+                del self._scopes[e["scope"]]
+            else:
+                self._scopes[e["scope"]] = _Scope(sc.ids[:i] + sc.ids[i + 1 :], np.delete(sc.mat, i, axis=0))
+
+    def get(self, scope: tuple, embedding: List[float]) -> Optional[Dict]:
+        """Returns {"answer", "citations"} of the closest fresh entry above the threshold."""
+        q = _normalize(embedding)
+        fp = self._fingerprint(scope[0], scope[1])
+        now = time.time()
+
+        with self._lock:
+            sc = self._scopes.get(scope)
+        sims = sc.mat @ q if sc is not None and sc.mat.shape[1] == q.shape[0] else None
+
+        with self._lock:
+            best, best_sim = None, self.threshold
+            if sims is not None:
+                for eid, sim in zip(sc.ids, sims.tolist()):
+                    e = self._entries.get(eid)
+                    if e is None:
+                        continue  # evicted meanwhile
+                    if now - e["created"] > self.ttl or e["fingerprint"] != fp:
+                        self._drop(eid)
+                        continue
+                    if sim >= best_sim:
+                        best, best_sim = eid, sim
+
+            if best is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            self._entries.move_to_end(best)
+            e = self._entries[best]
+            return {"answer": e["answer"], "citations": e["citations"], "similarity": best_sim}
+
+    def put(self, scope: tuple, embedding: List[float], *, answer: str, citations: List[Dict]) -> None:
+        entry = {
+            "scope": scope,
+            "vec": _normalize(embedding),
+            "fingerprint": self._fingerprint(scope[0], scope[1]),
+            "answer": answer,
+            "citations": citations,
+            "created": time.time(),
+        }
+        with self._lock:
+            self._seq += 1
+            self._entries[self._seq] = entry
+            sc = self._scopes.get(scope)
+            if sc is None:
+                self._scopes[scope] = _Scope([self._seq], entry["vec"][None, :])
+            else:
+                self._scopes[scope] = _Scope(sc.ids + [self._seq], np.vstack((sc.mat, entry["vec"])))
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "scopes": len(self._scopes),
+                "max_entries": self.max_entries,
+                "threshold": self.threshold,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+_CACHE: Optional[AnswerCache] = None
+_CACHE_LOCK = threading.Lock()
+
+
+def get_answer_cache() -> Optional[AnswerCache]:
+    global _CACHE
+    if _CACHE is None and ANSWER_CACHE_ENABLED:
+        with _CACHE_LOCK:
+            if _CACHE is None:
+                _CACHE = AnswerCache(
+                    threshold=ANSWER_CACHE_THRESHOLD,
+                    ttl_seconds=ANSWER_CACHE_TTL_SECONDS,
+                    max_entries=ANSWER_CACHE_MAX_ENTRIES,
+                )
+    return _CACHE
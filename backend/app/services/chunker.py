@@ -1,4 +1,4 @@
-from typing import List, Dict, Any, Union, Tuple
+from typing import List, Dict, Any, Iterable, Iterator, Union, Tuple
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_core.documents import Document
 
@@ -35,22 +35,24 @@ def _normalize_page(p: PageLike, i: int) -> tuple[int, str]:
     return i, ""
 
 
-def chunk_pages(
-    pages: List[PageLike],
+def iter_chunks(
+    pages: Iterable[PageLike],
     chunk_size: int,
     chunk_overlap: int,
     source_name: str,
     file_id: str,
     tenant_id: str,
-) -> List[Document]:
+) -> Iterator[Document]:
+    """
+    Lazy version of chunk_pages: pulls one page at a time from `pages`
+    and yields its chunks before reading the next page.
+    """
     splitter = RecursiveCharacterTextSplitter(
         chunk_size=chunk_size,
         chunk_overlap=chunk_overlap,
         separators=["\n\n", "\n", " ", ""],
     )
 
-    docs: List[Document] = []
-
     for i, p in enumerate(pages, start=1):
         page_num, text = _normalize_page(p, i)
         text = (text or "").strip()
@@ -64,17 +66,33 @@ def chunk_pages(
             if not chunk:
                 continue
 
-            docs.append(
-                Document(
-                    page_content=chunk,
-                    metadata={
-                        "tenant_id": tenant_id,
-                        "file_id": file_id,
-                        "source": source_name,
-                        "page": page_num,
-                        "chunk_index": idx,
-                    },
-                )
+            yield Document(
+                page_content=chunk,
+                metadata={
+                    "tenant_id": tenant_id,
+                    "file_id": file_id,
+                    "source": source_name,
+                    "page": page_num,
+                    "chunk_index": idx,
+                },
             )
 
-    return docs
+
+def chunk_pages(
+    pages: List[PageLike],
+    chunk_size: int,
+    chunk_overlap: int,
+    source_name: str,
+    file_id: str,
+    tenant_id: str,
+) -> List[Document]:
+    return list(
+        iter_chunks(
+            pages,
+            chunk_size=chunk_size,
+            chunk_overlap=chunk_overlap,
+            source_name=source_name,
+            file_id=file_id,
+            tenant_id=tenant_id,
+        )
+    )
@@ -0,0 +1,143 @@
+from __future__ import annotations
+
+import logging
+import os
+import threading
+import time
+from typing import Dict, Optional
+
+from ..config import settings
+
+log = logging.getLogger("circuit_breaker")
+
+# Consecutive failures that open a provider's circuit
+LLM_BREAKER_FAILURES = int(getattr(settings, "llm_breaker_failures", None) or os.getenv("LLM_BREAKER_FAILURES", "3"))
+# Seconds an open circuit waits before letting one probe request through
+LLM_BREAKER_RESET_SECONDS = float(getattr(settings, "llm_breaker_reset_seconds", None) or os.getenv("LLM_BREAKER_RESET_SECONDS", "30"))
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpen(RuntimeError):
+    pass
+
+
+class CircuitBreaker:
+    """
+    closed: calls go through; `failure_threshold` consecutive failures open it.
+    open: calls are rejected (callers go straight to their fallback) until
+          `reset_seconds` have passed, then it turns half-open.
+    half_open: one probe call at a time; success closes the circuit, failure
+          re-opens it, release() (the call was cancelled, no outcome) lets the
+          next call probe. A probe that never reports back at all is given up
+          on after `reset_seconds`.
+
+    allow() returns a ticket (None = rejected) that the call hands back to
+    release(), so only the call that holds the probe can free it.
+    """
+
+    def __init__(self, name: str, *, failure_threshold: int, reset_seconds: float):
+        self.name = name
+        self.failure_threshold = max(1, int(failure_threshold))
+        self.reset_seconds = float(reset_seconds)
+
+        self._lock = threading.Lock()
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probe_at: Optional[float] = None
+        self._probe_ticket: Optional[int] = None
+        self._tickets = 0
+
+        self.rejected = 0
+        self.times_opened = 0
+
+    def allow(self) -> Optional[int]:
+        now = time.monotonic()
+        with self._lock:
+            self._tickets += 1
+            ticket = self._tickets
+            if self.state == CLOSED:
+                return ticket
+
+            if self.state == OPEN:
+                if now - self.opened_at < self.reset_seconds:
+                    self.rejected += 1
+                    return None
+                self.state = HALF_OPEN
+                self._clear_probe()
+
+            # half-open: one probe in flight
+            if self._probe_at is not None and now - self._probe_at < self.reset_seconds:
+                self.rejected += 1
+                return None
+            self._probe_at = now
+            self._probe_ticket = ticket
+            return ticket
+
+    def _clear_probe(self) -> None:
+        self._probe_at = None
+        self._probe_ticket = None
+
+    def success(self) -> None:
+        with self._lock:
+            if self.state != CLOSED:
+                log.info("circuit %s closed", self.name)
+            self.state = CLOSED
+            self.failures = 0
+            self._clear_probe()
+
+    def failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != OPEN:
+                    self.times_opened += 1
+                    log.warning("circuit %s open after %s failure(s)", self.name, self.failures)
+                self.state = OPEN
+                self.opened_at = time.monotonic()
+                self._clear_probe()
+
+    def release(self, ticket: Optional[int]) -> None:
+        """
+        The call holding `ticket` ended without success or failure (cancelled,
+        or closed by its consumer). Frees the half-open probe slot if that call
+        is the probe; a no-op for any other call, or once it reported an outcome.
+        """
+        with self._lock:
+            if self.state == HALF_OPEN and ticket is not None and ticket == self._probe_ticket:
+                self._clear_probe()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "name": self.name,
+                "state": self.state,
+                "consecutive_failures": self.failures,
+                "times_opened": self.times_opened,
+                "rejected": self.rejected,
+            }
+
+
+_BREAKERS: Dict[str, CircuitBreaker] = {}
+_BREAKERS_LOCK = threading.Lock()
+
+
+def get_breaker(name: str) -> CircuitBreaker:
+    b = _BREAKERS.get(name)
+    if b is None:
+        with _BREAKERS_LOCK:
+            b = _BREAKERS.get(name)
+            if b is None:
+                b = _BREAKERS[name] = CircuitBreaker(
+                    name,
+                    failure_threshold=LLM_BREAKER_FAILURES,
+                    reset_seconds=LLM_BREAKER_RESET_SECONDS,
+                )
+    return b
+
+
+def breaker_stats() -> Dict:
+    return {name: b.stats() for name, b in list(_BREAKERS.items())}
@@ -0,0 +1,133 @@
+from __future__ import annotations
+
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import List, Optional, Tuple
+
+from langchain_core.embeddings import Embeddings
+
+log = logging.getLogger("embed_batcher")
+
+
+def embed_queries(emb: Embeddings, texts: List[str]) -> List[List[float]]:
+    """
+    Batched query embedding. Uses the provider's `embed_queries` when it has one;
+    otherwise falls back to one `embed_query` per text (still correct, just not batched).
+    """
+    fn = getattr(emb, "embed_queries", None)
+    if callable(fn):
+        return fn(texts)
+    return [emb.embed_query(t) for t in texts]
+
+
+def supports_batch_queries(emb: Embeddings) -> bool:
+    """
+    True if the provider embeds several queries in one call. Wrappers (the
+    embedding cache) are looked through; OllamaEmbeddings has no batch API.
+    """
+    inner = getattr(emb, "inner", None)
+    if inner is not None:
+        return supports_batch_queries(inner)
+    return callable(getattr(emb, "embed_queries", None))
+
+
+class QueryEmbedBatcher:
+    """
+    Process-wide micro-batcher for query embeddings.
+
+    Callers block in `embed()`; a collector thread gathers every query that
+    arrives within `max_wait_ms` of the first one (up to `max_batch`) and sends
+    them as one provider call. Each caller gets back its own vector. When
+    nothing is in flight and nothing else is queued there is no one to batch
+    with, so the query goes out at once instead of waiting out `max_wait_ms`.
+
+    Batches are dispatched to a small pool, so the next batch can be gathered
+    while the previous one is still in flight. Only worth it for providers
+    with a real batch API (see supports_batch_queries).
+    """
+
+    def __init__(self, emb: Embeddings, *, max_wait_ms: float, max_batch: int, max_in_flight: int = 4):
+        self.emb = emb
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self.max_batch = max(1, int(max_batch))
+
+        self.batches = 0
+        self.queries = 0
+        self._in_flight = 0
+        self._stats_lock = threading.Lock()
+
+        self._q: "queue.Queue[Tuple[str, Future]]" = queue.Queue()
+        self._pool = ThreadPoolExecutor(max_workers=max(1, int(max_in_flight)), thread_name_prefix="qembed")
+        self._thread = threading.Thread(target=self._run, name="qembed-collector", daemon=True)
+        self._thread.start()
+
+    def embed(self, text: str, timeout: Optional[float] = None) -> List[float]:
+        fut: Future = Future()
+        self._q.put((text, fut))
+        return fut.result(timeout=timeout)
+
+    def _run(self) -> None:
+        while True:
+            first = self._q.get()
+            batch = [first]
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self._q.get_nowait())
+                except queue.Empty:
+                    break
+
+            with self._stats_lock:
+                idle = self._in_flight == 0
+            deadline = time.perf_counter() + (0.0 if idle else self.max_wait)
+
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._q.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            with self._stats_lock:
+                self._in_flight += 1
+            self._pool.submit(self._dispatch, batch)
+
+    def _dispatch(self, batch: List[Tuple[str, Future]]) -> None:
+        texts = [t for t, _ in batch]
+        try:
+            vecs = embed_queries(self.emb, texts)
+        except Exception as e:
+            log.warning("Query embed batch of %s failed: %s", len(batch), e)
+            for _, fut in batch:
+                fut.set_exception(e)
+            return
+        finally:
+            with self._stats_lock:
+                self._in_flight -= 1
+
+        with self._stats_lock:
+            self.batches += 1
+            self.queries += len(batch)
+        for (_, fut), vec in zip(batch, vecs):
+            fut.set_result(vec)
+
+        if len(vecs) != len(batch):
+            log.warning("Query embed batch of %s returned %s vectors", len(batch), len(vecs))
+            err = RuntimeError(f"Embedding provider returned {len(vecs)} vectors for {len(batch)} queries.")
+            for _, fut in batch[len(vecs):]:
+                fut.set_exception(err)
+
+    def stats(self) -> dict:
+        return {
+            "batches": self.batches,
+            "queries": self.queries,
+            "avg_batch": round(self.queries / self.batches, 2) if self.batches else None,
+            "queued": self._q.qsize(),
+            "in_flight": self._in_flight,
+            "max_wait_ms": self.max_wait * 1000.0,
+            "max_batch": self.max_batch,
+        }
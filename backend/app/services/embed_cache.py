@@ -0,0 +1,276 @@
+from __future__ import annotations
+
+import hashlib
+import sqlite3
+import threading
+import time
+from array import array
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from langchain_core.embeddings import Embeddings
+
+from .embed_batcher import embed_queries
+
+_QUERY_PREFIX = "\x00query\x00"
+
+# LRU touches of cache hits are buffered and written in one batch once this
+# many are pending or this many seconds have passed
+_TOUCH_FLUSH_ROWS = 256
+_TOUCH_FLUSH_SECONDS = 30.0
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256((text or "").encode("utf-8")).hexdigest()
+
+
+def _pack(vec: List[float]) -> bytes:
+    return array("f", vec).tobytes()
+
+
+def _unpack(blob: bytes) -> List[float]:
+    a = array("f")
+    a.frombytes(blob)
+    return a.tolist()
+
+
+class EmbeddingCache:
+    """
+    Content-addressed embedding store on SQLite.
+
+    Key:   (provider, model, dim, sha256(text))
+    Value: float32 blob (4 bytes per dimension)
+
+    Size is capped at `max_bytes`; least recently used rows are evicted first.
+    The total size lives in a meta row that triggers keep up to date in the
+    same transaction as every insert/delete, so the cap holds across all
+    processes sharing the file. `last_used` is updated in batches (see
+    _TOUCH_FLUSH_ROWS), not on every hit.
+    """
+
+    def __init__(self, path: Path, *, max_bytes: int):
+        self.path = Path(path)
+        self.max_bytes = int(max_bytes)
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._lock = threading.Lock()
+        self._touched: Dict[Tuple[str, str, str], float] = {}
+        self._touched_at = time.monotonic()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS embeddings (
+                provider  TEXT    NOT NULL,
+                model     TEXT    NOT NULL,
+                dim       INTEGER NOT NULL,
+                text_hash TEXT    NOT NULL,
+                vec       BLOB    NOT NULL,
+                last_used REAL    NOT NULL,
+                PRIMARY KEY (provider, model, dim, text_hash)
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ix_embeddings_last_used ON embeddings (last_used)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS embed_meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+
+        # Size row and its triggers are created together, seeded from the rows already there
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._conn.execute(
+                "INSERT OR IGNORE INTO embed_meta (key, value) "
+                "SELECT 'bytes', COALESCE(SUM(LENGTH(vec)), 0) FROM embeddings"
+            )
+            self._conn.execute(
+                "CREATE TRIGGER IF NOT EXISTS tr_embeddings_size_ins AFTER INSERT ON embeddings BEGIN "
+                "UPDATE embed_meta SET value = value + LENGTH(NEW.vec) WHERE key = 'bytes'; END"
+            )
+            self._conn.execute(
+                "CREATE TRIGGER IF NOT EXISTS tr_embeddings_size_del AFTER DELETE ON embeddings BEGIN "
+                "UPDATE embed_meta SET value = value - LENGTH(OLD.vec) WHERE key = 'bytes'; END"
+            )
+            self._conn.execute("COMMIT")
+        except Exception:
+            self._conn.execute("ROLLBACK")
+            raise
+
+    def _size(self) -> int:
+        row = self._conn.execute("SELECT value FROM embed_meta WHERE key = 'bytes'").fetchone()
+        return int(row[0]) if row else 0
+
+    def _flush_touches_locked(self) -> None:
+        if self._touched:
+            self._conn.executemany(
+                "UPDATE embeddings SET last_used=? WHERE provider=? AND model=? AND text_hash=?",
+                [(t, provider, model, h) for (provider, model, h), t in self._touched.items()],
+            )
+            self._touched.clear()
+        self._touched_at = time.monotonic()
+
+    def get_many(self, provider: str, model: str, dim: Optional[int], hashes: List[str]) -> Dict[str, List[float]]:
+        if not hashes:
+            return {}
+
+        uniq = list(dict.fromkeys(hashes))
+        found: Dict[str, List[float]] = {}
+        now = time.time()
+
+        with self._lock:
+            # stay well under SQLITE_MAX_VARIABLE_NUMBER
+            for i in range(0, len(uniq), 500):
+                part = uniq[i : i + 500]
+                marks = ",".join("?" * len(part))
+                sql = f"SELECT text_hash, vec FROM embeddings WHERE provider=? AND model=? AND text_hash IN ({marks})"
+                args: list = [provider, model, *part]
+                if dim is not None:
+                    sql += " AND dim=?"
+                    args.append(int(dim))
+                for h, blob in self._conn.execute(sql, args):
+                    found[h] = _unpack(blob)
+
+            for h in found:
+                self._touched[(provider, model, h)] = now
+            if len(self._touched) >= _TOUCH_FLUSH_ROWS or time.monotonic() - self._touched_at >= _TOUCH_FLUSH_SECONDS:
+                self._flush_touches_locked()
+
+            self.hits += sum(1 for h in hashes if h in found)
+            self.misses += sum(1 for h in hashes if h not in found)
+
+        return found
+
+    def put_many(self, provider: str, model: str, items: Dict[str, List[float]]) -> None:
+        if not items:
+            return
+
+        now = time.time()
+        rows = [(provider, model, len(v), h, _pack(v), now) for h, v in items.items()]
+
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany(
+                    "INSERT OR IGNORE INTO embeddings (provider, model, dim, text_hash, vec, last_used) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    rows,
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+            if self._size() > self.max_bytes:
+                self._evict_locked()
+
+    def _evict_locked(self) -> None:
+        # LRU order has to include the hits not written yet
+        self._flush_touches_locked()
+
+        # Evict down to 90% of the cap so we don't evict on every insert.
+        # IMMEDIATE: the size is re-read under the write lock, so processes
+        # evicting at the same time don't both drop the same overshoot.
+        target = int(self.max_bytes * 0.9)
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            size = self._size()
+            while size > target:
+                rows = self._conn.execute(
+                    "SELECT rowid, LENGTH(vec) FROM embeddings ORDER BY last_used ASC LIMIT 1000"
+                ).fetchall()
+                if not rows:
+                    break
+
+                drop = []
+                for rowid, n in rows:
+                    if size <= target:
+                        break
+                    drop.append((rowid,))
+                    size -= int(n)
+
+                self._conn.executemany("DELETE FROM embeddings WHERE rowid=?", drop)
+                self.evictions += len(drop)
+            self._conn.execute("COMMIT")
+        except Exception:
+            self._conn.execute("ROLLBACK")
+            raise
+
+    def stats(self) -> Dict:
+        with self._lock:
+            rows = int(self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0])
+            total = self.hits + self.misses
+            return {
+                "path": str(self.path),
+                "rows": rows,
+                "bytes": self._size(),
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / total, 4) if total else None,
+            }
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Wraps any Embeddings and only sends cache misses to the provider.
+    Duplicate texts inside one call are embedded once.
+    """
+
+    def __init__(self, inner: Embeddings, cache: EmbeddingCache, *, provider: str, model: str, dim: Optional[int] = None):
+        self.inner = inner
+        self.cache = cache
+        self.provider = provider
+        self.model = model
+        self.dim = dim  # learned from the first provider response if not configured
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        texts = [t if t is not None else "" for t in texts]
+        hashes = [text_hash(t) for t in texts]
+
+        found = self.cache.get_many(self.provider, self.model, self.dim, hashes)
+
+        todo: Dict[str, str] = {}
+        for h, t in zip(hashes, texts):
+            if h not in found and h not in todo:
+                todo[h] = t
+
+        if todo:
+            vecs = self.inner.embed_documents(list(todo.values()))
+            fresh = dict(zip(todo.keys(), vecs))
+            self._store(fresh)
+            found.update(fresh)
+
+        return [found[h] for h in hashes]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_queries([text])[0]
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        # Some providers (e.g. Ollama) embed queries with a different instruction
+        # prefix than documents, so queries live under their own key.
+        texts = [t if t is not None else "" for t in texts]
+        hashes = [text_hash(_QUERY_PREFIX + t) for t in texts]
+
+        found = self.cache.get_many(self.provider, self.model, self.dim, hashes)
+
+        todo: Dict[str, str] = {}
+        for h, t in zip(hashes, texts):
+            if h not in found and h not in todo:
+                todo[h] = t
+
+        if todo:
+            vecs = embed_queries(self.inner, list(todo.values()))
+            fresh = dict(zip(todo.keys(), vecs))
+            self._store(fresh)
+            found.update(fresh)
+
+        return [found[h] for h in hashes]
+
+    def _store(self, fresh: Dict[str, List[float]]) -> None:
+        if self.dim is None and fresh:
+            self.dim = len(next(iter(fresh.values())))
+        self.cache.put_many(self.provider, self.model, fresh)
@@ -0,0 +1,127 @@
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import functools
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, TypeVar
+
+from ..config import settings
+
+T = TypeVar("T")
+
+# Threads for blocking ingest work driven from async handlers (embedding / Qdrant / MLflow I/O)
+INGEST_IO_THREADS = int(getattr(settings, "ingest_io_threads", None) or os.getenv("INGEST_IO_THREADS", "4"))
+# Processes for CPU-bound PDF parsing
+PDF_PARSE_WORKERS = int(getattr(settings, "pdf_parse_workers", None) or os.getenv("PDF_PARSE_WORKERS", str(os.cpu_count() or 1)))
+# Fresh interpreters for parse workers: forking this process would copy its
+# threads' locks (Qdrant/HTTP clients, the I/O pool) into the children.
+PDF_PARSE_START_METHOD = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+
+
+class MeteredExecutor:
+    """
+    Thin wrapper that counts submitted / running / finished tasks, so queue depth
+    (submitted but not yet running) can be reported without poking executor internals.
+    """
+
+    def __init__(self, name: str, inner: Executor, max_workers: int):
+        self.name = name
+        self.inner = inner
+        self.max_workers = max_workers
+        self._lock = threading.Lock()
+        self.submitted = 0
+        self.started = 0
+        self.finished = 0
+
+    def _on_start(self) -> None:
+        with self._lock:
+            self.started += 1
+
+    def _on_done(self, _fut: Future) -> None:
+        with self._lock:
+            self.finished += 1
+
+    def submit(self, fn: Callable[..., T], *args: Any, **kwargs: Any) -> Future:
+        with self._lock:
+            self.submitted += 1
+
+        if isinstance(self.inner, ThreadPoolExecutor):
+            def run():
+                self._on_start()
+                return fn(*args, **kwargs)
+
+            fut = self.inner.submit(run)
+        else:
+            # Process pools can't call back into this process when a task starts,
+            # so "running" is approximated as min(in-flight, max_workers).
+            fut = self.inner.submit(fn, *args, **kwargs)
+
+        fut.add_done_callback(self._on_done)
+        return fut
+
+    def stats(self) -> Dict:
+        with self._lock:
+            in_flight = self.submitted - self.finished
+            if isinstance(self.inner, ThreadPoolExecutor):
+                running = self.started - self.finished
+            else:
+                running = min(in_flight, self.max_workers)
+            return {
+                "name": self.name,
+                "max_workers": self.max_workers,
+                "running": running,
+                "queue_depth": in_flight - running,
+                "submitted": self.submitted,
+                "finished": self.finished,
+            }
+
+
+_IO: Optional[MeteredExecutor] = None
+_PARSE: Optional[MeteredExecutor] = None
+_LOCK = threading.Lock()
+
+
+def get_io_executor() -> MeteredExecutor:
+    global _IO
+    if _IO is None:
+        with _LOCK:
+            if _IO is None:
+                n = max(1, INGEST_IO_THREADS)
+                _IO = MeteredExecutor("ingest_io", ThreadPoolExecutor(max_workers=n, thread_name_prefix="ingest-io"), n)
+    return _IO
+
+
+def get_parse_executor() -> MeteredExecutor:
+    global _PARSE
+    if _PARSE is None:
+        with _LOCK:
+            if _PARSE is None:
+                n = max(1, PDF_PARSE_WORKERS)
+                _PARSE = MeteredExecutor(
+                    "pdf_parse",
+                    ProcessPoolExecutor(max_workers=n, mp_context=multiprocessing.get_context(PDF_PARSE_START_METHOD)),
+                    n,
+                )
+    return _PARSE
+
+
+async def run_io(fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """
+    Runs blocking work on the ingest I/O pool so the event loop stays free.
+    Context variables (e.g. record_embed_batches) are carried over.
+    """
+    ctx = contextvars.copy_context()
+    call = functools.partial(ctx.run, fn, *args, **kwargs)
+    return await asyncio.wrap_future(get_io_executor().submit(call))
+
+
+def executor_stats() -> Dict:
+    out = {}
+    for ex in (_IO, _PARSE):
+        if ex is not None:
+            out[ex.name] = ex.stats()
+    return out
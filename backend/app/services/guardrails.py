@@ -1,10 +1,42 @@
-from typing import List
+import os
+from typing import List, Optional
 from langchain_core.documents import Document
 
-def should_refuse(docs: List[Document]) -> bool:
+from ..config import settings
+
+
+def _min_score() -> float:
+    score = getattr(settings, "rag_min_score", None) or os.getenv("RAG_MIN_SCORE")
+    if score is not None:
+        return float(score)
+    # Qdrant cosine distance is 1 - similarity, so an existing RAG_MAX_DISTANCE
+    # cutoff carries over; with neither set the check is off.
+    distance = getattr(settings, "rag_max_distance", None) or os.getenv("RAG_MAX_DISTANCE")
+    return max(0.0, 1.0 - float(distance)) if distance is not None else 0.0
+
+
+# Refuse without calling the LLM when the best hit's cosine score is below this (0 disables)
+RAG_MIN_SCORE = _min_score()
+# Drop hits scoring more than this below the best one (0 disables)
+RAG_SCORE_GAP = float(getattr(settings, "rag_score_gap", None) or os.getenv("RAG_SCORE_GAP", "0"))
+
+
+def filter_by_score_gap(pairs: List[tuple], gap: float = RAG_SCORE_GAP) -> List[tuple]:
+    """Keeps (doc, score) pairs within `gap` of the best score."""
+    if gap <= 0 or not pairs:
+        return pairs
+    best = max(s for _, s in pairs)
+    return [(d, s) for d, s in pairs if s >= best - gap]
+
+
+def should_refuse(docs: List[Document], scores: Optional[List[float]] = None) -> bool:
     if not docs:
         return True
 
+    # Nothing close enough to the question: no point paying for a generation
+    if scores and RAG_MIN_SCORE > 0 and max(scores) < RAG_MIN_SCORE:
+        return True
+
     # If all chunks are tiny/empty, refuse
     non_empty = [d for d in docs if (d.page_content or "").strip()]
     if not non_empty:
@@ -0,0 +1,315 @@
+from __future__ import annotations
+
+import logging
+import os
+import queue
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set
+
+from langchain_core.documents import Document
+
+from ..config import settings
+from .chunker import iter_chunks
+from .pdf_loader import iter_pdf_text_by_page
+from .mlflow_logger import Timer, log_ingest
+from .registry import find_record, set_num_chunks, update_records
+from .summaries import SUMMARY_ON_INGEST, enqueue_summary
+from .vectorstore import (
+    QDRANT_UPSERT_BATCH_SIZE,
+    copy_chunks,
+    count_chunks,
+    delete_points,
+    doc_point_id,
+    embed_docs,
+    list_point_ids,
+    record_embed_batches,
+    upsert_embedded,
+)
+
+# Chunks per embed+upsert round (defaults to the Qdrant upsert batch size)
+INGEST_BATCH_SIZE = int(getattr(settings, "ingest_batch_size", None) or os.getenv("INGEST_BATCH_SIZE", str(QDRANT_UPSERT_BATCH_SIZE)))
+# Parsed batches allowed to wait for the embedder before the parser blocks
+INGEST_QUEUE_DEPTH = int(getattr(settings, "ingest_queue_depth", None) or os.getenv("INGEST_QUEUE_DEPTH", "2"))
+
+log = logging.getLogger("ingest")
+
+_DONE = object()
+
+
+def _batched(docs: Iterable[Document], size: int) -> Iterator[List[Document]]:
+    batch: List[Document] = []
+    for d in docs:
+        batch.append(d)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def ingest_pdf(
+    pdf_path: Path,
+    *,
+    file_id: str,
+    tenant_id: str,
+    source_name: Optional[str] = None,
+    chunk_size: Optional[int] = None,
+    chunk_overlap: Optional[int] = None,
+    batch_size: int = INGEST_BATCH_SIZE,
+    queue_depth: int = INGEST_QUEUE_DEPTH,
+    on_progress: Optional[Callable[[Dict], None]] = None,
+    existing_ids: Optional[Set[str]] = None,
+    written_ids: Optional[Set[str]] = None,
+) -> Dict:
+    """
+    Streaming page -> chunk -> embed -> upsert.
+
+    A producer thread parses pages and chunks them lazily into fixed-size
+    batches; the calling thread embeds and upserts each batch as it arrives.
+    The bounded queue between them is the backpressure: the parser stops once
+    `queue_depth` batches are waiting, so memory stays flat regardless of
+    page count.
+
+    `on_progress`, if given, is called after every embed and every upsert with
+    {"pages_parsed", "chunks_embedded", "chunks_upserted"}; raising from it
+    aborts the ingest.
+
+    Point IDs are deterministic (see vectorstore.point_id). Chunks whose ID is
+    already in `existing_ids` are unchanged and skipped without embedding.
+    `written_ids`, if given, collects the IDs this call upserts (i.e. the
+    points to delete to undo it).
+
+    Returns {"num_pages", "num_chunks", "num_upserted", "num_unchanged",
+    "point_ids"} where point_ids is every chunk ID of the current document.
+    """
+    q: "queue.Queue" = queue.Queue(maxsize=max(1, int(queue_depth)))
+    stop = threading.Event()
+    pages_seen = [0]
+
+    def counted_pages():
+        for page in iter_pdf_text_by_page(pdf_path):
+            pages_seen[0] += 1
+            yield page
+
+    def put(item) -> bool:
+        # Block on a full queue, but give up promptly if the consumer failed.
+        while not stop.is_set():
+            try:
+                q.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            docs = iter_chunks(
+                counted_pages(),
+                chunk_size=chunk_size or settings.chunk_size,
+                chunk_overlap=chunk_overlap or settings.chunk_overlap,
+                source_name=source_name or pdf_path.name,
+                file_id=file_id,
+                tenant_id=tenant_id,
+            )
+            for batch in _batched(docs, max(1, int(batch_size))):
+                if not put(batch):
+                    return
+            put(_DONE)
+        except BaseException as e:
+            put(e)
+
+    producer = threading.Thread(target=produce, name=f"ingest-parse-{file_id}", daemon=True)
+    producer.start()
+
+    embedded = 0
+    upserted = 0
+    unchanged = 0
+    seen: Set[str] = set()
+
+    def report():
+        if on_progress is not None:
+            on_progress(
+                {
+                    "pages_parsed": pages_seen[0],
+                    "chunks_embedded": embedded,
+                    "chunks_upserted": upserted,
+                }
+            )
+
+    try:
+        while True:
+            item = q.get()
+            if item is _DONE:
+                break
+            if isinstance(item, BaseException):
+                raise item
+
+            ids = [doc_point_id(d) for d in item]
+            seen.update(ids)
+            if existing_ids:
+                todo = [(d, pid) for d, pid in zip(item, ids) if pid not in existing_ids]
+                unchanged += len(item) - len(todo)
+                item = [d for d, _ in todo]
+                ids = [pid for _, pid in todo]
+            if not item:
+                continue
+            if written_ids is not None:
+                written_ids.update(ids)
+
+            vectors = embed_docs(item)
+            embedded += len(vectors)
+            report()
+
+            upserted += upsert_embedded(item, vectors)
+            report()
+    finally:
+        stop.set()
+        producer.join(timeout=5)
+
+    return {
+        "num_pages": pages_seen[0],
+        "num_chunks": upserted + unchanged,
+        "num_upserted": upserted,
+        "num_unchanged": unchanged,
+        "point_ids": seen,
+    }
+
+
+def ingest_file(
+    *,
+    tenant_id: str,
+    file_id: str,
+    force: bool = False,
+    on_progress: Optional[Callable[[Dict], None]] = None,
+    written_ids: Optional[Set[str]] = None,
+) -> Dict:
+    """
+    Full ingest of an uploaded PDF (skip / force re-ingest, pipeline, MLflow).
+    Shared by POST /ingest/{file_id} and the background job workers.
+    The resulting chunk count is stored on the registry record for /documents,
+    and ingested_at is bumped whenever chunks were (re)written, which
+    invalidates cached answers and the stored summary of this file. If the
+    ingest fails partway, the stored count is set to what actually made it
+    into Qdrant, so /documents doesn't keep the upload's 0 for a file with chunks.
+    Returns the IngestResponse fields as a dict.
+    """
+    try:
+        res = _ingest_file(tenant_id=tenant_id, file_id=file_id, force=force, on_progress=on_progress, written_ids=written_ids)
+    except Exception:
+        try:
+            set_num_chunks(
+                settings.app_data_dir,
+                tenant_id=tenant_id,
+                file_id=file_id,
+                num_chunks=count_chunks(tenant_id=tenant_id, file_id=file_id),
+            )
+        except Exception:
+            log.exception("recounting chunks of %s after a failed ingest failed", file_id)
+        raise
+    if res.get("already_ingested"):
+        set_num_chunks(settings.app_data_dir, tenant_id=tenant_id, file_id=file_id, num_chunks=res["num_chunks"])
+    else:
+        update_records(
+            settings.app_data_dir,
+            {
+                (tenant_id, file_id): {
+                    "num_chunks": int(res["num_chunks"]),
+                    "ingested_at": datetime.utcnow().isoformat() + "Z",
+                    "summary": None,
+                }
+            },
+        )
+        if SUMMARY_ON_INGEST and res["num_chunks"]:
+            enqueue_summary(tenant_id=tenant_id, file_id=file_id)
+    return res
+
+
+def _ingest_file(
+    *,
+    tenant_id: str,
+    file_id: str,
+    force: bool,
+    on_progress: Optional[Callable[[Dict], None]],
+    written_ids: Optional[Set[str]] = None,
+) -> Dict:
+    pdf_path = settings.uploads_dir / f"{file_id}.pdf"
+    if not pdf_path.exists():
+        raise FileNotFoundError(f"PDF not found for file_id={file_id}. Upload first.")
+
+    existing = count_chunks(tenant_id=tenant_id, file_id=file_id)
+    if existing > 0 and not force:
+        return {
+            "file_id": file_id,
+            "num_pages": None,
+            "num_chunks": existing,
+            "collection": settings.collection_name,
+            "ingested": True,
+            "already_ingested": True,
+        }
+
+    # Forced re-ingest diffs against what's stored: only new/changed chunks are
+    # embedded and upserted, and only chunks that no longer exist are deleted.
+    # This also lets an interrupted ingest resume without duplicates.
+    existing_ids: Optional[Set[str]] = None
+    if force and existing > 0:
+        existing_ids = list_point_ids(tenant_id=tenant_id, file_id=file_id)
+
+    # Re-upload of identical bytes: copy the original's vectors, no embedding calls.
+    # (A forced re-ingest always re-embeds, e.g. after changing chunk settings.)
+    rec = find_record(settings.app_data_dir, tenant_id=tenant_id, file_id=file_id) or {}
+    src = rec.get("alias_of")
+    if src and not force and count_chunks(tenant_id=tenant_id, file_id=src) > 0:
+        copied = copy_chunks(
+            tenant_id=tenant_id,
+            src_file_id=src,
+            dst_file_id=file_id,
+            on_progress=on_progress,
+            written_ids=written_ids,
+        )
+        return {
+            "file_id": file_id,
+            "num_pages": None,
+            "num_chunks": copied,
+            "collection": settings.collection_name,
+            "ingested": True,
+            "already_ingested": False,
+        }
+
+    with Timer() as t, record_embed_batches() as batches:
+        res = ingest_pdf(
+            pdf_path,
+            file_id=file_id,
+            tenant_id=tenant_id,
+            on_progress=on_progress,
+            existing_ids=existing_ids,
+            written_ids=written_ids,
+        )
+        num_deleted = delete_points(existing_ids - res["point_ids"]) if existing_ids else 0
+    num_pages, num_added = res["num_pages"], res["num_chunks"]
+
+    log_ingest(
+        file_id=file_id,
+        filename=pdf_path.name,
+        num_pages=num_pages,
+        num_chunks=num_added,
+        chunk_size=settings.chunk_size,
+        overlap=settings.chunk_overlap,
+        collection=settings.collection_name,
+        elapsed=t.dt,
+        embed_batches=batches,
+    )
+
+    return {
+        "file_id": file_id,
+        "num_pages": num_pages,
+        "num_chunks": num_added,
+        "collection": settings.collection_name,
+        "ingested": True,
+        "already_ingested": False,
+        "num_upserted": res["num_upserted"],
+        "num_unchanged": res["num_unchanged"],
+        "num_deleted": num_deleted,
+        "embed_batches": batches,
+    }
@@ -0,0 +1,392 @@
+from __future__ import annotations
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+from ..config import settings
+
+log = logging.getLogger("jobs")
+
+# Background ingest workers per process (0 disables them)
+INGEST_WORKERS = int(getattr(settings, "ingest_workers", None) or os.getenv("INGEST_WORKERS", "2"))
+# A running job whose heartbeat is older than this is assumed orphaned (worker died) and re-queued
+JOB_LEASE_SECONDS = float(getattr(settings, "job_lease_seconds", None) or os.getenv("JOB_LEASE_SECONDS", "300"))
+# Idle poll interval for workers
+JOB_POLL_SECONDS = float(getattr(settings, "job_poll_seconds", None) or os.getenv("JOB_POLL_SECONDS", "1.0"))
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+_COLUMNS = (
+    "job_id",
+    "tenant_id",
+    "file_id",
+    "kind",
+    "status",
+    "force",
+    "cancel_requested",
+    "pages_parsed",
+    "chunks_embedded",
+    "chunks_upserted",
+    "attempts",
+    "error",
+    "result",
+    "created_at",
+    "started_at",
+    "finished_at",
+    "heartbeat",
+)
+
+
+class JobCancelled(Exception):
+    pass
+
+
+def _now_iso() -> str:
+    return datetime.utcnow().isoformat() + "Z"
+
+
+class JobStore:
+    """
+    Durable ingest job queue on SQLite (WAL), safe across threads and
+    uvicorn worker processes. Claiming a job is a single IMMEDIATE transaction.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+
+        conn = self._conn()
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS jobs (
+                job_id           TEXT PRIMARY KEY,
+                tenant_id        TEXT NOT NULL,
+                file_id          TEXT NOT NULL,
+                kind             TEXT NOT NULL,
+                status           TEXT NOT NULL,
+                force            INTEGER NOT NULL DEFAULT 0,
+                cancel_requested INTEGER NOT NULL DEFAULT 0,
+                pages_parsed     INTEGER NOT NULL DEFAULT 0,
+                chunks_embedded  INTEGER NOT NULL DEFAULT 0,
+                chunks_upserted  INTEGER NOT NULL DEFAULT 0,
+                attempts         INTEGER NOT NULL DEFAULT 0,
+                error            TEXT,
+                result           TEXT,
+                created_at       TEXT NOT NULL,
+                started_at       TEXT,
+                finished_at      TEXT,
+                heartbeat        REAL
+            )
+            """
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS ix_jobs_status_created ON jobs (status, created_at)")
+        conn.execute("CREATE INDEX IF NOT EXISTS ix_jobs_tenant_created ON jobs (tenant_id, created_at)")
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.path), timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _to_dict(row: Optional[sqlite3.Row]) -> Optional[Dict]:
+        if row is None:
+            return None
+        d = {k: row[k] for k in _COLUMNS}
+        d["force"] = bool(d["force"])
+        d["cancel_requested"] = bool(d["cancel_requested"])
+        d["result"] = json.loads(d["result"]) if d["result"] else None
+        d.pop("heartbeat", None)
+        return d
+
+    def enqueue(self, *, tenant_id: str, file_id: str, force: bool = False, kind: str = "ingest") -> Dict:
+        job_id = uuid.uuid4().hex
+        self._conn().execute(
+            "INSERT INTO jobs (job_id, tenant_id, file_id, kind, status, force, created_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (job_id, tenant_id, file_id, kind, QUEUED, int(force), _now_iso()),
+        )
+        return self.get(job_id)  # type: ignore[return-value]
+
+    def get(self, job_id: str, *, tenant_id: Optional[str] = None) -> Optional[Dict]:
+        sql = "SELECT * FROM jobs WHERE job_id=?"
+        args: list = [job_id]
+        if tenant_id is not None:
+            sql += " AND tenant_id=?"
+            args.append(tenant_id)
+        return self._to_dict(self._conn().execute(sql, args).fetchone())
+
+    def list(self, *, tenant_id: str, status: Optional[str] = None, limit: int = 50) -> List[Dict]:
+        sql = "SELECT * FROM jobs WHERE tenant_id=?"
+        args: list = [tenant_id]
+        if status:
+            sql += " AND status=?"
+            args.append(status)
+        sql += " ORDER BY created_at DESC LIMIT ?"
+        args.append(int(limit))
+        return [self._to_dict(r) for r in self._conn().execute(sql, args)]  # type: ignore[misc]
+
+    def find_active(self, *, tenant_id: str, file_id: str, kind: str = "ingest") -> Optional[Dict]:
+        row = self._conn().execute(
+            "SELECT * FROM jobs WHERE tenant_id=? AND file_id=? AND kind=? AND status IN (?, ?) ORDER BY created_at LIMIT 1",
+            (tenant_id, file_id, kind, QUEUED, RUNNING),
+        ).fetchone()
+        return self._to_dict(row)
+
+    def claim(self) -> Optional[Dict]:
+        """
+        Atomically moves the oldest queued job to running. Jobs left running by a
+        dead worker (stale heartbeat) are re-queued first, with force=1 so the
+        partial ingest is replaced.
+        """
+        conn = self._conn()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "UPDATE jobs SET status=?, force=1 WHERE status=? AND heartbeat < ?",
+                (QUEUED, RUNNING, now - JOB_LEASE_SECONDS),
+            )
+            row = conn.execute(
+                "SELECT job_id FROM jobs WHERE status=? ORDER BY created_at LIMIT 1",
+                (QUEUED,),
+            ).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            conn.execute(
+                "UPDATE jobs SET status=?, started_at=?, heartbeat=?, attempts=attempts+1 WHERE job_id=?",
+                (RUNNING, _now_iso(), now, row["job_id"]),
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return self.get(row["job_id"])
+
+    def progress(self, job_id: str, *, pages_parsed: int, chunks_embedded: int, chunks_upserted: int) -> bool:
+        """Records progress + heartbeat. Returns True if cancellation was requested."""
+        conn = self._conn()
+        conn.execute(
+            "UPDATE jobs SET pages_parsed=?, chunks_embedded=?, chunks_upserted=?, heartbeat=? WHERE job_id=?",
+            (pages_parsed, chunks_embedded, chunks_upserted, time.time(), job_id),
+        )
+        row = conn.execute("SELECT cancel_requested FROM jobs WHERE job_id=?", (job_id,)).fetchone()
+        return bool(row and row["cancel_requested"])
+
+    def cancel_requested(self, job_id: str) -> bool:
+        row = self._conn().execute("SELECT cancel_requested FROM jobs WHERE job_id=?", (job_id,)).fetchone()
+        return bool(row and row["cancel_requested"])
+
+    def heartbeat(self, job_id: str) -> None:
+        self._conn().execute("UPDATE jobs SET heartbeat=? WHERE job_id=? AND status=?", (time.time(), job_id, RUNNING))
+
+    def finish(self, job_id: str, *, status: str, result: Optional[Dict] = None, error: Optional[str] = None) -> None:
+        self._conn().execute(
+            "UPDATE jobs SET status=?, result=?, error=?, finished_at=? WHERE job_id=?",
+            (status, json.dumps(result) if result is not None else None, error, _now_iso(), job_id),
+        )
+
+    def cancel(self, job_id: str, *, tenant_id: str) -> Optional[Dict]:
+        """
+        Queued jobs are cancelled immediately; running jobs are flagged and stop
+        at the next batch boundary.
+        """
+        conn = self._conn()
+        conn.execute(
+            "UPDATE jobs SET status=?, finished_at=? WHERE job_id=? AND tenant_id=? AND status=?",
+            (CANCELLED, _now_iso(), job_id, tenant_id, QUEUED),
+        )
+        conn.execute(
+            "UPDATE jobs SET cancel_requested=1 WHERE job_id=? AND tenant_id=? AND status=?",
+            (job_id, tenant_id, RUNNING),
+        )
+        return self.get(job_id, tenant_id=tenant_id)
+
+    def cancel_for_file(self, *, tenant_id: str, file_id: str) -> int:
+        """Cancels every active job (any kind) of one file, as cancel() does. Returns how many."""
+        conn = self._conn()
+        queued = conn.execute(
+            "UPDATE jobs SET status=?, finished_at=? WHERE tenant_id=? AND file_id=? AND status=?",
+            (CANCELLED, _now_iso(), tenant_id, file_id, QUEUED),
+        ).rowcount
+        running = conn.execute(
+            "UPDATE jobs SET cancel_requested=1 WHERE tenant_id=? AND file_id=? AND status=?",
+            (tenant_id, file_id, RUNNING),
+        ).rowcount
+        return queued + running
+
+
+_STORE: Optional[JobStore] = None
+_STORE_LOCK = threading.Lock()
+
+
+def get_job_store() -> JobStore:
+    global _STORE
+    if _STORE is None:
+        with _STORE_LOCK:
+            if _STORE is None:
+                _STORE = JobStore(settings.app_data_dir / "jobs.sqlite")
+    return _STORE
+
+
+@contextmanager
+def _heartbeat(store: JobStore, job_id: str) -> Iterator[None]:
+    """
+    Keeps the job's lease alive while it runs, whatever the job does (a
+    summary build reports no progress), so the stale-lease sweep in claim()
+    only re-queues jobs whose worker is really gone.
+    """
+    stop = threading.Event()
+
+    def tick() -> None:
+        while not stop.wait(max(1.0, JOB_LEASE_SECONDS / 3)):
+            try:
+                store.heartbeat(job_id)
+            except Exception:
+                log.exception("heartbeat for job %s failed", job_id)
+
+    t = threading.Thread(target=tick, name=f"job-heartbeat-{job_id[:8]}", daemon=True)
+    t.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        t.join(timeout=5)
+
+
+def _run_job(store: JobStore, job: Dict) -> None:
+    with _heartbeat(store, job["job_id"]):
+        _run_job_inner(store, job)
+
+
+def _run_job_inner(store: JobStore, job: Dict) -> None:
+    # Imported here so the job store can be used without pulling in the embedding stack.
+    from .ingest_pipeline import ingest_file
+    from .registry import set_num_chunks
+    from .summaries import build_summary
+    from .vectorstore import count_chunks, delete_points
+
+    job_id = job["job_id"]
+
+    def check_cancel() -> None:
+        if store.cancel_requested(job_id):
+            raise JobCancelled()
+
+    if job["kind"] == "summarize":
+        try:
+            summary = build_summary(tenant_id=job["tenant_id"], file_id=job["file_id"], check_cancel=check_cancel)
+        except JobCancelled:
+            # nothing to undo: the summary is only saved once the build completes
+            store.finish(job_id, status=CANCELLED)
+            log.info("job %s cancelled", job_id)
+            return
+        except Exception as e:
+            log.exception("job %s failed", job_id)
+            store.finish(job_id, status=FAILED, error=str(e))
+            return
+        store.finish(job_id, status=DONE, result={"summary_chars": len(summary or "")})
+        return
+
+    def on_progress(p: Dict) -> None:
+        if store.progress(job_id, **p):
+            raise JobCancelled()
+
+    written: set = set()
+    try:
+        result = ingest_file(
+            tenant_id=job["tenant_id"],
+            file_id=job["file_id"],
+            force=job["force"],
+            on_progress=on_progress,
+            written_ids=written,
+        )
+    except JobCancelled:
+        # Undo only what this job wrote: a cancelled re-ingest leaves the
+        # previous (complete) index as it was, a cancelled first ingest leaves nothing.
+        try:
+            delete_points(written)
+            set_num_chunks(
+                settings.app_data_dir,
+                tenant_id=job["tenant_id"],
+                file_id=job["file_id"],
+                num_chunks=count_chunks(tenant_id=job["tenant_id"], file_id=job["file_id"]),
+            )
+        except Exception as e:
+            log.exception("job %s cancelled, rolling back its points failed", job_id)
+            store.finish(job_id, status=FAILED, error=f"Cancelled, but rolling back written points failed: {e}")
+            return
+        store.finish(job_id, status=CANCELLED)
+        log.info("job %s cancelled", job_id)
+        return
+    except Exception as e:
+        log.exception("job %s failed", job_id)
+        store.finish(job_id, status=FAILED, error=str(e))
+        return
+
+    store.finish(job_id, status=DONE, result=result)
+    log.info("job %s done: %s chunks", job_id, result.get("num_chunks"))
+
+
+def _worker_loop(stop: threading.Event) -> None:
+    store = get_job_store()
+    while not stop.is_set():
+        try:
+            job = store.claim()
+        except Exception:
+            log.exception("job claim failed")
+            job = None
+
+        if job is None:
+            stop.wait(JOB_POLL_SECONDS)
+            continue
+
+        try:
+            _run_job(store, job)
+        except Exception as e:
+            # e.g. sqlite / Qdrant down while recording the outcome: keep this
+            # worker alive and don't leave the job running until its lease expires
+            log.exception("job %s crashed", job["job_id"])
+            try:
+                store.finish(job["job_id"], status=FAILED, error=str(e))
+            except Exception:
+                log.exception("marking job %s failed failed", job["job_id"])
+
+
+_WORKERS: List[threading.Thread] = []
+_STOP = threading.Event()
+
+
+def start_workers(n: int = INGEST_WORKERS) -> None:
+    if _WORKERS:
+        return
+    _STOP.clear()
+    for i in range(max(0, int(n))):
+        t = threading.Thread(target=_worker_loop, args=(_STOP,), name=f"ingest-worker-{i}", daemon=True)
+        t.start()
+        _WORKERS.append(t)
+    log.info("started %s ingest workers", len(_WORKERS))
+
+
+def stop_workers(timeout: float = 5.0) -> None:
+    _STOP.set()
+    for t in _WORKERS:
+        t.join(timeout=timeout)
+    _WORKERS.clear()
@@ -1,19 +1,76 @@
+import asyncio
 import json
 import logging
+import os
+import threading
+import httpx
 import requests
-from typing import Iterator, Optional
+from typing import AsyncIterator, Iterator, Optional, Tuple
 
 from ..config import settings
+from .admission import get_llm_limiter
+from .circuit_breaker import CircuitBreaker, CircuitOpen, get_breaker
 
 log = logging.getLogger("llm")
 
 # (connect timeout, read timeout)
 DEFAULT_TIMEOUT = (10, 600)
 
+# Pooled connections for the async LLM client (one per worker process)
+LLM_HTTP_MAX_CONNECTIONS = int(getattr(settings, "llm_http_max_connections", None) or os.getenv("LLM_HTTP_MAX_CONNECTIONS", "512"))
+LLM_HTTP_MAX_KEEPALIVE = int(getattr(settings, "llm_http_max_keepalive", None) or os.getenv("LLM_HTTP_MAX_KEEPALIVE", "64"))
+# Hedging (async streams): start Ollama too if Gemini has no first token within this many ms (0 = off)
+LLM_HEDGE_MS = int(getattr(settings, "llm_hedge_ms", None) or os.getenv("LLM_HEDGE_MS", "0"))
+GEMINI_API_BASE = getattr(settings, "gemini_api_base", None) or os.getenv("GEMINI_API_BASE", "https://generativelanguage.googleapis.com/v1beta")
+
 # -----------------------------
 # Process-wide cache (avoid re-init per request)
 # -----------------------------
 _GEMINI_CLIENT = None
+_SESSION: Optional[requests.Session] = None
+_SESSION_LOCK = threading.Lock()
+_HTTP: Optional[httpx.AsyncClient] = None
+
+
+def _session() -> requests.Session:
+    """Keep-alive session for the sync Ollama calls (instead of a new connection per request)."""
+    global _SESSION
+    if _SESSION is None:
+        with _SESSION_LOCK:
+            if _SESSION is None:
+                s = requests.Session()
+                adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=LLM_HTTP_MAX_KEEPALIVE)
+                s.mount("http://", adapter)
+                s.mount("https://", adapter)
+                _SESSION = s
+    return _SESSION
+
+
+def http_client() -> httpx.AsyncClient:
+    """
+    Shared async HTTP client for LLM calls. Created on first use inside the
+    event loop; every stream reuses its connection pool.
+    """
+    global _HTTP
+    if _HTTP is None or _HTTP.is_closed:
+        _HTTP = httpx.AsyncClient(
+            timeout=httpx.Timeout(DEFAULT_TIMEOUT[1], connect=DEFAULT_TIMEOUT[0]),
+            limits=httpx.Limits(
+                max_connections=LLM_HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=LLM_HTTP_MAX_KEEPALIVE,
+            ),
+        )
+    return _HTTP
+
+
+async def close_llm_clients() -> None:
+    global _HTTP, _SESSION
+    if _HTTP is not None:
+        await _HTTP.aclose()
+        _HTTP = None
+    if _SESSION is not None:
+        _SESSION.close()
+        _SESSION = None
 
 
 def _get_gemini_client():
@@ -49,7 +106,7 @@ def ollama_generate(
         },
     }
 
-    r = requests.post(url, json=payload, timeout=DEFAULT_TIMEOUT)
+    r = _session().post(url, json=payload, timeout=DEFAULT_TIMEOUT)
     r.raise_for_status()
     data = r.json()
     return data.get("response", "") or ""
@@ -75,7 +132,7 @@ def ollama_stream(
         },
     }
 
-    with requests.post(url, json=payload, stream=True, timeout=DEFAULT_TIMEOUT) as r:
+    with _session().post(url, json=payload, stream=True, timeout=DEFAULT_TIMEOUT) as r:
         r.raise_for_status()
 
         for line in r.iter_lines(decode_unicode=True):
@@ -147,50 +204,404 @@ def gemini_stream(
 
 # -----------------------------
 # Provider switch wrappers (IMPORTANT: must catch mid-stream errors)
+# Each provider sits behind a circuit breaker: while Gemini's is open, requests
+# go straight to Ollama instead of first waiting out a failing Gemini call.
+# Ollama's breaker only applies while it is Gemini's fallback.
 # -----------------------------
+def _provider() -> str:
+    return (settings.llm_provider or "ollama").lower().strip()
+
+
+def _ollama_open() -> CircuitOpen:
+    return CircuitOpen("Ollama circuit is open after repeated failures; retry shortly.")
+
+
+class _NoBreaker:
+    """Lets every call through and records nothing."""
+
+    def allow(self) -> int:
+        return 1
+
+    def success(self) -> None:
+        pass
+
+    def failure(self) -> None:
+        pass
+
+    def release(self, ticket: Optional[int]) -> None:
+        pass
+
+
+def _ollama_breaker():
+    # Failing fast only helps when there is somewhere else to go: with Ollama
+    # as the only provider, an open circuit would just turn a few transient
+    # errors into LLM_BREAKER_RESET_SECONDS of rejected requests
+    if _provider() == "gemini":
+        return get_breaker("ollama")
+    return _NoBreaker()
+
+
+def _ollama_generate_guarded(prompt: str, *, temperature: float, max_tokens: int) -> str:
+    b = _ollama_breaker()
+    ticket = b.allow()
+    if ticket is None:
+        raise _ollama_open()
+    try:
+        out = ollama_generate(prompt, temperature=temperature, max_tokens=max_tokens)
+        b.success()
+        return out
+    except Exception:
+        b.failure()
+        raise
+    finally:
+        b.release(ticket)
+
+
 def llm_generate(
     prompt: str,
     *,
     temperature: float = 0.1,
     max_tokens: int = 512,
 ) -> str:
-    provider = (settings.llm_provider or "ollama").lower().strip()
-
-    if provider == "gemini":
-        try:
-            out = gemini_generate(prompt, temperature=temperature, max_tokens=max_tokens)
-            if out:
+    if _provider() == "gemini":
+        gb = get_breaker("gemini")
+        ticket = gb.allow()
+        if ticket is not None:
+            try:
+                out = gemini_generate(prompt, temperature=temperature, max_tokens=max_tokens)
+                if not out:
+                    raise RuntimeError("Gemini returned empty response.")
+                gb.success()
                 return out
-            raise RuntimeError("Gemini returned empty response.")
-        except Exception as e:
-            log.exception("Gemini generate failed, falling back to Ollama: %s", e)
-            return ollama_generate(prompt, temperature=temperature, max_tokens=max_tokens)
+            except Exception as e:
+                gb.failure()
+                log.exception("Gemini generate failed, falling back to Ollama: %s", e)
+            finally:
+                gb.release(ticket)
 
-    return ollama_generate(prompt, temperature=temperature, max_tokens=max_tokens)
+    return _ollama_generate_guarded(prompt, temperature=temperature, max_tokens=max_tokens)
+
+
+# -----------------------------
+# Async (event loop) variants: no thread is held while waiting on the model
+# -----------------------------
+def _ollama_payload(prompt: str, *, model: Optional[str], temperature: float, max_tokens: int, stream: bool) -> dict:
+    return {
+        "model": model or settings.ollama_model,
+        "prompt": prompt,
+        "stream": stream,
+        "options": {
+            "temperature": float(temperature),
+            "num_predict": int(max_tokens),
+        },
+    }
 
 
-def llm_stream(
+async def aollama_generate(
     prompt: str,
     *,
+    model: Optional[str] = None,
     temperature: float = 0.1,
     max_tokens: int = 512,
-) -> Iterator[str]:
+) -> str:
+    payload = _ollama_payload(prompt, model=model, temperature=temperature, max_tokens=max_tokens, stream=False)
+    r = await http_client().post(f"{settings.ollama_base_url}/api/generate", json=payload)
+    r.raise_for_status()
+    return r.json().get("response", "") or ""
+
+
+async def aollama_stream(
+    prompt: str,
+    *,
+    model: Optional[str] = None,
+    temperature: float = 0.1,
+    max_tokens: int = 512,
+) -> AsyncIterator[str]:
+    payload = _ollama_payload(prompt, model=model, temperature=temperature, max_tokens=max_tokens, stream=True)
+
+    async with http_client().stream("POST", f"{settings.ollama_base_url}/api/generate", json=payload) as r:
+        r.raise_for_status()
+
+        async for line in r.aiter_lines():
+            if not line:
+                continue
+            try:
+                obj = json.loads(line)
+            except Exception:
+                continue
+
+            if obj.get("done"):
+                break
+
+            token = obj.get("response", "")
+            if token:
+                yield token
+
+
+def _gemini_rest_request(prompt: str, *, model: Optional[str], temperature: float, max_tokens: int) -> Tuple[str, dict]:
+    """("models/<name>", request body) for the Gemini REST generate endpoints."""
+    if not settings.gemini_api_key:
+        raise RuntimeError("GEMINI_API_KEY is not set")
+
+    m = model or settings.gemini_model
+    if not m.startswith("models/"):
+        m = f"models/{m}"
+
+    body = {
+        "contents": [{"role": "user", "parts": [{"text": prompt}]}],
+        "generationConfig": {
+            "temperature": float(temperature),
+            "maxOutputTokens": int(max_tokens),
+        },
+    }
+    return m, body
+
+
+def _gemini_texts(obj: dict) -> Iterator[str]:
+    for cand in obj.get("candidates") or []:
+        for part in (cand.get("content") or {}).get("parts") or []:
+            txt = part.get("text")
+            if txt:
+                yield txt
+
+
+async def agemini_generate(
+    prompt: str,
+    *,
+    model: Optional[str] = None,
+    temperature: float = 0.1,
+    max_tokens: int = 512,
+) -> str:
+    """
+    Gemini generateContent over the shared httpx pool (google-genai 0.6's
+    `aio` client runs the sync call in a worker thread underneath).
+    """
+    m, body = _gemini_rest_request(prompt, model=model, temperature=temperature, max_tokens=max_tokens)
+
+    r = await http_client().post(
+        f"{GEMINI_API_BASE}/{m}:generateContent",
+        headers={"x-goog-api-key": settings.gemini_api_key},
+        json=body,
+    )
+    if r.status_code >= 400:
+        raise RuntimeError(f"Gemini HTTP {r.status_code}: {r.text[:500]}")
+
+    return "".join(_gemini_texts(r.json())).strip()
+
+
+async def agemini_stream(
+    prompt: str,
+    *,
+    model: Optional[str] = None,
+    temperature: float = 0.1,
+    max_tokens: int = 512,
+) -> AsyncIterator[str]:
     """
-    IMPORTANT: This is a generator (yields). This allows us to catch errors
-    that happen *during* streaming (common for Gemini).
+    Gemini streamGenerateContent (SSE) over the shared httpx pool.
+    google-genai 0.6's `aio` streaming reads the response synchronously on
+    the event loop, so the REST endpoint is called directly here.
     """
-    provider = (settings.llm_provider or "ollama").lower().strip()
-
-    if provider == "gemini":
-        try:
-            for t in gemini_stream(prompt, temperature=temperature, max_tokens=max_tokens):
-                yield t
-            return
-        except Exception as e:
-            log.exception("Gemini stream failed, falling back to Ollama stream: %s", e)
-            for t in ollama_stream(prompt, temperature=temperature, max_tokens=max_tokens):
-                yield t
-            return
-
-    for t in ollama_stream(prompt, temperature=temperature, max_tokens=max_tokens):
+    m, body = _gemini_rest_request(prompt, model=model, temperature=temperature, max_tokens=max_tokens)
+
+    async with http_client().stream(
+        "POST",
+        f"{GEMINI_API_BASE}/{m}:streamGenerateContent",
+        params={"alt": "sse"},
+        headers={"x-goog-api-key": settings.gemini_api_key},
+        json=body,
+    ) as r:
+        if r.status_code >= 400:
+            await r.aread()
+            raise RuntimeError(f"Gemini HTTP {r.status_code}: {r.text[:500]}")
+
+        async for line in r.aiter_lines():
+            if not line.startswith("data:"):
+                continue
+            try:
+                obj = json.loads(line[5:])
+            except Exception:
+                continue
+
+            for txt in _gemini_texts(obj):
+                yield txt
+
+
+async def _aollama_stream_guarded(prompt: str, *, temperature: float, max_tokens: int) -> AsyncIterator[str]:
+    b = _ollama_breaker()
+    ticket = b.allow()
+    if ticket is None:
+        raise _ollama_open()
+    try:
+        async for t in aollama_stream(prompt, temperature=temperature, max_tokens=max_tokens):
+            yield t
+        b.success()
+    except Exception:
+        b.failure()
+        raise
+    finally:
+        b.release(ticket)
+
+
+async def allm_generate(
+    prompt: str,
+    *,
+    temperature: float = 0.1,
+    max_tokens: int = 512,
+) -> str:
+    if _provider() == "gemini":
+        gb = get_breaker("gemini")
+        ticket = gb.allow()
+        if ticket is not None:
+            try:
+                out = await agemini_generate(prompt, temperature=temperature, max_tokens=max_tokens)
+                if not out:
+                    raise RuntimeError("Gemini returned empty response.")
+                gb.success()
+                return out
+            except Exception as e:
+                gb.failure()
+                log.exception("Gemini generate failed, falling back to Ollama: %s", e)
+            finally:
+                gb.release(ticket)
+
+    b = _ollama_breaker()
+    ticket = b.allow()
+    if ticket is None:
+        raise _ollama_open()
+    try:
+        out = await aollama_generate(prompt, temperature=temperature, max_tokens=max_tokens)
+        b.success()
+    except Exception:
+        b.failure()
+        raise
+    finally:
+        b.release(ticket)
+    return out
+
+
+async def _hedged_stream(
+    prompt: str, *, gb: CircuitBreaker, ticket: int, tenant_id: str, temperature: float, max_tokens: int
+) -> AsyncIterator[str]:
+    """
+    Gemini first; if it has no first token within LLM_HEDGE_MS, Ollama is
+    started as well (when one more LLM slot is free right now; the hedge is
+    a second generation and counts against admission for `tenant_id`) and
+    whichever produces a first token wins. If Gemini fails before a first
+    token, Ollama takes over. The other one is cancelled and closed.
+    `ticket` is the call's admission from Gemini's breaker `gb`.
+    """
+    kw = {"temperature": temperature, "max_tokens": max_tokens}
+    gens = {"gemini": agemini_stream(prompt, **kw)}
+    tasks = {asyncio.ensure_future(gens["gemini"].__anext__()): "gemini"}
+    hedge_ticket = None
+
+    def start_fallback() -> None:
+        gens["ollama"] = _aollama_stream_guarded(prompt, **kw)
+        tasks[asyncio.ensure_future(gens["ollama"].__anext__())] = "ollama"
+
+    winner, first, error = None, None, None
+    try:
+        while tasks and winner is None:
+            timeout = LLM_HEDGE_MS / 1000.0 if "ollama" not in gens else None
+            done, _ = await asyncio.wait(tasks, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                hedge_ticket = get_llm_limiter().try_acquire(tenant_id)
+                if hedge_ticket is None:
+                    # no spare slot: keep waiting on Gemini, try again next interval
+                    continue
+                log.info("Gemini: no first token after %s ms, hedging with Ollama", LLM_HEDGE_MS)
+                start_fallback()
+                continue
+
+            for task in done:
+                name = tasks.pop(task)
+                try:
+                    tok = task.result()
+                except StopAsyncIteration:
+                    err: Exception = RuntimeError(f"{name} returned an empty stream.")
+                except Exception as e:
+                    err = e
+                else:
+                    if winner is None:
+                        winner, first = name, tok
+                    continue
+
+                error = err
+                if name == "gemini":
+                    gb.failure()
+                    log.warning("Gemini stream failed before first token, falling back to Ollama: %s", err)
+                    if "ollama" not in gens:
+                        start_fallback()
+
+        if winner is None:
+            raise error or RuntimeError("No LLM provider produced output.")
+    finally:
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+        for name, g in gens.items():
+            if name != winner:
+                await g.aclose()
+        if winner != "gemini":
+            # a cancelled Gemini leg has no outcome; don't hold a half-open probe
+            gb.release(ticket)
+        if hedge_ticket is not None:
+            # one generation left, covered by the request's own slot
+            hedge_ticket.release()
+
+    gen = gens[winner]
+    try:
+        yield first
+        async for t in gen:
+            yield t
+        if winner == "gemini":
+            gb.success()
+    except Exception as e:
+        if winner != "gemini":
+            raise
+        gb.failure()
+        log.exception("Gemini stream failed, falling back to Ollama stream: %s", e)
+        async for t in _aollama_stream_guarded(prompt, **kw):
+            yield t
+    finally:
+        await gen.aclose()
+        if winner == "gemini":
+            gb.release(ticket)
+
+
+async def allm_stream(
+    prompt: str,
+    *,
+    tenant_id: Optional[str] = None,
+    temperature: float = 0.1,
+    max_tokens: int = 512,
+) -> AsyncIterator[str]:
+    """
+    Streams from the configured provider with breakers and Ollama fallback,
+    plus hedging (LLM_HEDGE_MS) for callers that pass their `tenant_id`.
+    """
+    if _provider() == "gemini":
+        gb = get_breaker("gemini")
+        ticket = gb.allow()
+        if ticket is not None:
+            if LLM_HEDGE_MS > 0 and tenant_id is not None:
+                async for t in _hedged_stream(
+                    prompt, gb=gb, ticket=ticket, tenant_id=tenant_id, temperature=temperature, max_tokens=max_tokens
+                ):
+                    yield t
+                return
+
+            try:
+                async for t in agemini_stream(prompt, temperature=temperature, max_tokens=max_tokens):
+                    yield t
+                gb.success()
+                return
+            except Exception as e:
+                gb.failure()
+                log.exception("Gemini stream failed, falling back to Ollama stream: %s", e)
+            finally:
+                gb.release(ticket)
+
+    async for t in _aollama_stream_guarded(prompt, temperature=temperature, max_tokens=max_tokens):
         yield t
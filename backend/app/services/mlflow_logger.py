@@ -1,4 +1,5 @@
 import time
+from typing import Dict, List, Optional
 import mlflow
 
 def setup_mlflow(tracking_uri: str):
@@ -12,7 +13,7 @@ class Timer:
     def __exit__(self, exc_type, exc, tb):
         self.dt = time.time() - self.t0
 
-def log_ingest(file_id: str, filename: str, num_pages: int, num_chunks: int, chunk_size: int, overlap: int, collection: str, elapsed: float):
+def log_ingest(file_id: str, filename: str, num_pages: int, num_chunks: int, chunk_size: int, overlap: int, collection: str, elapsed: float, embed_batches: Optional[List[Dict]] = None):
     with mlflow.start_run(run_name=f"ingest:{file_id}"):
         mlflow.log_params({
             "file_id": file_id,
@@ -26,3 +27,21 @@ def log_ingest(file_id: str, filename: str, num_pages: int, num_chunks: int, chu
             "num_chunks": num_chunks,
             "ingest_seconds": elapsed,
         })
+        if embed_batches:
+            mlflow.log_metrics(_embed_batch_summary(embed_batches))
+
+
+def _embed_batch_summary(batches: List[Dict]) -> Dict[str, float]:
+    # One set of aggregates per run: a metric call per batch made large
+    # ingests as slow to log as to embed.
+    sizes = [b["size"] for b in batches]
+    seconds = [b["seconds"] for b in batches]
+    busy = sum(seconds)
+    return {
+        "embed_batches": len(batches),
+        "embed_texts": sum(sizes),
+        "embed_batch_size_avg": sum(sizes) / len(sizes),
+        "embed_batch_seconds_avg": busy / len(seconds),
+        "embed_batch_seconds_max": max(seconds),
+        "embed_texts_per_batch_sec": sum(sizes) / busy if busy > 0 else 0.0,
+    }
@@ -1,12 +1,74 @@
+import os
+from collections import deque
 from pathlib import Path
-from typing import List, Tuple
+from typing import Iterator, List, Optional, Tuple
 from pypdf import PdfReader
 
-def extract_pdf_text_by_page(pdf_path: Path) -> List[Tuple[int, str]]:
-    reader = PdfReader(str(pdf_path))
-    pages = []
+from ..config import settings
+from .executors import PDF_PARSE_WORKERS, get_parse_executor
+
+# PDFs with fewer pages than this are parsed in-process (splitting isn't worth it)
+PDF_PARALLEL_MIN_PAGES = int(getattr(settings, "pdf_parallel_min_pages", None) or os.getenv("PDF_PARALLEL_MIN_PAGES", "48"))
+# Pages handed to a worker per task
+PDF_PARALLEL_RANGE_PAGES = int(getattr(settings, "pdf_parallel_range_pages", None) or os.getenv("PDF_PARALLEL_RANGE_PAGES", "16"))
+
+
+def _clean(text: Optional[str]) -> str:
+    return " ".join((text or "").split())
+
+
+def _extract_range(pdf_path: str, start: int, end: int) -> List[Tuple[int, str]]:
+    """
+    Runs in a worker process: opens its own reader and extracts pages [start, end).
+    `start`/`end` are 0-based; returned page numbers are 1-based.
+    """
+    reader = PdfReader(pdf_path)
+    return [(i + 1, _clean(reader.pages[i].extract_text())) for i in range(start, end)]
+
+
+def _iter_serial(reader: PdfReader) -> Iterator[Tuple[int, str]]:
     for i, page in enumerate(reader.pages, start=1):
-        text = page.extract_text() or ""
-        text = " ".join(text.split())
-        pages.append((i, text))
-    return pages
+        yield i, _clean(page.extract_text())
+
+
+def _iter_parallel(pdf_path: Path, num_pages: int, workers: int) -> Iterator[Tuple[int, str]]:
+    pool = get_parse_executor()
+    # One range in flight per worker, so `workers` is the parallelism actually used
+    # (never more than the pool has processes).
+    workers = max(1, min(workers, pool.max_workers))
+    step = max(1, PDF_PARALLEL_RANGE_PAGES)
+    ranges = deque((s, min(num_pages, s + step)) for s in range(0, num_pages, step))
+
+    # Keep a bounded window of ranges in flight and yield them back in page order,
+    # so streaming consumers still see (1, ...), (2, ...), ... with flat memory.
+    window: deque = deque()
+    while ranges or window:
+        while ranges and len(window) < workers:
+            s, e = ranges.popleft()
+            window.append(pool.submit(_extract_range, str(pdf_path), s, e))
+        yield from window.popleft().result()
+
+
+def iter_pdf_text_by_page(pdf_path: Path, *, workers: Optional[int] = None) -> Iterator[Tuple[int, str]]:
+    """
+    Yields (page, text) one page at a time, so callers can start chunking and
+    embedding before the whole PDF has been parsed.
+
+    Large PDFs are split into page ranges across up to `workers` processes
+    of the parse pool (pypdf extraction is CPU-bound pure Python). Small
+    ones, and workers <= 1, are parsed in-process.
+    """
+    reader = PdfReader(str(pdf_path))
+    num_pages = len(reader.pages)
+    workers = PDF_PARSE_WORKERS if workers is None else int(workers)
+
+    if workers <= 1 or num_pages < PDF_PARALLEL_MIN_PAGES:
+        yield from _iter_serial(reader)
+        return
+
+    del reader
+    yield from _iter_parallel(pdf_path, num_pages, workers)
+
+
+def extract_pdf_text_by_page(pdf_path: Path, *, workers: Optional[int] = None) -> List[Tuple[int, str]]:
+    return list(iter_pdf_text_by_page(pdf_path, workers=workers))
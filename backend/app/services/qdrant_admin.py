@@ -1,11 +1,133 @@
-from qdrant_client import QdrantClient
+import logging
+import os
+import threading
+import time
+from typing import Optional
+
+import httpx
+from qdrant_client import AsyncQdrantClient, QdrantClient
 from qdrant_client.http import models as rest
 
 from ..config import settings
 
+log = logging.getLogger("qdrant")
+
+# Use gRPC (port QDRANT_GRPC_PORT) for point operations instead of REST
+QDRANT_PREFER_GRPC = str(getattr(settings, "qdrant_prefer_grpc", None) or os.getenv("QDRANT_PREFER_GRPC", "false")).lower() in ("1", "true", "yes")
+QDRANT_GRPC_PORT = int(getattr(settings, "qdrant_grpc_port", None) or os.getenv("QDRANT_GRPC_PORT", "6334"))
+QDRANT_TIMEOUT = int(getattr(settings, "qdrant_timeout", None) or os.getenv("QDRANT_TIMEOUT", "30"))
+# Keep-alive pool size for the REST transport
+QDRANT_POOL_SIZE = int(getattr(settings, "qdrant_pool_size", None) or os.getenv("QDRANT_POOL_SIZE", "32"))
+# How often (at most) a shared client is health-checked before being handed out
+QDRANT_HEALTHCHECK_SECONDS = float(getattr(settings, "qdrant_healthcheck_seconds", None) or os.getenv("QDRANT_HEALTHCHECK_SECONDS", "30"))
+
+
+def _client_kwargs() -> dict:
+    kw = {
+        "url": settings.qdrant_url,
+        "prefer_grpc": QDRANT_PREFER_GRPC,
+        "grpc_port": QDRANT_GRPC_PORT,
+        "timeout": QDRANT_TIMEOUT,
+    }
+    if not QDRANT_PREFER_GRPC:
+        # forwarded to the underlying httpx client
+        kw["limits"] = httpx.Limits(
+            max_connections=QDRANT_POOL_SIZE,
+            max_keepalive_connections=QDRANT_POOL_SIZE,
+        )
+    return kw
+
+
+_CLIENT: Optional[QdrantClient] = None
+_CLIENT_CHECKED = 0.0
+_ASYNC_CLIENT: Optional[AsyncQdrantClient] = None
+_LOCK = threading.Lock()
+# Held by the one thread pinging the shared client; everyone else keeps using it meanwhile
+_CHECK_LOCK = threading.Lock()
+
+
+def _close_later(client: QdrantClient) -> None:
+    """Closes a replaced client once requests already using it have had time to finish."""
+
+    def close():
+        try:
+            client.close()
+        except Exception:
+            pass
+
+    t = threading.Timer(QDRANT_TIMEOUT + 5, close)
+    t.daemon = True
+    t.start()
+
 
 def qdrant_client() -> QdrantClient:
-    return QdrantClient(url=settings.qdrant_url)
+    """
+    Process-wide Qdrant client (pooled keep-alive connections, optional gRPC).
+    Every QDRANT_HEALTHCHECK_SECONDS one caller pings it (without holding up
+    the others); if the ping fails a new client is swapped in and the old one
+    is closed after a grace period, since other threads may still be using it.
+    """
+    global _CLIENT, _CLIENT_CHECKED
+    client = _CLIENT
+    if client is None:
+        with _LOCK:
+            if _CLIENT is None:
+                _CLIENT = QdrantClient(**_client_kwargs())
+                _CLIENT_CHECKED = time.monotonic()
+            return _CLIENT
+
+    if time.monotonic() - _CLIENT_CHECKED < QDRANT_HEALTHCHECK_SECONDS or not _CHECK_LOCK.acquire(blocking=False):
+        return client
+
+    try:
+        if _CLIENT is not client or time.monotonic() - _CLIENT_CHECKED < QDRANT_HEALTHCHECK_SECONDS:
+            return _CLIENT
+        try:
+            client.info()
+        except Exception as e:
+            log.warning("Qdrant health check failed, reconnecting: %s", e)
+            fresh = QdrantClient(**_client_kwargs())
+            with _LOCK:
+                _CLIENT = fresh
+                _CLIENT_CHECKED = time.monotonic()
+            _close_later(client)
+            return fresh
+        _CLIENT_CHECKED = time.monotonic()
+        return client
+    finally:
+        _CHECK_LOCK.release()
+
+
+def async_qdrant_client() -> AsyncQdrantClient:
+    """
+    Async twin of qdrant_client() for the chat routes' retrieval on the event
+    loop (same transport settings). Created on first use inside the loop.
+    """
+    global _ASYNC_CLIENT
+    if _ASYNC_CLIENT is None:
+        _ASYNC_CLIENT = AsyncQdrantClient(**_client_kwargs())
+    return _ASYNC_CLIENT
+
+
+def close_clients() -> None:
+    global _CLIENT
+    with _LOCK:
+        if _CLIENT is not None:
+            try:
+                _CLIENT.close()
+            except Exception:
+                pass
+        _CLIENT = None
+
+
+async def close_async_client() -> None:
+    global _ASYNC_CLIENT
+    client, _ASYNC_CLIENT = _ASYNC_CLIENT, None
+    if client is not None:
+        try:
+            await client.close()
+        except Exception:
+            pass
 
 
 def delete_points_for_file(*, tenant_id: str, file_id: str) -> int:
@@ -2,7 +2,33 @@ from typing import List, Optional, Tuple
 from langchain_core.documents import Document
 
 from ..config import settings
-from .vectorstore import similarity_search
+from .guardrails import filter_by_score_gap
+from .registry import tenant_files
+from .vectorstore import asimilarity_search_with_score, similarity_search_with_score
+
+
+class UnknownFiles(LookupError):
+    pass
+
+
+def resolve_file_ids(file_ids: Optional[List[str]], *, tenant_id: str) -> Optional[List[str]]:
+    """
+    Narrows a chat's file filter using the registry's in-memory view, before
+    any embedding or Qdrant call:
+    - None: search the whole tenant (it has ingested chunks)
+    - []: nothing ingested in scope, refuse
+    - otherwise: the requested file_ids that exist and have chunks
+    Raises UnknownFiles if none of the requested file_ids exist for this tenant.
+    """
+    files = tenant_files(settings.app_data_dir, tenant_id=tenant_id)
+
+    if not file_ids:
+        return None if any(files.values()) else []
+
+    known = [f for f in dict.fromkeys(file_ids) if f in files]
+    if not known:
+        raise UnknownFiles(f"Unknown file_id(s): {', '.join(file_ids)}")
+    return [f for f in known if files[f]]
 
 
 def retrieve(
@@ -11,16 +37,30 @@ def retrieve(
     top_k: int,
     file_ids: Optional[List[str]],
     tenant_id: str,
+    embedding: Optional[List[float]] = None,
 ) -> List[Tuple[Document, float]]:
-    docs = similarity_search(
+    pairs = similarity_search_with_score(
         query=question,
         k=top_k,
         file_ids=file_ids,
         tenant_id=tenant_id,
+        embedding=embedding,
     )
 
-    # Placeholder scores (LangChain similarity_search doesn't always return scores)
-    return [(d, 0.0) for d in docs]
+    # (doc, cosine score), best first
+    return filter_by_score_gap(pairs)
+
+
+async def aretrieve(
+    *,
+    embedding: List[float],
+    top_k: int,
+    file_ids: Optional[List[str]],
+    tenant_id: str,
+) -> List[Tuple[Document, float]]:
+    """retrieve() for the event loop (async Qdrant client); needs the query embedding."""
+    pairs = await asimilarity_search_with_score(embedding, k=top_k, file_ids=file_ids, tenant_id=tenant_id)
+    return filter_by_score_gap(pairs)
 
 
 def build_context(docs: List[Document], *, max_chars: int = 3000) -> str:
@@ -48,6 +88,40 @@ def build_context(docs: List[Document], *, max_chars: int = 3000) -> str:
     return "\n".join(parts)
 
 
+CONTINUE_NOTE = (
+    "IMPORTANT: The answer below stops too early. Continue it from where it stops "
+    "with more specific, grounded detail. Do not repeat or restart it."
+)
+
+
+def continuation_prompt(prompt: str, answer: str) -> str:
+    """
+    Prompt that asks the model to extend `answer` rather than regenerate:
+    the original prompt (up to ANSWER:) plus the answer so far as the start
+    of the completion.
+    """
+    head, sep, _ = prompt.rpartition("ANSWER:")
+    if not sep:
+        head = prompt + "\n\n"
+    return f"{head}{CONTINUE_NOTE}\n\nANSWER:\n{answer}"
+
+
+def remaining_tokens(max_tokens: int, answer: str) -> int:
+    """Token budget left for a continuation (~4 chars per token, no tokenizer here)."""
+    return int(max_tokens) - (len(answer) + 3) // 4
+
+
+# Not worth a continuation call below this many tokens
+MIN_CONTINUATION_TOKENS = 32
+
+
+def continuation_sep(answer: str, more: str) -> str:
+    """Separator to put between an answer and its continuation ("" or " ")."""
+    if not answer or not more or answer[-1].isspace() or more[0].isspace():
+        return ""
+    return " "
+
+
 def make_citations(docs: List[Document], scores: List[float]):
     cits = []
     for d, s in zip(docs, scores):
@@ -1,36 +1,325 @@
+import base64
 import json
+import logging
+import sqlite3
+import threading
 from pathlib import Path
-from typing import Dict, List
+from typing import Dict, List, Optional, Tuple
 from typing import Iterable
 
+log = logging.getLogger("registry")
+
+SORT_FIELDS = ("created_at", "filename", "num_chunks")
+
+# Columns mirrored out of the record dict so they can be indexed / sorted on.
+# The full record (including any other keys) is kept as JSON in `data`.
+_COLUMNS = ("tenant_id", "file_id", "filename", "created_at", "sha256", "num_chunks")
+
+_SORT_EXPR = {
+    "created_at": "COALESCE(created_at, '')",
+    "filename": "COALESCE(filename, '')",
+    "num_chunks": "COALESCE(num_chunks, -1)",
+}
+
+
 def registry_path(app_data_dir: Path) -> Path:
+    """Legacy JSONL registry; migrated into registry.sqlite on first use."""
     return app_data_dir / "registry.jsonl"
 
-def load_records(app_data_dir: Path) -> List[Dict]:
-    p = registry_path(app_data_dir)
-    if not p.exists():
-        return []
-    out = []
-    for line in p.read_text(encoding="utf-8").splitlines():
+
+def registry_db_path(app_data_dir: Path) -> Path:
+    return app_data_dir / "registry.sqlite"
+
+
+class _Registry:
+    """
+    Document registry on SQLite in WAL mode: O(log n) lookups through indexes
+    and transactional writes that are safe across threads and uvicorn workers.
+    """
+
+    def __init__(self, app_data_dir: Path):
+        self.app_data_dir = app_data_dir
+        self.path = registry_db_path(app_data_dir)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+
+        # Per-tenant ({file_id: has_chunks}, {file_id: ingested_at}) for the chat path.
+        # Its own connection sees every commit (any thread / process) as a data_version bump.
+        self._view: Dict[str, Tuple[Dict[str, bool], Dict[str, Optional[str]]]] = {}
+        self._view_version = None
+        self._view_lock = threading.Lock()
+        self._view_conn = sqlite3.connect(str(self.path), timeout=30, isolation_level=None, check_same_thread=False)
+
+        conn = self.conn()
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS records (
+                tenant_id  TEXT,
+                file_id    TEXT,
+                filename   TEXT,
+                created_at TEXT,
+                sha256     TEXT,
+                num_chunks INTEGER,
+                data       TEXT NOT NULL
+            )
+            """
+        )
+        conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS ux_records_tenant_file ON records (tenant_id, file_id)")
+        conn.execute("CREATE INDEX IF NOT EXISTS ix_records_tenant_created ON records (tenant_id, created_at)")
+        conn.execute("CREATE INDEX IF NOT EXISTS ix_records_tenant_sha256 ON records (tenant_id, sha256)")
+        self._migrate_jsonl()
+
+    def conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.path), timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def tenant_view(self, tenant_id: str) -> Tuple[Dict[str, bool], Dict[str, Optional[str]]]:
+        with self._view_lock:
+            version = self._view_conn.execute("PRAGMA data_version").fetchone()[0]
+            if version != self._view_version:
+                self._view.clear()
+                self._view_version = version
+
+            view = self._view.get(tenant_id)
+            if view is None:
+                rows = self._view_conn.execute(
+                    "SELECT file_id, num_chunks, json_extract(data, '$.ingested_at') FROM records "
+                    "WHERE tenant_id=? AND file_id IS NOT NULL",
+                    (tenant_id,),
+                ).fetchall()
+                # num_chunks is unknown (NULL) only on legacy records: assume they have chunks
+                files = {fid: n is None or n > 0 for fid, n, _ in rows}
+                versions = {fid: ts for fid, _, ts in rows if files[fid]}
+                view = self._view[tenant_id] = (files, versions)
+            return view
+
+    def _migrate_jsonl(self) -> None:
+        src = registry_path(self.app_data_dir)
+        if not src.exists():
+            return
+
+        conn = self.conn()
+        conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        # The write lock serializes workers starting together; the marker row
+        # commits with the records, so exactly one of them migrates.
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if conn.execute("SELECT 1 FROM meta WHERE key='jsonl_migrated'").fetchone():
+                conn.execute("ROLLBACK")
+                records = None
+            else:
+                records = _read_jsonl(src)
+                for r in records:
+                    _insert(conn, r, replace=True)
+                conn.execute("INSERT INTO meta (key, value) VALUES ('jsonl_migrated', ?)", (str(len(records)),))
+                conn.execute("COMMIT")
+        except FileNotFoundError:
+            # renamed by a worker that migrated before the marker existed
+            conn.execute("ROLLBACK")
+            return
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+        try:
+            src.rename(src.with_name(src.name + ".migrated"))
+        except FileNotFoundError:
+            pass  # another worker renamed it first
+        if records is not None:
+            log.info("Migrated %s registry records from %s", len(records), src)
+
+
+def _read_jsonl(src: Path) -> List[Dict]:
+    records = []
+    for line in src.read_text(encoding="utf-8").splitlines():
         line = line.strip()
         if not line:
             continue
         try:
-            out.append(json.loads(line))
+            records.append(json.loads(line))
         except Exception:
             # skip corrupted line
             continue
-    return out
+    return records
+
+
+def _row(record: Dict) -> tuple:
+    vals = []
+    for c in _COLUMNS:
+        v = record.get(c)
+        if c == "num_chunks" and v is not None:
+            v = int(v)
+        vals.append(v)
+    return (*vals, json.dumps(record, ensure_ascii=False))
+
+
+def _insert(conn: sqlite3.Connection, record: Dict, *, replace: bool = False) -> None:
+    verb = "INSERT OR REPLACE" if replace else "INSERT"
+    conn.execute(
+        f"{verb} INTO records ({', '.join(_COLUMNS)}, data) VALUES ({', '.join('?' * (len(_COLUMNS) + 1))})",
+        _row(record),
+    )
+
+
+_STORES: Dict[Path, _Registry] = {}
+_STORES_LOCK = threading.Lock()
+
+
+def _store(app_data_dir: Path) -> _Registry:
+    key = Path(app_data_dir)
+    reg = _STORES.get(key)
+    if reg is None:
+        with _STORES_LOCK:
+            reg = _STORES.get(key)
+            if reg is None:
+                reg = _STORES[key] = _Registry(key)
+    return reg
+
+
+def _query(app_data_dir: Path, sql: str, args: Iterable = ()) -> List[Dict]:
+    return [json.loads(d) for (d,) in _store(app_data_dir).conn().execute(sql, tuple(args))]
+
+
+def load_records(app_data_dir: Path, *, tenant_id: Optional[str] = None) -> List[Dict]:
+    if tenant_id is None:
+        return _query(app_data_dir, "SELECT data FROM records ORDER BY rowid")
+    return _query(app_data_dir, "SELECT data FROM records WHERE tenant_id=? ORDER BY rowid", (tenant_id,))
 
 def append_record(app_data_dir: Path, record: Dict) -> None:
-    p = registry_path(app_data_dir)
-    p.parent.mkdir(parents=True, exist_ok=True)
-    with p.open("a", encoding="utf-8") as f:
-        f.write(json.dumps(record, ensure_ascii=False) + "\n")
+    _insert(_store(app_data_dir).conn(), record)
 
 def rewrite_records(app_data_dir: Path, records: Iterable[Dict]) -> None:
-    p = registry_path(app_data_dir)
-    p.parent.mkdir(parents=True, exist_ok=True)
-    with p.open("w", encoding="utf-8") as f:
+    """Replaces the whole registry in one transaction."""
+    conn = _store(app_data_dir).conn()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.execute("DELETE FROM records")
         for r in records:
-            f.write(json.dumps(r, ensure_ascii=False) + "\n")
+            _insert(conn, r, replace=True)
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+def delete_record(app_data_dir: Path, *, tenant_id: str, file_id: str) -> bool:
+    cur = _store(app_data_dir).conn().execute(
+        "DELETE FROM records WHERE tenant_id=? AND file_id=?", (tenant_id, file_id)
+    )
+    return cur.rowcount > 0
+
+def tenant_files(app_data_dir: Path, *, tenant_id: str) -> Dict[str, bool]:
+    """
+    {file_id: has_chunks} for a tenant, from an in-memory view that is reloaded
+    only after a registry write. Cheap enough to call on every chat request.
+    Don't mutate the returned dict.
+    """
+    return _store(app_data_dir).tenant_view(tenant_id)[0]
+
+def tenant_file_versions(app_data_dir: Path, *, tenant_id: str) -> Dict[str, Optional[str]]:
+    """
+    {file_id: ingested_at} for a tenant's files that have chunks (same in-memory
+    view as tenant_files). Changes whenever one of them is re-ingested or deleted.
+    """
+    return _store(app_data_dir).tenant_view(tenant_id)[1]
+
+def find_record(app_data_dir: Path, *, tenant_id: str, file_id: str) -> Optional[Dict]:
+    out = _query(app_data_dir, "SELECT data FROM records WHERE tenant_id=? AND file_id=?", (tenant_id, file_id))
+    return out[0] if out else None
+
+def find_by_sha256(app_data_dir: Path, *, tenant_id: str, sha256: str) -> Optional[Dict]:
+    """Oldest record of this tenant with the same content hash (the original upload)."""
+    out = _query(
+        app_data_dir,
+        "SELECT data FROM records WHERE tenant_id=? AND sha256=? AND file_id IS NOT NULL ORDER BY rowid LIMIT 1",
+        (tenant_id, sha256),
+    )
+    return out[0] if out else None
+
+def update_records(app_data_dir: Path, updates: Dict[Tuple[str, str], Dict]) -> int:
+    """
+    Applies field updates keyed by (tenant_id, file_id) in one transaction.
+    Returns the number of records changed.
+    """
+    if not updates:
+        return 0
+
+    conn = _store(app_data_dir).conn()
+    changed = 0
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        for (tenant_id, file_id), upd in updates.items():
+            row = conn.execute(
+                "SELECT rowid, data FROM records WHERE tenant_id=? AND file_id=?", (tenant_id, file_id)
+            ).fetchone()
+            if row is None:
+                continue
+            rec = json.loads(row[1])
+            rec.update(upd)
+            conn.execute(
+                f"UPDATE records SET {', '.join(c + '=?' for c in _COLUMNS)}, data=? WHERE rowid=?",
+                (*_row(rec), row[0]),
+            )
+            changed += 1
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    return changed
+
+def set_num_chunks(app_data_dir: Path, *, tenant_id: str, file_id: str, num_chunks: int) -> None:
+    update_records(app_data_dir, {(tenant_id, file_id): {"num_chunks": int(num_chunks)}})
+
+def _encode_cursor(key: tuple) -> str:
+    return base64.urlsafe_b64encode(json.dumps(list(key)).encode("utf-8")).decode("ascii")
+
+def _decode_cursor(cursor: str) -> tuple:
+    try:
+        return tuple(json.loads(base64.urlsafe_b64decode(cursor.encode("ascii"))))
+    except Exception:
+        raise ValueError("Invalid cursor.")
+
+def list_records(
+    app_data_dir: Path,
+    *,
+    tenant_id: str,
+    sort: str = "created_at",
+    order: str = "desc",
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+) -> Tuple[List[Dict], Optional[str]]:
+    """
+    One page of a tenant's records, sorted by `sort` (ties broken by file_id).
+    Keyset pagination: pass the returned cursor to get the next page.
+    Returns (records, next_cursor or None).
+    """
+    if sort not in SORT_FIELDS:
+        raise ValueError(f"sort must be one of {SORT_FIELDS}")
+    desc = order == "desc"
+    expr = _SORT_EXPR[sort]
+
+    sql = f"SELECT {expr}, file_id, data FROM records WHERE tenant_id=? AND file_id IS NOT NULL"
+    args: list = [tenant_id]
+    if cursor:
+        after = _decode_cursor(cursor)
+        sql += f" AND ({expr}, file_id) {'<' if desc else '>'} (?, ?)"
+        args.extend(after)
+    direction = "DESC" if desc else "ASC"
+    sql += f" ORDER BY {expr} {direction}, file_id {direction}"
+    if limit is not None:
+        # one extra row tells us whether there is a next page
+        sql += " LIMIT ?"
+        args.append(int(limit) + 1)
+
+    rows = _store(app_data_dir).conn().execute(sql, args).fetchall()
+
+    next_cursor = None
+    if limit is not None and len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = _encode_cursor((rows[-1][0], rows[-1][1]))
+
+    return [json.loads(r[2]) for r in rows], next_cursor
@@ -0,0 +1,255 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import threading
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional, TypeVar
+
+from ..config import settings
+
+log = logging.getLogger("singleflight")
+
+T = TypeVar("T")
+
+# Share one retrieval + generation between identical concurrent chat requests
+SINGLEFLIGHT_ENABLED = (getattr(settings, "singleflight_enabled", None) or os.getenv("SINGLEFLIGHT_ENABLED", "true")).lower() in ("1", "true", "yes")
+
+
+def normalize_question(q: str) -> str:
+    # Case, whitespace and trailing punctuation don't make a different question
+    return " ".join((q or "").casefold().split()).rstrip("?!. ")
+
+
+def flight_key(tenant_id: str, file_ids: Optional[List[str]], question: str, *, top_k: int, max_tokens: int) -> tuple:
+    return (tenant_id, tuple(sorted(file_ids)) if file_ids is not None else None, normalize_question(question), int(top_k), int(max_tokens))
+
+
+class _Call:
+    __slots__ = ("task", "waiters", "followers")
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+        self.followers = 0
+
+
+class SingleFlight:
+    """
+    `await do(key, fn)` runs the coroutine fn() once per key at a time:
+    callers arriving while it runs await the same result (or exception).
+    fn() runs in its own task, so the first caller going away doesn't take
+    the others' answer with it; the task is cancelled only once every
+    caller has left. For the /chat route; all callers are on the event loop.
+    """
+
+    def __init__(self):
+        self._calls: Dict[tuple, _Call] = {}
+        self.leaders = 0
+        self.followers = 0
+
+    async def do(self, key: tuple, fn: Callable[[], Awaitable[T]]) -> T:
+        call = self._calls.get(key)
+        if call is None:
+            call = self._calls[key] = _Call(asyncio.ensure_future(fn()))
+            call.task.add_done_callback(lambda task: self._finished(key, call))
+            self.leaders += 1
+        else:
+            call.followers += 1
+            self.followers += 1
+
+        call.waiters += 1
+        try:
+            # shielded: a caller going away mustn't cancel the others' result
+            return await asyncio.shield(call.task)
+        finally:
+            call.waiters -= 1
+            if call.waiters == 0 and not call.task.done():
+                self._forget(key, call)
+                call.task.cancel()
+
+    def _forget(self, key: tuple, call: _Call) -> None:
+        if self._calls.get(key) is call:
+            del self._calls[key]
+
+    def _finished(self, key: tuple, call: _Call) -> None:
+        self._forget(key, call)
+        if not call.task.cancelled():
+            # retrieved here so a failure nobody awaited anymore isn't logged as "never retrieved"
+            call.task.exception()
+        if call.followers:
+            log.info("chat answer shared with %s identical request(s)", call.followers)
+
+    def stats(self) -> Dict:
+        return {"in_flight": len(self._calls), "leaders": self.leaders, "followers": self.followers}
+
+
+class StreamFlight:
+    """
+    One /chat/stream answer shared by identical requests. The leader's SSE
+    body is run once by a producer task (started by the first subscriber);
+    its frames are kept, so every subscriber gets the whole stream from the
+    first frame, however late it joined. The producer is cancelled (closing
+    the upstream LLM stream) once every member's response has ended.
+    """
+
+    def __init__(self, flights: "StreamFlights", key: tuple):
+        self.flights = flights
+        self.key = key
+        self.members = 1
+        self.followers = 0
+
+        self._ready = threading.Event()
+        self.error: Optional[BaseException] = None
+        self.body: Optional[AsyncIterator[bytes]] = None
+        self.on_close: Optional[Callable[[], None]] = None
+
+        self.frames: List[bytes] = []
+        self.done = False
+        self._task: Optional[asyncio.Task] = None
+        self._changed: Optional[asyncio.Future] = None
+        self._closed = False
+
+    # --- leader ---
+    def publish(self, body: AsyncIterator[bytes], *, on_close: Optional[Callable[[], None]] = None) -> None:
+        self.body = body
+        self.on_close = on_close
+        self._ready.set()
+
+    def fail(self, error: BaseException) -> None:
+        self.flights._discard(self)
+        self.error = error
+        self._ready.set()
+
+    # --- followers (request thread) ---
+    def wait_ready(self) -> None:
+        """Blocks until the leader has a response; re-raises the leader's error (404, 429...)."""
+        self._ready.wait()
+        if self.error is not None:
+            raise self.error
+
+    # --- event loop ---
+    def _notify(self) -> None:
+        changed, self._changed = self._changed, asyncio.get_running_loop().create_future()
+        changed.set_result(None)
+
+    def _close_body(self) -> None:
+        if not self._closed:
+            self._closed = True
+            if self.on_close is not None:
+                self.on_close()
+
+    async def _produce(self) -> None:
+        try:
+            async for frame in self.body:
+                self.frames.append(frame)
+                self._notify()
+        except Exception:
+            log.exception("shared chat stream failed")
+        finally:
+            self.done = True
+            self._notify()
+            self.flights._discard(self)
+            try:
+                await self.body.aclose()
+            finally:
+                self._close_body()
+
+    async def subscribe(self) -> AsyncIterator[bytes]:
+        if self._task is None:
+            self._changed = asyncio.get_running_loop().create_future()
+            self._task = asyncio.ensure_future(self._produce())
+
+        i = 0
+        while True:
+            while i < len(self.frames):
+                yield self.frames[i]
+                i += 1
+            if self.done:
+                return
+            # shielded: one subscriber going away mustn't cancel the shared future
+            await asyncio.shield(self._changed)
+
+    def leave(self) -> None:
+        """on_close of each member's response; the last one out stops the producer."""
+        if not self.flights._leave(self):
+            return
+        if self._task is not None:
+            if not self._task.done():
+                self._task.cancel()
+        else:
+            # no subscriber ever started (clients gone before the first byte)
+            self._close_body()
+
+
+class StreamFlights:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights: Dict[tuple, StreamFlight] = {}
+        self.leaders = 0
+        self.followers = 0
+
+    def join(self, key: tuple):
+        """Returns (flight, is_leader)."""
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is None:
+                flight = self._flights[key] = StreamFlight(self, key)
+                self.leaders += 1
+                return flight, True
+            flight.members += 1
+            flight.followers += 1
+            self.followers += 1
+            return flight, False
+
+    def _discard(self, flight: StreamFlight) -> None:
+        with self._lock:
+            if self._flights.get(flight.key) is flight:
+                del self._flights[flight.key]
+
+    def _leave(self, flight: StreamFlight) -> bool:
+        with self._lock:
+            flight.members -= 1
+            if flight.members > 0:
+                return False
+            if self._flights.get(flight.key) is flight:
+                del self._flights[flight.key]
+            return True
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "in_flight": len(self._flights),
+                "leaders": self.leaders,
+                "followers": self.followers,
+                "subscribers": sum(f.members for f in self._flights.values()),
+            }
+
+
+_CHAT: Optional[SingleFlight] = None
+_STREAMS: Optional[StreamFlights] = None
+_LOCK = threading.Lock()
+
+
+def get_chat_flights() -> Optional[SingleFlight]:
+    global _CHAT
+    if _CHAT is None and SINGLEFLIGHT_ENABLED:
+        with _LOCK:
+            if _CHAT is None:
+                _CHAT = SingleFlight()
+    return _CHAT
+
+
+def get_stream_flights() -> Optional[StreamFlights]:
+    global _STREAMS
+    if _STREAMS is None and SINGLEFLIGHT_ENABLED:
+        with _LOCK:
+            if _STREAMS is None:
+                _STREAMS = StreamFlights()
+    return _STREAMS
+
+
+def singleflight_stats() -> Dict:
+    if not SINGLEFLIGHT_ENABLED:
+        return {"enabled": False}
+    return {"enabled": True, "chat": get_chat_flights().stats(), "stream": get_stream_flights().stats()}
@@ -0,0 +1,211 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from typing import AsyncIterator, Callable, Dict, List, Optional
+
+from starlette.responses import StreamingResponse
+
+from ..config import settings
+
+try:
+    import orjson
+except ImportError:  # optional: stdlib json is used if it's not installed
+    orjson = None
+
+log = logging.getLogger("sse")
+
+# Default coalescing window for streamed tokens (0 = one frame per token)
+SSE_FLUSH_MS = int(getattr(settings, "sse_flush_ms", None) or os.getenv("SSE_FLUSH_MS", "50"))
+SSE_FLUSH_BYTES = int(getattr(settings, "sse_flush_bytes", None) or os.getenv("SSE_FLUSH_BYTES", "256"))
+
+
+def sse(event: dict) -> bytes:
+    if orjson is not None:
+        return b"data: " + orjson.dumps(event) + b"\n\n"
+    return f"data: {json.dumps(event, ensure_ascii=False)}\n\n".encode("utf-8")
+
+
+class TokenCoalescer:
+    """
+    Buffers streamed tokens into fewer SSE `token` frames: the first token
+    goes out at once (time to first token is unchanged), after that a frame is
+    sent once the buffer is `flush_ms` old or holds `flush_bytes` (UTF-8).
+    `stream()` also flushes on a timer, so a slow or stalled model doesn't
+    hold buffered tokens back; `add()` alone only checks as tokens arrive.
+
+    Also accumulates the whole answer (list buffer, joined once in `text()`).
+    """
+
+    def __init__(self, *, flush_ms: Optional[int] = None, flush_bytes: Optional[int] = None):
+        self.flush_s = max(0, SSE_FLUSH_MS if flush_ms is None else int(flush_ms)) / 1000.0
+        self.flush_bytes = max(0, SSE_FLUSH_BYTES if flush_bytes is None else int(flush_bytes))
+
+        self.tokens = 0
+        self.frames = 0
+
+        self._parts: List[str] = []
+        self._pending: List[str] = []
+        self._pending_bytes = 0
+        self._since = 0.0
+
+    def add(self, token: str) -> Optional[bytes]:
+        """Takes one token; returns a frame to send, or None while buffering."""
+        self.tokens += 1
+        self._parts.append(token)
+        self._pending.append(token)
+        self._pending_bytes += len(token.encode("utf-8"))
+
+        if len(self._pending) == 1:
+            self._since = time.perf_counter()
+        if (
+            self.frames == 0
+            or self._pending_bytes >= self.flush_bytes
+            or time.perf_counter() - self._since >= self.flush_s
+        ):
+            return self.flush()
+        return None
+
+    def flush(self) -> Optional[bytes]:
+        """Frame for whatever is buffered (None if nothing is)."""
+        if not self._pending:
+            return None
+        token = "".join(self._pending)
+        self._pending.clear()
+        self._pending_bytes = 0
+        self.frames += 1
+        return sse({"type": "token", "token": token})
+
+    def text(self) -> str:
+        return "".join(self._parts)
+
+    def time_left(self) -> Optional[float]:
+        """Seconds until the buffered tokens are due (None while nothing is buffered)."""
+        if not self._pending:
+            return None
+        return max(0.0, self.flush_s - (time.perf_counter() - self._since))
+
+    async def stream(self, tokens: AsyncIterator[str]) -> AsyncIterator[bytes]:
+        """
+        Frames for an async token stream: waits for the next token only until
+        the buffer is due, then flushes without it. Whatever is still buffered
+        at the end is left for the caller's `flush()`.
+        """
+        it = tokens.__aiter__()
+        nxt: Optional[asyncio.Future] = None
+        try:
+            while True:
+                if nxt is None:
+                    nxt = asyncio.ensure_future(it.__anext__())
+                done, _ = await asyncio.wait((nxt,), timeout=self.time_left())
+                if not done:
+                    frame = self.flush()
+                    if frame:
+                        yield frame
+                    continue
+
+                fut, nxt = nxt, None
+                try:
+                    token = fut.result()
+                except StopAsyncIteration:
+                    return
+                frame = self.add(token)
+                if frame:
+                    yield frame
+        finally:
+            if nxt is not None:
+                nxt.cancel()
+                await asyncio.gather(nxt, return_exceptions=True)
+            aclose = getattr(it, "aclose", None)
+            if aclose is not None:
+                await aclose()
+
+
+class EventStreamResponse(StreamingResponse):
+    """
+    text/event-stream response that always closes its body generator when the
+    response ends. On a client disconnect Starlette only cancels the send; a
+    generator parked at `yield` would otherwise stay open (and keep its
+    upstream LLM stream open) until garbage collection.
+
+    `on_close` runs after that, also for a body that never started (a
+    generator's own `finally` doesn't run then), e.g. to return an LLM slot.
+    """
+
+    media_type = "text/event-stream"
+
+    def __init__(self, content, *args, on_close: Optional[Callable[[], None]] = None, **kwargs):
+        super().__init__(content, *args, **kwargs)
+        self.on_close = on_close
+
+    async def __call__(self, scope, receive, send) -> None:
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            try:
+                aclose = getattr(self.body_iterator, "aclose", None)
+                if aclose is not None:
+                    await aclose()
+            finally:
+                if self.on_close is not None:
+                    self.on_close()
+
+
+class StreamStats:
+    """Process-wide counters for /chat/stream, incl. generation cut short by disconnects."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started = 0
+        self.completed = 0
+        self.cancelled = 0
+        self.cancelled_chars = 0
+        # max_tokens minus what was generated when the client left (upper bound of what was saved)
+        self.saved_tokens_est = 0
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "started": self.started,
+                "completed": self.completed,
+                "cancelled": self.cancelled,
+                "active": self.started - self.completed - self.cancelled,
+                "cancelled_chars_streamed": self.cancelled_chars,
+                "saved_tokens_est": self.saved_tokens_est,
+            }
+
+
+stream_stats = StreamStats()
+
+
+async def track_stream(agen: AsyncIterator[bytes], *, co: TokenCoalescer, max_tokens: int) -> AsyncIterator[bytes]:
+    """
+    Passes frames through and records how the stream ended. A client
+    disconnect arrives as CancelledError (while waiting on the model) or
+    GeneratorExit (while parked at a yield); either way the inner generator
+    is closed, which closes the upstream Ollama/Gemini stream, and no
+    continuation call is made.
+    """
+    with stream_stats._lock:
+        stream_stats.started += 1
+    try:
+        async for frame in agen:
+            yield frame
+    except (asyncio.CancelledError, GeneratorExit):
+        chars = len(co.text())
+        saved = max(0, int(max_tokens) - (chars + 3) // 4)
+        with stream_stats._lock:
+            stream_stats.cancelled += 1
+            stream_stats.cancelled_chars += chars
+            stream_stats.saved_tokens_est += saved
+        log.info("stream cancelled by client after %s chars (~%s tokens of budget unused)", chars, saved)
+        raise
+    else:
+        with stream_stats._lock:
+            stream_stats.completed += 1
+    finally:
+        await agen.aclose()
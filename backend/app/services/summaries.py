@@ -0,0 +1,236 @@
+from __future__ import annotations
+
+import logging
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from ..config import settings
+from .admission import llm_slot
+from .llm import llm_generate
+from .pdf_loader import iter_pdf_text_by_page
+from .registry import find_record, update_records
+
+log = logging.getLogger("summaries")
+
+# Queue a summarize job after each ingest (otherwise queued on the first summary request)
+SUMMARY_ON_INGEST = (getattr(settings, "summary_on_ingest", None) or os.getenv("SUMMARY_ON_INGEST", "false")).lower() in ("1", "true", "yes")
+# Characters of page text per map call
+SUMMARY_MAP_CHARS = int(getattr(settings, "summary_map_chars", None) or os.getenv("SUMMARY_MAP_CHARS", "12000"))
+SUMMARY_MAP_MAX_TOKENS = int(getattr(settings, "summary_map_max_tokens", None) or os.getenv("SUMMARY_MAP_MAX_TOKENS", "384"))
+SUMMARY_MAX_TOKENS = int(getattr(settings, "summary_max_tokens", None) or os.getenv("SUMMARY_MAX_TOKENS", "1024"))
+# Map calls in flight per summary
+SUMMARY_MAP_CONCURRENCY = int(getattr(settings, "summary_map_concurrency", None) or os.getenv("SUMMARY_MAP_CONCURRENCY", "4"))
+
+MAP_PROMPT = """You are summarizing part of a PDF document ({label}).
+
+Write compact plain-text notes covering:
+- what this part is about (sections, topics)
+- key entities (people, companies, IDs, dates)
+- notable numbers / metrics
+
+Use ONLY the text below. No introduction, no conclusion.
+
+TEXT:
+{text}
+
+NOTES:"""
+
+REDUCE_PROMPT = """You are a PDF question-answering assistant. Below are notes taken
+from consecutive parts of one document.
+
+Write a structured brief with these sections (even if some are missing):
+1) What this document is
+2) Key entities (people/companies/IDs/dates)
+3) Main topics / sections covered
+4) Notable numbers / metrics (if any)
+5) What is NOT mentioned / unclear (if relevant)
+
+All claims must be supported by the notes. Output must be plain text.
+
+NOTES:
+{notes}
+
+BRIEF:"""
+
+# Whole-question requests for a brief of the document (after normalizing case,
+# whitespace and trailing punctuation). Anything longer asks something specific
+# and goes through retrieval with the question in the prompt.
+_DOC = r"(?:this|the|my)\s+(?:pdf|document|doc|file)"
+_SUMMARY_REQUEST = re.compile(
+    r"^(?:please\s+|can you\s+|could you\s+)?(?:"
+    r"summari[sz]e(?:\s+" + _DOC + r")?"
+    r"|(?:give me\s+)?(?:a\s+|an\s+)?(?:summary|overview|brief)(?:\s+of\s+" + _DOC + r")?"
+    r"|tell me about\s+" + _DOC +
+    r"|describe\s+" + _DOC +
+    r"|what(?:'s|\s+is)\s+(?:in\s+)?" + _DOC + r"(?:\s+about)?"
+    r"|what does\s+" + _DOC + r"\s+(?:contain|say|cover)"
+    r")(?:\s+please)?$"
+)
+
+
+def is_document_summary_request(question: str) -> bool:
+    """True only when the whole question asks for a summary of the document."""
+    q = " ".join((question or "").casefold().split()).rstrip("?!. ")
+    return bool(_SUMMARY_REQUEST.match(q))
+
+
+# (tenant, file) -> [lock, holders + waiters]; an entry lives only while in use
+_BUILD_LOCKS: Dict[Tuple[str, str], list] = {}
+_BUILD_LOCKS_LOCK = threading.Lock()
+
+
+@contextmanager
+def _build_lock(tenant_id: str, file_id: str) -> Iterator[None]:
+    key = (tenant_id, file_id)
+    with _BUILD_LOCKS_LOCK:
+        entry = _BUILD_LOCKS.setdefault(key, [threading.Lock(), 0])
+        entry[1] += 1
+    try:
+        with entry[0]:
+            yield
+    finally:
+        with _BUILD_LOCKS_LOCK:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del _BUILD_LOCKS[key]
+
+
+def _span(labels: List[str]) -> str:
+    return labels[0] if len(labels) == 1 else f"{labels[0]} to {labels[-1]}"
+
+
+def _group(parts: List[Tuple[str, str]], max_chars: int) -> List[Tuple[str, str]]:
+    """Packs consecutive (label, text) parts into groups of at most ~max_chars."""
+    groups: List[Tuple[str, str]] = []
+    labels: List[str] = []
+    texts: List[str] = []
+    size = 0
+    for label, text in parts:
+        if texts and size + len(text) > max_chars:
+            groups.append((_span(labels), "\n\n".join(texts)))
+            labels, texts, size = [], [], 0
+        labels.append(label)
+        texts.append(text[:max_chars])
+        size += len(texts[-1])
+    if texts:
+        groups.append((_span(labels), "\n\n".join(texts)))
+    return groups
+
+
+def _generate(prompt: str, *, max_tokens: int, tenant_id: str) -> str:
+    # Summary calls queue for the LLM like chat requests of the same tenant,
+    # but never get rejected or time out (a build is all-or-nothing)
+    with llm_slot(tenant_id, bounded=False, timeout=0):
+        return llm_generate(prompt, max_tokens=max_tokens)
+
+
+def _map(
+    groups: List[Tuple[str, str]], tenant_id: str, check_cancel: Optional[Callable[[], None]] = None
+) -> List[Tuple[str, str]]:
+    def one(g: Tuple[str, str]) -> Tuple[str, str]:
+        label, text = g
+        if check_cancel is not None:
+            check_cancel()
+        notes = _generate(MAP_PROMPT.format(label=label, text=text), max_tokens=SUMMARY_MAP_MAX_TOKENS, tenant_id=tenant_id)
+        return label, (notes or "").strip()
+
+    with ThreadPoolExecutor(max_workers=max(1, SUMMARY_MAP_CONCURRENCY), thread_name_prefix="summary-map") as pool:
+        return [(label, notes) for label, notes in pool.map(one, groups) if notes]
+
+
+def summarize_pages(
+    pages: List[Tuple[int, str]], *, tenant_id: str, check_cancel: Optional[Callable[[], None]] = None
+) -> str:
+    """
+    Map-reduce summary: page groups -> notes (in parallel), notes are
+    re-grouped and condensed until they fit one call, then one structured brief.
+
+    `check_cancel` runs before every LLM call and may raise to abort the build.
+    """
+    parts = [(f"page {p}", text) for p, text in pages if text]
+    if not parts:
+        return ""
+
+    notes = _map(_group(parts, SUMMARY_MAP_CHARS), tenant_id, check_cancel)
+    while len(notes) > 1 and sum(len(n) for _, n in notes) > SUMMARY_MAP_CHARS:
+        notes = _map(_group([(label, f"[{label}]\n{n}") for label, n in notes], SUMMARY_MAP_CHARS), tenant_id, check_cancel)
+
+    if check_cancel is not None:
+        check_cancel()
+    joined = "\n\n".join(f"[{label}]\n{n}" for label, n in notes)
+    return (_generate(REDUCE_PROMPT.format(notes=joined), max_tokens=SUMMARY_MAX_TOKENS, tenant_id=tenant_id) or "").strip()
+
+
+def _fresh(rec: Dict) -> Optional[str]:
+    # A summary is only valid for the ingest it was built from
+    if rec.get("summary") and rec.get("summary_for") == rec.get("ingested_at"):
+        return rec["summary"]
+    return None
+
+
+def build_summary(
+    *, tenant_id: str, file_id: str, force: bool = False, check_cancel: Optional[Callable[[], None]] = None
+) -> Optional[str]:
+    """
+    Builds (or returns the stored) summary of one document and saves it on
+    its registry record. Concurrent callers for the same file wait for a
+    single build. Returns None if the file is unknown or not ingested.
+    """
+    with _build_lock(tenant_id, file_id):
+        rec = find_record(settings.app_data_dir, tenant_id=tenant_id, file_id=file_id)
+        if not rec or not rec.get("num_chunks"):
+            return None
+        if not force and _fresh(rec):
+            return rec["summary"]
+
+        pdf_path = settings.uploads_dir / f"{file_id}.pdf"
+        if not pdf_path.exists():
+            return None
+
+        built_for = rec.get("ingested_at")
+        summary = summarize_pages(
+            list(iter_pdf_text_by_page(pdf_path)), tenant_id=tenant_id, check_cancel=check_cancel
+        )
+        if not summary:
+            return None
+
+        update_records(
+            settings.app_data_dir,
+            {
+                (tenant_id, file_id): {
+                    "summary": summary,
+                    "summary_for": built_for,
+                    "summary_at": datetime.utcnow().isoformat() + "Z",
+                }
+            },
+        )
+        log.info("built summary for %s/%s (%s chars)", tenant_id, file_id, len(summary))
+        return summary
+
+
+def enqueue_summary(*, tenant_id: str, file_id: str) -> None:
+    """Queues a summarize job for the file unless one is already queued/running."""
+    from .jobs import get_job_store
+
+    store = get_job_store()
+    if not store.find_active(tenant_id=tenant_id, file_id=file_id, kind="summarize"):
+        store.enqueue(tenant_id=tenant_id, file_id=file_id, kind="summarize")
+
+
+def get_summary(*, tenant_id: str, file_id: str, enqueue: bool = True) -> Optional[str]:
+    """
+    Stored summary if fresh. Otherwise None, and (with `enqueue`) a summarize
+    job is queued so a later request can be served from the store; the
+    map-reduce never runs inside a request.
+    """
+    rec = find_record(settings.app_data_dir, tenant_id=tenant_id, file_id=file_id)
+    if rec and _fresh(rec):
+        return rec["summary"]
+    if enqueue and rec and rec.get("num_chunks"):
+        enqueue_summary(tenant_id=tenant_id, file_id=file_id)
+    return None
@@ -0,0 +1,157 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import os
+from pathlib import Path
+from typing import BinaryIO, Iterable, Tuple
+
+from fastapi import HTTPException, UploadFile
+from starlette.responses import JSONResponse
+
+from ..config import settings
+
+UPLOAD_MAX_MB = int(getattr(settings, "upload_max_mb", None) or os.getenv("UPLOAD_MAX_MB", "200"))
+UPLOAD_CHUNK_KB = int(getattr(settings, "upload_chunk_kb", None) or os.getenv("UPLOAD_CHUNK_KB", "1024"))
+# none: leave it to the OS | file: fsync the file before rename | full: also fsync the directory after rename
+UPLOAD_FSYNC = (getattr(settings, "upload_fsync", None) or os.getenv("UPLOAD_FSYNC", "file")).lower().strip()
+
+_MULTIPART_SLACK = 64 * 1024
+
+
+class UploadTooLarge(ValueError):
+    pass
+
+
+def _too_large(max_bytes: int) -> str:
+    return f"Upload exceeds the {max_bytes / (1024 * 1024):g} MB limit."
+
+
+def _fsync_dir(path: Path) -> None:
+    fd = os.open(str(path), os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _copy_to(src: BinaryIO, tmp: Path, *, max_bytes: int, chunk_size: int, fsync: str) -> Tuple[int, str]:
+    h = hashlib.sha256()
+    size = 0
+    with tmp.open("wb") as out:
+        while True:
+            chunk = src.read(chunk_size)
+            if not chunk:
+                break
+            size += len(chunk)
+            if size > max_bytes:
+                raise UploadTooLarge(_too_large(max_bytes))
+            h.update(chunk)
+            out.write(chunk)
+
+        if fsync in ("file", "full"):
+            out.flush()
+            os.fsync(out.fileno())
+    return size, h.hexdigest()
+
+
+async def save_upload(
+    file: UploadFile,
+    dest: Path,
+    *,
+    max_bytes: int = UPLOAD_MAX_MB * 1024 * 1024,
+    chunk_size: int = UPLOAD_CHUNK_KB * 1024,
+    fsync: str = UPLOAD_FSYNC,
+) -> Tuple[int, str]:
+    """
+    Copies an upload to `dest` in fixed-size chunks (constant memory per upload).
+
+    - writes to a hidden temp file next to `dest`, then renames atomically,
+      so readers never see a partial PDF
+    - sha256 is computed incrementally while writing
+    - the copy (read, hash, write, fsync) runs on a worker thread, off the event loop
+    - raises UploadTooLarge past `max_bytes` (oversized request bodies are
+      already refused while they arrive, see LimitUploadSize)
+
+    Returns (size_bytes, sha256_hex).
+    """
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    tmp = dest.with_name(f".{dest.name}.part")
+
+    try:
+        await file.seek(0)
+        size, digest = await asyncio.to_thread(
+            _copy_to, file.file, tmp, max_bytes=max_bytes, chunk_size=chunk_size, fsync=fsync
+        )
+        os.replace(tmp, dest)
+        if fsync == "full":
+            await asyncio.to_thread(_fsync_dir, dest.parent)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+
+    return size, digest
+
+
+class LimitUploadSize:
+    """
+    ASGI middleware: request bodies to `paths` larger than `max_bytes` are
+    refused with 413 before they are spooled to disk by the multipart
+    parser, straight away when Content-Length says so, otherwise as soon as
+    the received bytes pass the limit (chunked uploads).
+    """
+
+    def __init__(self, app, *, paths: Iterable[str] = ("/upload",), max_bytes: int = UPLOAD_MAX_MB * 1024 * 1024):
+        self.app = app
+        self.paths = set(paths)
+        # room for the multipart boundaries / part headers around the file
+        self.max_bytes = int(max_bytes) + _MULTIPART_SLACK
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http" or scope.get("method") != "POST" or scope.get("path") not in self.paths:
+            await self.app(scope, receive, send)
+            return
+
+        detail = _too_large(self.max_bytes - _MULTIPART_SLACK)
+        for name, value in scope.get("headers", ()):
+            if name == b"content-length":
+                try:
+                    too_big = int(value) > self.max_bytes
+                except ValueError:
+                    too_big = False
+                if too_big:
+                    await JSONResponse({"detail": detail}, status_code=413)(scope, receive, send)
+                    return
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    # FastAPI re-raises HTTPExceptions from body parsing as-is
+                    raise HTTPException(status_code=413, detail=detail)
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+
+def link_duplicate(original: Path, dest: Path) -> bool:
+    """
+    Replaces `dest` (a freshly saved duplicate) with a hard link to `original`,
+    so identical uploads share one copy on disk. Returns False (and leaves
+    `dest` untouched) if the original is gone or linking isn't possible.
+    """
+    if not original.exists():
+        return False
+
+    tmp = dest.with_name(f".{dest.name}.link")
+    try:
+        os.link(original, tmp)
+        os.replace(tmp, dest)
+    except OSError:
+        tmp.unlink(missing_ok=True)
+        return False
+    return True
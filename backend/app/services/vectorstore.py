@@ -1,7 +1,18 @@
 from __future__ import annotations
 
-from typing import List, Optional
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from contextvars import ContextVar
+from collections import deque
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+import asyncio
+import logging
 import os
+import random
+import threading
+import time
+import hashlib
+import uuid
 
 from langchain_qdrant import QdrantVectorStore
 from langchain_core.documents import Document
@@ -13,6 +24,73 @@ from qdrant_client.http import models as rest
 from langchain_community.embeddings import OllamaEmbeddings
 
 from ..config import settings
+from .qdrant_admin import async_qdrant_client, qdrant_client
+from .embed_batcher import QueryEmbedBatcher, supports_batch_queries
+from .embed_cache import CachedEmbeddings, EmbeddingCache
+
+log = logging.getLogger("vectorstore")
+
+# -----------------------------
+# Embedding batching knobs
+# -----------------------------
+# Gemini batchEmbedContents accepts at most 100 texts per request.
+GEMINI_EMBED_MAX_BATCH = 100
+GEMINI_EMBED_BATCH_SIZE = int(getattr(settings, "gemini_embed_batch_size", None) or os.getenv("GEMINI_EMBED_BATCH_SIZE", "32"))
+GEMINI_EMBED_MAX_RETRIES = int(getattr(settings, "gemini_embed_max_retries", None) or os.getenv("GEMINI_EMBED_MAX_RETRIES", "10"))
+GEMINI_EMBED_MAX_IN_FLIGHT = int(getattr(settings, "gemini_embed_max_in_flight", None) or os.getenv("GEMINI_EMBED_MAX_IN_FLIGHT", "4"))
+
+# How many documents LangChain hands to embed_documents() per call.
+# Must be large enough to keep GEMINI_EMBED_MAX_IN_FLIGHT batches busy.
+QDRANT_UPSERT_BATCH_SIZE = int(getattr(settings, "qdrant_upsert_batch_size", None) or os.getenv("QDRANT_UPSERT_BATCH_SIZE", "256"))
+
+# -----------------------------
+# Embedding cache knobs
+# -----------------------------
+EMBED_CACHE_ENABLED = str(getattr(settings, "embed_cache_enabled", None) or os.getenv("EMBED_CACHE_ENABLED", "true")).lower() in ("1", "true", "yes")
+EMBED_CACHE_MAX_MB = int(getattr(settings, "embed_cache_max_mb", None) or os.getenv("EMBED_CACHE_MAX_MB", "512"))
+
+# -----------------------------
+# Query embedding micro-batching knobs
+# -----------------------------
+QUERY_EMBED_BATCHING = str(getattr(settings, "query_embed_batching", None) or os.getenv("QUERY_EMBED_BATCHING", "true")).lower() in ("1", "true", "yes")
+QUERY_EMBED_MAX_WAIT_MS = float(getattr(settings, "query_embed_max_wait_ms", None) or os.getenv("QUERY_EMBED_MAX_WAIT_MS", "5"))
+QUERY_EMBED_MAX_BATCH = int(getattr(settings, "query_embed_max_batch", None) or os.getenv("QUERY_EMBED_MAX_BATCH", "32"))
+
+# Per-request sink for batch throughput stats (see record_embed_batches)
+_BATCH_STATS: ContextVar[Optional[List[Dict]]] = ContextVar("embed_batch_stats", default=None)
+
+
+@contextmanager
+def record_embed_batches() -> Iterator[List[Dict]]:
+    """
+    Collects one stats dict per provider batch made inside the block:
+      {"batch": i, "size": n, "seconds": dt, "texts_per_sec": n/dt}
+    """
+    rec: List[Dict] = []
+    token = _BATCH_STATS.set(rec)
+    try:
+        yield rec
+    finally:
+        _BATCH_STATS.reset(token)
+
+
+def _record_batch(size: int, seconds: float) -> None:
+    rec = _BATCH_STATS.get()
+    if rec is None:
+        return
+    rec.append(
+        {
+            "batch": len(rec),
+            "size": size,
+            "seconds": round(seconds, 4),
+            "texts_per_sec": round(size / seconds, 2) if seconds > 0 else None,
+        }
+    )
+
+
+def is_rate_limited(e: Exception) -> bool:
+    msg = str(e)
+    return "429" in msg or "RESOURCE_EXHAUSTED" in msg
 
 
 # -----------------------------
@@ -24,40 +102,179 @@ class GeminiEmbeddings(Embeddings):
     This avoids legacy v1beta model-name issues in langchain_google_genai.
     """
 
-    def __init__(self, api_key: str, model: str):
+    def __init__(
+        self,
+        api_key: str,
+        model: str,
+        *,
+        batch_size: int = GEMINI_EMBED_BATCH_SIZE,
+        max_in_flight: int = GEMINI_EMBED_MAX_IN_FLIGHT,
+        max_retries: int = GEMINI_EMBED_MAX_RETRIES,
+    ):
         if not api_key:
             raise ValueError("GEMINI_API_KEY is missing.")
         self.api_key = api_key
         self.model = model
 
+        self.max_batch_size = max(1, min(int(batch_size), GEMINI_EMBED_MAX_BATCH))
+        self.max_in_flight = max(1, int(max_in_flight))
+        self.max_retries = max(0, int(max_retries))
+
+        # Adaptive batch size (halved on 429, regrown on success) and the time
+        # until which no new batch is sent after a 429. Shared by every call on
+        # this instance (it is process-wide), so both are guarded by a lock.
+        self._lock = threading.Lock()
+        self._batch_size = self.max_batch_size
+        self._cooldown_until = 0.0
+
         from google import genai  # google-genai
         self._client = genai.Client(api_key=self.api_key)
 
+    def _embed_batch(self, batch: List[str]) -> Tuple[List[List[float]], float]:
+        t0 = time.perf_counter()
+        res = self._client.models.embed_content(
+            model=self.model,
+            contents=batch,
+        )
+        # `res.embeddings` is a list (same order as `contents`); each item has `.values`
+        vecs = [list(e.values) for e in res.embeddings]
+        if len(vecs) != len(batch):
+            raise RuntimeError(f"Gemini returned {len(vecs)} embeddings for {len(batch)} texts.")
+        return vecs, time.perf_counter() - t0
+
+    def _current_batch_size(self) -> int:
+        with self._lock:
+            return self._batch_size
+
+    def _shrink(self) -> int:
+        with self._lock:
+            self._batch_size = max(1, self._batch_size // 2)
+            return self._batch_size
+
+    def _grow(self) -> None:
+        with self._lock:
+            if self._batch_size < self.max_batch_size:
+                self._batch_size = min(self.max_batch_size, self._batch_size + max(1, self._batch_size // 2))
+
+    def _back_off(self, attempt: int) -> float:
+        """
+        Pushes the shared cooldown out to `attempt`'s backoff. Concurrent 429s
+        overlap into one pause instead of adding up.
+        """
+        delay = min(30.0, 2 ** (attempt - 1)) + random.uniform(0, 0.5)
+        with self._lock:
+            self._cooldown_until = max(self._cooldown_until, time.monotonic() + delay)
+        return delay
+
+    def _wait_cooldown(self) -> None:
+        with self._lock:
+            remaining = self._cooldown_until - time.monotonic()
+        if remaining > 0:
+            time.sleep(remaining)
+
     def embed_documents(self, texts: List[str]) -> List[List[float]]:
         texts = [t if t is not None else "" for t in texts]
-        out: List[List[float]] = []
-
-        # NOTE: google-genai supports embed_content. We call per-text for simplicity.
-        for t in texts:
-            res = self._client.models.embed_content(
-                model=self.model,
-                contents=t,
-            )
-            # `res.embeddings` is a list; each item has `.values`
-            vec = res.embeddings[0].values
-            out.append(list(vec))
-
-        return out
+        n = len(texts)
+        out: List[Optional[List[float]]] = [None] * n
+        if n == 0:
+            return []
+
+        # Spans (start, end, attempt) into `texts`; each one is a single multi-text
+        # request. Results are written back by position, so completion order doesn't
+        # matter. `attempt` counts the rate-limit failures of that span's texts.
+        retry: deque = deque()
+        cursor = 0
+
+        with ThreadPoolExecutor(max_workers=self.max_in_flight) as pool:
+            in_flight: Dict = {}
+
+            while cursor < n or retry or in_flight:
+                if len(in_flight) < self.max_in_flight and (retry or cursor < n):
+                    self._wait_cooldown()
+                while len(in_flight) < self.max_in_flight and (retry or cursor < n):
+                    if retry:
+                        start, end, attempt = retry.popleft()
+                    else:
+                        start, end, attempt = cursor, min(n, cursor + self._current_batch_size()), 0
+                        cursor = end
+                    fut = pool.submit(self._embed_batch, texts[start:end])
+                    in_flight[fut] = (start, end, attempt)
+
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+
+                for fut in done:
+                    start, end, attempt = in_flight.pop(fut)
+                    try:
+                        vecs, dt = fut.result()
+                    except Exception as e:
+                        if not is_rate_limited(e):
+                            raise
+                        attempt += 1
+                        if attempt > self.max_retries:
+                            raise
+                        size = self._shrink()
+                        for s in range(start, end, size):
+                            retry.append((s, min(end, s + size), attempt))
+                        delay = self._back_off(attempt)
+                        log.warning(
+                            "Gemini embed rate-limited (attempt %s/%s); batch_size=%s, backing off %.1fs",
+                            attempt,
+                            self.max_retries,
+                            size,
+                            delay,
+                        )
+                        continue
+
+                    out[start:end] = vecs
+                    self._grow()
+                    _record_batch(end - start, dt)
+
+        return out  # type: ignore[return-value]
 
     def embed_query(self, text: str) -> List[float]:
         return self.embed_documents([text])[0]
 
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        # Gemini embeds queries and documents the same way.
+        return self.embed_documents(texts)
+
 
 _VS: Optional[QdrantVectorStore] = None
 _EMB: Optional[Embeddings] = None
 _DIM: Optional[int] = None  # cache embedding dim to avoid repeated probing
 
 
+def _build_provider_embeddings() -> tuple[str, str, Embeddings]:
+    provider = (getattr(settings, "embeddings_provider", None) or os.getenv("EMBEDDINGS_PROVIDER", "ollama")).lower()
+
+    if provider == "gemini":
+        model = getattr(settings, "gemini_embed_model", None) or os.getenv("GEMINI_EMBED_MODEL", "models/gemini-embedding-001")
+        emb = GeminiEmbeddings(
+            api_key=settings.gemini_api_key or "",
+            model=model,
+        )
+        return provider, model, emb
+
+    # Local-only fallback (requires reachable Ollama server)
+    ollama_embed_model = getattr(settings, "ollama_embed_model", None) or os.getenv("OLLAMA_EMBED_MODEL", "nomic-embed-text")
+    emb = OllamaEmbeddings(
+        base_url=settings.ollama_base_url,
+        model=ollama_embed_model,
+    )
+    return "ollama", ollama_embed_model, emb
+
+
+_EMB_CACHE: Optional[EmbeddingCache] = None
+
+
+def get_embed_cache() -> Optional[EmbeddingCache]:
+    global _EMB_CACHE
+    if _EMB_CACHE is None and EMBED_CACHE_ENABLED:
+        path = getattr(settings, "embed_cache_path", None) or os.getenv("EMBED_CACHE_PATH") or (settings.app_data_dir / "embed_cache.sqlite")
+        _EMB_CACHE = EmbeddingCache(path, max_bytes=EMBED_CACHE_MAX_MB * 1024 * 1024)
+    return _EMB_CACHE
+
+
 def build_embeddings() -> Embeddings:
     """
     Controlled by env:
@@ -65,44 +282,121 @@ def build_embeddings() -> Embeddings:
     Models:
       GEMINI_EMBED_MODEL default -> models/gemini-embedding-001
       OLLAMA_EMBED_MODEL default -> nomic-embed-text
+    Cache:
+      EMBED_CACHE_ENABLED default -> true (SQLite at APP_DATA_DIR/embed_cache.sqlite)
     """
     global _EMB
     if _EMB is not None:
         return _EMB
 
-    provider = (getattr(settings, "embeddings_provider", None) or os.getenv("EMBEDDINGS_PROVIDER", "ollama")).lower()
+    provider, model, emb = _build_provider_embeddings()
 
-    if provider == "gemini":
-        model = getattr(settings, "gemini_embed_model", None) or os.getenv("GEMINI_EMBED_MODEL", "models/gemini-embedding-001")
-        _EMB = GeminiEmbeddings(
-            api_key=settings.gemini_api_key or "",
-            model=model,
-        )
-        return _EMB
+    cache = get_embed_cache()
+    if cache is not None:
+        emb = CachedEmbeddings(emb, cache, provider=provider, model=model, dim=_DIM)
 
-    # Local-only fallback (requires reachable Ollama server)
-    ollama_embed_model = getattr(settings, "ollama_embed_model", None) or os.getenv("OLLAMA_EMBED_MODEL", "nomic-embed-text")
-    _EMB = OllamaEmbeddings(
-        base_url=settings.ollama_base_url,
-        model=ollama_embed_model,
-    )
+    _EMB = emb
     return _EMB
 
 
+_QB: Optional[QueryEmbedBatcher] = None
+_QB_SUPPORTED: Optional[bool] = None  # decided on first use, from the provider
+_QB_LOCK = threading.Lock()
+
+
+def get_query_batcher() -> Optional[QueryEmbedBatcher]:
+    """None if batching is off or the provider has no batch API (e.g. Ollama)."""
+    global _QB, _QB_SUPPORTED
+    if _QB is None and QUERY_EMBED_BATCHING and _QB_SUPPORTED is not False:
+        with _QB_LOCK:
+            if _QB is None and _QB_SUPPORTED is None:
+                emb = build_embeddings()
+                _QB_SUPPORTED = supports_batch_queries(emb)
+                if _QB_SUPPORTED:
+                    _QB = QueryEmbedBatcher(
+                        emb,
+                        max_wait_ms=QUERY_EMBED_MAX_WAIT_MS,
+                        max_batch=QUERY_EMBED_MAX_BATCH,
+                    )
+                else:
+                    log.info("Query embedding batching disabled: provider has no batch embedding API")
+    return _QB
+
+
+def query_embed_stats() -> Dict:
+    """Stats for the admin route; doesn't start the batcher."""
+    if not QUERY_EMBED_BATCHING or _QB_SUPPORTED is False:
+        return {"enabled": False}
+    if _QB is None:
+        return {"enabled": True, "started": False}
+    return {"enabled": True, "started": True, **_QB.stats()}
+
+
+def embed_query(query: str) -> List[float]:
+    """
+    Query embedding shared by all chat requests. Concurrent queries are
+    coalesced into one provider call (see QueryEmbedBatcher) when the
+    provider can embed a batch in one request.
+    """
+    qb = get_query_batcher()
+    if qb is None:
+        return build_embeddings().embed_query(query)
+    return qb.embed(query)
+
+
+# Every search/count/delete filters on these; without payload indexes Qdrant
+# has to scan payloads, which degrades as the collection grows.
+PAYLOAD_INDEXES = {
+    "metadata.tenant_id": rest.KeywordIndexParams(type=rest.KeywordIndexType.KEYWORD, is_tenant=True),
+    "metadata.file_id": rest.KeywordIndexParams(type=rest.KeywordIndexType.KEYWORD),
+}
+
+
+def ensure_payload_indexes(client: QdrantClient, collection_name: str) -> List[str]:
+    """
+    Creates any missing keyword payload indexes (tenant_id is marked as the
+    tenant key). Safe to call on every startup. Returns the fields created.
+    """
+    info = client.get_collection(collection_name)
+    have = set((info.payload_schema or {}).keys())
+
+    created = []
+    for field, schema in PAYLOAD_INDEXES.items():
+        if field in have:
+            continue
+        client.create_payload_index(
+            collection_name=collection_name,
+            field_name=field,
+            field_schema=schema,
+            wait=True,
+        )
+        created.append(field)
+
+    if created:
+        log.info("Created Qdrant payload indexes on %s: %s", collection_name, created)
+    return created
+
+
+def bootstrap_collection() -> None:
+    """Startup hook: index an existing collection without touching the embedding provider."""
+    client = qdrant_client()
+    if client.collection_exists(settings.collection_name):
+        ensure_payload_indexes(client, settings.collection_name)
+
+
 def _ensure_collection_exists(client: QdrantClient, collection_name: str, dim: int):
     try:
         client.get_collection(collection_name)
-        return
     except Exception:
-        pass
-
-    client.create_collection(
-        collection_name=collection_name,
-        vectors_config=rest.VectorParams(
-            size=dim,
-            distance=rest.Distance.COSINE,
-        ),
-    )
+        client.create_collection(
+            collection_name=collection_name,
+            vectors_config=rest.VectorParams(
+                size=dim,
+                distance=rest.Distance.COSINE,
+            ),
+        )
+
+    ensure_payload_indexes(client, collection_name)
 
 
 def get_vectorstore() -> QdrantVectorStore:
@@ -110,7 +404,9 @@ def get_vectorstore() -> QdrantVectorStore:
     Builds vectorstore and auto-creates collection if missing.
     """
     global _VS, _DIM
-    if _VS is not None:
+    client = qdrant_client()
+    # rebuilt if the shared client was replaced after a failed health check
+    if _VS is not None and _VS.client is client:
         return _VS
 
     emb = build_embeddings()
@@ -128,7 +424,6 @@ def get_vectorstore() -> QdrantVectorStore:
                 f"Original error: {e}"
             ) from e
 
-    client = QdrantClient(url=settings.qdrant_url)
     _ensure_collection_exists(client, settings.collection_name, _DIM)
 
     _VS = QdrantVectorStore(
@@ -154,8 +449,63 @@ def _filter_for(tenant_id: str, file_id: str) -> rest.Filter:
     )
 
 
+# Fixed namespace so point IDs are stable across processes and deploys
+_POINT_NS = uuid.UUID("6f1c2a3e-6c1b-5d7e-9a52-4f0b7e8d2c11")
+
+
+def point_id(*, tenant_id: str, file_id: str, page, chunk_index, text: str) -> str:
+    """
+    Deterministic Qdrant point ID for a chunk:
+      uuid5(tenant_id, file_id, page, chunk_index, sha256(text))
+    Re-upserting the same chunk overwrites it instead of duplicating it.
+    """
+    h = hashlib.sha256((text or "").encode("utf-8")).hexdigest()
+    return str(uuid.uuid5(_POINT_NS, f"{tenant_id}|{file_id}|{page}|{chunk_index}|{h}"))
+
+
+def doc_point_id(doc: Document) -> str:
+    meta = doc.metadata or {}
+    return point_id(
+        tenant_id=meta.get("tenant_id", ""),
+        file_id=meta.get("file_id", ""),
+        page=meta.get("page"),
+        chunk_index=meta.get("chunk_index"),
+        text=doc.page_content,
+    )
+
+
+def list_point_ids(*, tenant_id: str, file_id: str, batch_size: int = 1024) -> Set[str]:
+    client = qdrant_client()
+    ids: Set[str] = set()
+    offset = None
+    while True:
+        points, offset = client.scroll(
+            collection_name=settings.collection_name,
+            scroll_filter=_filter_for(tenant_id, file_id),
+            limit=batch_size,
+            offset=offset,
+            with_payload=False,
+            with_vectors=False,
+        )
+        ids.update(str(p.id) for p in points)
+        if offset is None or not points:
+            return ids
+
+
+def delete_points(ids: Iterable[str], *, batch_size: int = 1024) -> int:
+    client = qdrant_client()
+    ids = list(ids)
+    for i in range(0, len(ids), batch_size):
+        client.delete(
+            collection_name=settings.collection_name,
+            points_selector=rest.PointIdsList(points=ids[i : i + batch_size]),
+            wait=True,
+        )
+    return len(ids)
+
+
 def count_chunks(*, tenant_id: str, file_id: str) -> int:
-    client = QdrantClient(url=settings.qdrant_url)
+    client = qdrant_client()
     res = client.count(
         collection_name=settings.collection_name,
         count_filter=_filter_for(tenant_id, file_id),
@@ -165,7 +515,7 @@ def count_chunks(*, tenant_id: str, file_id: str) -> int:
 
 
 def delete_chunks(*, tenant_id: str, file_id: str) -> int:
-    client = QdrantClient(url=settings.qdrant_url)
+    client = qdrant_client()
     n = count_chunks(tenant_id=tenant_id, file_id=file_id)
 
     client.delete(
@@ -176,25 +526,171 @@ def delete_chunks(*, tenant_id: str, file_id: str) -> int:
     return n
 
 
+def copy_chunks(
+    *,
+    tenant_id: str,
+    src_file_id: str,
+    dst_file_id: str,
+    batch_size: int = QDRANT_UPSERT_BATCH_SIZE,
+    on_progress: Optional[Callable[[Dict], None]] = None,
+    written_ids: Optional[Set[str]] = None,
+) -> int:
+    """
+    Duplicates a file's points under another file_id, reusing the stored vectors
+    (no embedding calls). Used when the same PDF is uploaded again.
+
+    `on_progress` and `written_ids` work as in ingest_pdf: progress is reported
+    after every copied page of points (nothing is parsed or embedded, so only
+    chunks_upserted moves), and the new IDs are collected before they're written.
+    """
+    # plain client: get_vectorstore() could trigger an embedding dimension probe
+    client = qdrant_client()
+    meta_key = QdrantVectorStore.METADATA_KEY
+
+    copied = 0
+    offset = None
+    while True:
+        points, offset = client.scroll(
+            collection_name=settings.collection_name,
+            scroll_filter=_filter_for(tenant_id, src_file_id),
+            limit=batch_size,
+            offset=offset,
+            with_payload=True,
+            with_vectors=True,
+        )
+        if not points:
+            break
+
+        new_points = []
+        for p in points:
+            payload = dict(p.payload or {})
+            meta = dict(payload.get(meta_key) or {})
+            meta["file_id"] = dst_file_id
+            meta["source"] = f"{dst_file_id}.pdf"
+            payload[meta_key] = meta
+            pid = point_id(
+                tenant_id=tenant_id,
+                file_id=dst_file_id,
+                page=meta.get("page"),
+                chunk_index=meta.get("chunk_index"),
+                text=payload.get(QdrantVectorStore.CONTENT_KEY, ""),
+            )
+            new_points.append(rest.PointStruct(id=pid, vector=p.vector, payload=payload))
+
+        if written_ids is not None:
+            written_ids.update(str(p.id) for p in new_points)
+        client.upsert(collection_name=settings.collection_name, points=new_points)
+        copied += len(new_points)
+        if on_progress is not None:
+            on_progress({"pages_parsed": 0, "chunks_embedded": 0, "chunks_upserted": copied})
+
+        if offset is None:
+            break
+
+    return copied
+
+
 def upsert_docs(docs: List[Document]) -> int:
     vs = get_vectorstore()
-    ids = vs.add_documents(docs)
+    ids = vs.add_documents(docs, ids=[doc_point_id(d) for d in docs], batch_size=QDRANT_UPSERT_BATCH_SIZE)
     return len(ids)
 
 
-def similarity_search(
+def embed_docs(docs: List[Document]) -> List[List[float]]:
+    return build_embeddings().embed_documents([d.page_content for d in docs])
+
+
+def upsert_embedded(docs: List[Document], vectors: List[List[float]]) -> int:
+    """
+    Second half of upsert_docs for callers that embed separately
+    (e.g. to report embed and upsert progress independently).
+    Payload layout matches QdrantVectorStore.add_documents.
+    """
+    vs = get_vectorstore()
+    points = [
+        rest.PointStruct(
+            id=doc_point_id(d),
+            vector={vs.vector_name: vec},
+            payload={vs.content_payload_key: d.page_content, vs.metadata_payload_key: d.metadata},
+        )
+        for d, vec in zip(docs, vectors)
+    ]
+    vs.client.upsert(collection_name=settings.collection_name, points=points)
+    return len(points)
+
+
+def _search_filter(tenant_id: Optional[str], file_ids: Optional[List[str]]) -> Optional[rest.Filter]:
+    must = []
+    if tenant_id:
+        must.append(rest.FieldCondition(key="metadata.tenant_id", match=rest.MatchValue(value=tenant_id)))
+    if file_ids:
+        must.append(rest.FieldCondition(key="metadata.file_id", match=rest.MatchAny(any=list(file_ids))))
+    return rest.Filter(must=must) if must else None
+
+
+def _document_from_payload(payload: Dict) -> Document:
+    # Same payload layout QdrantVectorStore writes (see upsert_embedded)
+    return Document(
+        page_content=payload.get(QdrantVectorStore.CONTENT_KEY) or "",
+        metadata=payload.get(QdrantVectorStore.METADATA_KEY) or {},
+    )
+
+
+def similarity_search_with_score(
     query: str,
     k: int = 8,
     file_ids: Optional[List[str]] = None,
     tenant_id: Optional[str] = None,
-):
+    embedding: Optional[List[float]] = None,
+) -> List[Tuple[Document, float]]:
+    """
+    (doc, score) pairs, best first. Scores are Qdrant's cosine similarity.
+    Pass `embedding` if the query was already embedded.
+    """
     vs = get_vectorstore()
+    # langchain-qdrant 0.1.x has no scored by-vector search, so query Qdrant
+    # directly with the (batched / cached) query embedding.
+    points = vs.client.query_points(
+        collection_name=settings.collection_name,
+        query=embedding if embedding is not None else embed_query(query),
+        using=vs.vector_name,
+        query_filter=_search_filter(tenant_id, file_ids),
+        limit=k,
+        with_payload=True,
+        with_vectors=False,
+    ).points
+    return [(_document_from_payload(p.payload or {}), float(p.score)) for p in points]
+
+
+async def asimilarity_search_with_score(
+    embedding: List[float],
+    k: int = 8,
+    file_ids: Optional[List[str]] = None,
+    tenant_id: Optional[str] = None,
+) -> List[Tuple[Document, float]]:
+    """
+    Async twin of similarity_search_with_score for the event loop, over the
+    shared AsyncQdrantClient. Takes the already computed query embedding.
+    """
+    if _VS is None:
+        # first search in this process: make sure the collection exists
+        await asyncio.to_thread(get_vectorstore)
+    res = await async_qdrant_client().query_points(
+        collection_name=settings.collection_name,
+        query=embedding,
+        using=QdrantVectorStore.VECTOR_NAME,
+        query_filter=_search_filter(tenant_id, file_ids),
+        limit=k,
+        with_payload=True,
+        with_vectors=False,
+    )
+    return [(_document_from_payload(p.payload or {}), float(p.score)) for p in res.points]
 
-    must = []
-    if tenant_id:
-        must.append({"key": "metadata.tenant_id", "match": {"value": tenant_id}})
-    if file_ids:
-        must.append({"key": "metadata.file_id", "match": {"any": file_ids}})
 
-    qdrant_filter = {"must": must} if must else None
-    return vs.similarity_search(query=query, k=k, filter=qdrant_filter)
\ No newline at end of file
+def similarity_search(
+    query: str,
+    k: int = 8,
+    file_ids: Optional[List[str]] = None,
+    tenant_id: Optional[str] = None,
+):
+    return [d for d, _ in similarity_search_with_score(query, k=k, file_ids=file_ids, tenant_id=tenant_id)]
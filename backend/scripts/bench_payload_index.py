@@ -0,0 +1,100 @@
+"""
+Filtered search / exact count latency with and without the tenant_id/file_id
+payload indexes.
+
+Usage (from backend/, with QDRANT_URL pointing at a server Qdrant —
+local/in-memory mode ignores payload indexes):
+    python -m scripts.bench_payload_index [--points 1000000] [--tenants 200] [--files-per-tenant 50]
+
+Builds a throwaway collection with random vectors, measures, creates the
+indexes from vectorstore.PAYLOAD_INDEXES, measures again, and drops it.
+"""
+import argparse
+import random
+import statistics
+import time
+import uuid
+
+from qdrant_client.http import models as rest
+
+from app.services.qdrant_admin import qdrant_client
+from app.services.vectorstore import PAYLOAD_INDEXES, _filter_for, ensure_payload_indexes
+
+DIM = 64
+
+
+def _load(client, name: str, points: int, tenants: int, files: int, batch: int = 2000) -> None:
+    for start in range(0, points, batch):
+        pts = []
+        for _ in range(min(batch, points - start)):
+            t = random.randrange(tenants)
+            pts.append(
+                rest.PointStruct(
+                    id=uuid.uuid4().hex,
+                    vector=[random.random() for _ in range(DIM)],
+                    payload={"metadata": {"tenant_id": f"t{t}", "file_id": f"t{t}-f{random.randrange(files)}"}},
+                )
+            )
+        client.upsert(collection_name=name, points=pts, wait=False)
+    # wait for the optimizer to catch up before measuring
+    while client.get_collection(name).status != rest.CollectionStatus.GREEN:
+        time.sleep(1)
+
+
+def _measure(client, name: str, tenants: int, files: int, n: int) -> dict:
+    search, count = [], []
+    for _ in range(n):
+        t = random.randrange(tenants)
+        tenant_filter = rest.Filter(
+            must=[rest.FieldCondition(key="metadata.tenant_id", match=rest.MatchValue(value=f"t{t}"))]
+        )
+        t0 = time.perf_counter()
+        client.search(collection_name=name, query_vector=[random.random() for _ in range(DIM)], query_filter=tenant_filter, limit=8)
+        search.append((time.perf_counter() - t0) * 1000)
+
+        t0 = time.perf_counter()
+        client.count(collection_name=name, count_filter=_filter_for(f"t{t}", f"t{t}-f{random.randrange(files)}"), exact=True)
+        count.append((time.perf_counter() - t0) * 1000)
+
+    def p(xs, q):
+        xs = sorted(xs)
+        return xs[min(len(xs) - 1, int(len(xs) * q))]
+
+    return {
+        "search_p50": statistics.median(search),
+        "search_p99": p(search, 0.99),
+        "count_p50": statistics.median(count),
+        "count_p99": p(count, 0.99),
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--points", type=int, default=1_000_000)
+    ap.add_argument("--tenants", type=int, default=200)
+    ap.add_argument("--files-per-tenant", type=int, default=50)
+    ap.add_argument("--n", type=int, default=200)
+    args = ap.parse_args()
+
+    client = qdrant_client()
+    name = f"bench_payload_index_{uuid.uuid4().hex[:8]}"
+    client.create_collection(name, vectors_config=rest.VectorParams(size=DIM, distance=rest.Distance.COSINE))
+    try:
+        print(f"loading {args.points} points into {name} ...")
+        _load(client, name, args.points, args.tenants, args.files_per_tenant)
+
+        before = _measure(client, name, args.tenants, args.files_per_tenant, args.n)
+        ensure_payload_indexes(client, name)
+        while client.get_collection(name).status != rest.CollectionStatus.GREEN:
+            time.sleep(1)
+        after = _measure(client, name, args.tenants, args.files_per_tenant, args.n)
+
+        print(f"indexes: {list(PAYLOAD_INDEXES)}")
+        for k in before:
+            print(f"  {k:<11} no index {before[k]:8.2f} ms   indexed {after[k]:8.2f} ms   x{before[k] / after[k]:.1f}")
+    finally:
+        client.delete_collection(name)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""
+Serial vs parallel PDF text extraction.
+
+Usage (from backend/):
+    python -m scripts.bench_pdf_extract path/to/file.pdf [--repeat 3]
+
+Prints wall time and speedup over serial for 1, 2, 4, ... workers up to the
+core count (PDF_PARSE_WORKERS caps the pool size).
+"""
+import argparse
+import os
+import time
+from pathlib import Path
+
+from app.services import pdf_loader
+
+
+def _best_of(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("pdf", type=Path)
+    ap.add_argument("--repeat", type=int, default=3)
+    args = ap.parse_args()
+
+    cores = os.cpu_count() or 1
+    counts = [1]
+    while counts[-1] * 2 <= min(cores, pdf_loader.PDF_PARSE_WORKERS):
+        counts.append(counts[-1] * 2)
+
+    # warm the pool so process start-up isn't billed to the first run
+    if counts[-1] > 1:
+        pdf_loader.extract_pdf_text_by_page(args.pdf, workers=counts[-1])
+
+    pages = len(pdf_loader.extract_pdf_text_by_page(args.pdf, workers=1))
+    print(f"{args.pdf.name}: {pages} pages, {cores} cores")
+
+    base = None
+    for n in counts:
+        dt = _best_of(lambda: pdf_loader.extract_pdf_text_by_page(args.pdf, workers=n), args.repeat)
+        base = base or dt
+        print(f"  workers={n:<3} {dt:7.2f}s  {pages / dt:8.1f} pages/s  speedup x{base / dt:.2f}")
+
+
+if __name__ == "__main__":
+    main()
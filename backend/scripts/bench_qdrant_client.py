@@ -0,0 +1,50 @@
+"""
+Per-request Qdrant overhead: a fresh QdrantClient per call (old behaviour)
+vs the shared, pooled client from services.qdrant_admin.
+
+Usage (from backend/, with QDRANT_URL pointing at a running Qdrant):
+    python -m scripts.bench_qdrant_client [--n 200]
+
+Each iteration does one exact count on the configured collection, which is
+what /documents and /ingest do per file.
+"""
+import argparse
+import statistics
+import time
+
+from qdrant_client import QdrantClient
+
+from app.config import settings
+from app.services.qdrant_admin import qdrant_client
+
+
+def _count(client: QdrantClient) -> None:
+    client.count(collection_name=settings.collection_name, exact=True)
+
+
+def _run(label: str, get_client, n: int) -> None:
+    samples = []
+    for _ in range(n):
+        t0 = time.perf_counter()
+        _count(get_client())
+        samples.append((time.perf_counter() - t0) * 1000)
+
+    samples.sort()
+    p50 = statistics.median(samples)
+    p99 = samples[min(len(samples) - 1, int(len(samples) * 0.99))]
+    print(f"  {label:<10} p50={p50:7.2f} ms  p99={p99:7.2f} ms  mean={statistics.fmean(samples):7.2f} ms")
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--n", type=int, default=200)
+    args = ap.parse_args()
+
+    print(f"{settings.qdrant_url} collection={settings.collection_name} n={args.n}")
+    _run("fresh", lambda: QdrantClient(url=settings.qdrant_url), args.n)
+    qdrant_client()  # warm up
+    _run("shared", qdrant_client, args.n)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+SSE framing cost per streamed answer: one json.dumps frame per token with
+`answer += token` (old behaviour) vs services.sse.TokenCoalescer.
+
+Usage (from backend/):
+    python -m scripts.bench_sse [--tokens 2000] [--interval-ms 0] [--flush-ms 50] [--flush-bytes 256]
+
+Tokens are synthetic 2-8 character chunks, roughly what Gemini streams.
+--interval-ms sleeps between tokens to mimic generation speed (the
+flush_ms window only matters then).
+"""
+import argparse
+import json
+import random
+import time
+
+from app.services.sse import TokenCoalescer
+
+
+def _tokens(n: int):
+    rnd = random.Random(0)
+    words = "the quarterly report shows revenue growth of 12% across all regions".split()
+    return [rnd.choice(words)[: rnd.randint(2, 8)] + " " for _ in range(n)]
+
+
+def _old(tokens, interval):
+    frames, out, answer = 0, 0, ""
+    for tok in tokens:
+        if interval:
+            time.sleep(interval)
+        answer += tok
+        out += len(f"data: {json.dumps({'type': 'token', 'token': tok}, ensure_ascii=False)}\n\n".encode("utf-8"))
+        frames += 1
+    return frames, out, len(answer)
+
+
+def _new(tokens, interval, flush_ms, flush_bytes):
+    co = TokenCoalescer(flush_ms=flush_ms, flush_bytes=flush_bytes)
+    out = 0
+    for tok in tokens:
+        if interval:
+            time.sleep(interval)
+        frame = co.add(tok)
+        if frame:
+            out += len(frame)
+    frame = co.flush()
+    if frame:
+        out += len(frame)
+    return co.frames, out, len(co.text())
+
+
+def _run(label, fn):
+    c0, w0 = time.process_time(), time.perf_counter()
+    frames, nbytes, chars = fn()
+    cpu, wall = (time.process_time() - c0) * 1000, (time.perf_counter() - w0) * 1000
+    print(f"  {label:<10} frames={frames:6d}  bytes={nbytes:8d}  cpu={cpu:8.2f} ms  wall={wall:8.2f} ms  chars={chars}")
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--tokens", type=int, default=2000)
+    ap.add_argument("--interval-ms", type=float, default=0.0)
+    ap.add_argument("--flush-ms", type=int, default=50)
+    ap.add_argument("--flush-bytes", type=int, default=256)
+    args = ap.parse_args()
+
+    tokens = _tokens(args.tokens)
+    interval = args.interval_ms / 1000.0
+    print(f"{args.tokens} tokens, interval={args.interval_ms} ms, flush={args.flush_ms} ms / {args.flush_bytes} bytes")
+    _run("per-token", lambda: _old(tokens, interval))
+    _run("coalesced", lambda: _new(tokens, interval, args.flush_ms, args.flush_bytes))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""
+Minimal stand-in for Ollama's /api/generate (streaming and not) that emits
+tokens at a fixed rate, so /chat/stream can be load-tested without a GPU.
+
+Usage (from backend/):
+    python -m scripts.fake_ollama [--port 11500] [--tokens 200] [--interval-ms 20]
+then run the backend with OLLAMA_BASE_URL=http://127.0.0.1:11500 LLM_PROVIDER=ollama.
+"""
+import argparse
+import asyncio
+import json
+
+import uvicorn
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+
+ARGS = argparse.Namespace(tokens=200, interval_ms=20.0)
+
+
+async def generate(request: Request):
+    body = await request.json()
+    n = min(ARGS.tokens, int((body.get("options") or {}).get("num_predict") or ARGS.tokens))
+
+    if not body.get("stream", True):
+        await asyncio.sleep(n * ARGS.interval_ms / 1000.0)
+        return JSONResponse({"response": "lorem " * n, "done": True})
+
+    async def gen():
+        for i in range(n):
+            await asyncio.sleep(ARGS.interval_ms / 1000.0)
+            yield json.dumps({"response": f"tok{i} ", "done": False}) + "\n"
+        yield json.dumps({"response": "", "done": True}) + "\n"
+
+    return StreamingResponse(gen(), media_type="application/x-ndjson")
+
+
+app = Starlette(routes=[Route("/api/generate", generate, methods=["POST"])])
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--port", type=int, default=11500)
+    ap.add_argument("--tokens", type=int, default=200)
+    ap.add_argument("--interval-ms", type=float, default=20.0)
+    args = ap.parse_args()
+    ARGS.tokens, ARGS.interval_ms = args.tokens, args.interval_ms
+    uvicorn.run(app, host="127.0.0.1", port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Concurrent /chat/stream load test: opens N streams at once and reports time
+to first token, total time and failures.
+
+Usage (from backend/, backend running on one worker, e.g. against
+scripts.fake_ollama so the model isn't the bottleneck):
+    python -m scripts.load_test_stream --url http://127.0.0.1:8000 --n 500 \\
+        --question "What is the total revenue?" [--api-key KEY] [--file-id ID]
+
+With the old sync generator, streams beyond the threadpool size (40) queued
+behind each other; now all N should progress together.
+
+Start the backend with LLM_MAX_CONCURRENCY=0 (no admission cap; otherwise
+the Ollama default of 1 serializes generations and LLM_MAX_QUEUE turns the
+rest into 429s). Each stream asks a distinct question, so single-flight
+and the answer cache don't collapse them into one generation; pass
+--shared to send the identical question from every stream instead.
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+
+import httpx
+
+
+async def _one(client: httpx.AsyncClient, url: str, payload: dict, headers: dict) -> dict:
+    t0 = time.perf_counter()
+    ttft = None
+    frames = 0
+    async with client.stream("POST", f"{url}/chat/stream", json=payload, headers=headers) as r:
+        r.raise_for_status()
+        async for line in r.aiter_lines():
+            if not line.startswith("data: "):
+                continue
+            ev = json.loads(line[6:])
+            if ev.get("type") == "token":
+                frames += 1
+                if ttft is None:
+                    ttft = time.perf_counter() - t0
+            elif ev.get("type") == "done":
+                break
+    return {"ttft": ttft, "total": time.perf_counter() - t0, "frames": frames}
+
+
+def _pct(xs, p):
+    xs = sorted(xs)
+    return xs[min(len(xs) - 1, int(len(xs) * p))] if xs else float("nan")
+
+
+def _payload(args, i: int) -> dict:
+    question = args.question if args.shared else f"{args.question} (load test #{i})"
+    payload = {"question": question, "top_k": args.top_k, "max_tokens": args.max_tokens}
+    if args.file_id:
+        payload["file_ids"] = [args.file_id]
+    return payload
+
+
+async def main_async(args):
+    headers = {"X-API-Key": args.api_key} if args.api_key else {}
+
+    limits = httpx.Limits(max_connections=args.n, max_keepalive_connections=args.n)
+    async with httpx.AsyncClient(timeout=httpx.Timeout(600, connect=30), limits=limits) as client:
+        t0 = time.perf_counter()
+        results = await asyncio.gather(
+            *[_one(client, args.url, _payload(args, i), headers) for i in range(args.n)],
+            return_exceptions=True,
+        )
+        wall = time.perf_counter() - t0
+
+    ok = [r for r in results if isinstance(r, dict)]
+    errors = [r for r in results if not isinstance(r, dict)]
+    ttfts = [r["ttft"] for r in ok if r["ttft"] is not None]
+    totals = [r["total"] for r in ok]
+
+    print(f"streams={args.n} ok={len(ok)} failed={len(errors)} wall={wall:.2f}s")
+    if ttfts:
+        print(f"  ttft   p50={statistics.median(ttfts):.3f}s  p95={_pct(ttfts, 0.95):.3f}s  max={max(ttfts):.3f}s")
+    if totals:
+        print(f"  total  p50={statistics.median(totals):.3f}s  p95={_pct(totals, 0.95):.3f}s  max={max(totals):.3f}s")
+    for e in errors[:5]:
+        print(f"  error: {e!r}")
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--url", default="http://127.0.0.1:8000")
+    ap.add_argument("--n", type=int, default=200)
+    ap.add_argument("--question", default="What is this document about?")
+    ap.add_argument("--file-id", default=None)
+    ap.add_argument("--api-key", default=None)
+    ap.add_argument("--top-k", type=int, default=4)
+    ap.add_argument("--max-tokens", type=int, default=256)
+    ap.add_argument("--shared", action="store_true", help="same question from every stream (exercises single-flight)")
+    args = ap.parse_args()
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,31 @@
+import sys
+import tempfile
+import types
+from pathlib import Path
+
+import pytest
+
+BACKEND = Path(__file__).resolve().parents[1]
+if str(BACKEND) not in sys.path:
+    sys.path.insert(0, str(BACKEND))
+
+# Test settings: throwaway data dirs, no external services configured.
+_DATA = Path(tempfile.mkdtemp(prefix="rag-tests-"))
+settings = types.SimpleNamespace(
+    app_data_dir=_DATA,
+    uploads_dir=_DATA / "uploads",
+    parsed_dir=_DATA / "parsed",
+    api_keys_json='{"test-key": "test-tenant"}',
+    llm_provider="ollama",
+    collection_name="test",
+    chunk_size=800,
+    chunk_overlap=100,
+)
+config = types.ModuleType("app.config")
+config.settings = settings
+sys.modules["app.config"] = config
+
+
+@pytest.fixture
+def api_headers():
+    return {"X-API-Key": "test-key"}
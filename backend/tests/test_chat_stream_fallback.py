@@ -0,0 +1,61 @@
+"""
+A model stream that yields no tokens must still send the fallback answer as
+a `token` event (then `final`), like a normal generation.
+"""
+import asyncio
+import json
+from types import SimpleNamespace
+
+import httpx
+from fastapi import FastAPI
+
+from app.api.routes import chat_stream
+from app.services import vectorstore
+
+FALLBACK = "I don't have enough information in the uploaded document(s) to answer that."
+
+
+class _Qdrant:
+    async def query_points(self, **kwargs):
+        point = SimpleNamespace(
+            payload={"page_content": "revenue " * 60, "metadata": {"file_id": "f1", "page": 1, "source": "f1.pdf"}},
+            score=0.9,
+        )
+        return SimpleNamespace(points=[point])
+
+
+async def _no_tokens(prompt, **kwargs):
+    return
+    yield
+
+
+def _events(body: str):
+    return [json.loads(line[6:]) for line in body.splitlines() if line.startswith("data: ")]
+
+
+def test_empty_model_stream_sends_fallback_token(monkeypatch, api_headers):
+    monkeypatch.setattr(chat_stream, "resolve_file_ids", lambda file_ids, tenant_id: None)
+    monkeypatch.setattr(chat_stream, "embed_query", lambda q: [0.1, 0.2])
+    monkeypatch.setattr(chat_stream, "get_answer_cache", lambda: None)
+    monkeypatch.setattr(chat_stream, "get_stream_flights", lambda: None)
+    monkeypatch.setattr(chat_stream, "allm_stream", _no_tokens)
+    monkeypatch.setattr(vectorstore, "async_qdrant_client", lambda: _Qdrant())
+    monkeypatch.setattr(vectorstore, "_VS", object())
+
+    app = FastAPI()
+    app.include_router(chat_stream.router)
+
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            r = await client.post("/chat/stream", json={"question": "What was the revenue?"}, headers=api_headers)
+            return r.status_code, r.text
+
+    status, body = asyncio.run(run())
+    assert status == 200
+
+    events = _events(body)
+    tokens = [e["token"] for e in events if e["type"] == "token"]
+    assert tokens == [FALLBACK]
+    assert [e["type"] for e in events][-2:] == ["final", "done"]
+    assert events[-2]["answer"] == FALLBACK
@@ -1,4 +1,4 @@
-import os, json, requests, html
+import os, json, requests, html, time
 import streamlit as st
 from datetime import datetime
 from typing import List, Dict, Any
@@ -125,9 +125,17 @@ def backend_health() -> bool:
 def cached_get_docs(api_key: str, backend_url: str) -> List[Dict[str, Any]]:
     if not api_key:
         return []
-    r = requests.get(f"{backend_url}/documents", headers=safe_headers(api_key), timeout=30)
-    r.raise_for_status()
-    return r.json().get("docs", [])
+    # /documents is paginated; follow next_cursor until the last page
+    docs: List[Dict[str, Any]] = []
+    params: Dict[str, Any] = {}
+    while True:
+        r = requests.get(f"{backend_url}/documents", headers=safe_headers(api_key), params=params, timeout=30)
+        r.raise_for_status()
+        data = r.json()
+        docs.extend(data.get("docs", []))
+        if not data.get("next_cursor"):
+            return docs
+        params = {"cursor": data["next_cursor"]}
 
 
 def doc_label(d: dict) -> str:
@@ -162,6 +170,26 @@ def fetch_docs_once(api_key: str) -> List[Dict[str, Any]]:
         return []
 
 
+def wait_for_job(job_id: str) -> Dict[str, Any]:
+    """Polls a backend job until it ends, showing its progress in the sidebar."""
+    status_box = st.sidebar.empty()
+    status_box.info("Queued…")
+    job: Dict[str, Any] = {"status": "queued"}
+    while job.get("status") in ("queued", "running"):
+        time.sleep(1.0)
+        r = requests.get(f"{BACKEND_URL}/jobs/{job_id}", headers=safe_headers(api_key), timeout=30)
+        if r.status_code != 200:
+            st.sidebar.error(r.text)
+            st.stop()
+        job = r.json()
+        status_box.info(
+            f"{job['status']}: {job.get('pages_parsed', 0)} pages parsed, "
+            f"{job.get('chunks_embedded', 0)} chunks embedded, {job.get('chunks_upserted', 0)} upserted"
+        )
+    status_box.empty()
+    return job
+
+
 def render_answer_html(text: str) -> str:
     safe = html.escape(text or "").replace("\n", "<br/>")
     return f'<div class="bubble-a">{safe}</div>'
@@ -243,18 +271,26 @@ auto_ingest = st.sidebar.toggle("Auto-ingest after upload", value=True)
 
 if st.sidebar.button("⬆️ Upload PDF", disabled=uploaded is None or not api_key, use_container_width=True):
     files = {"file": (uploaded.name, uploaded.getvalue(), "application/pdf")}
+    # Ingest (if asked) is queued as a background job; the upload returns at once.
     r = requests.post(
         f"{BACKEND_URL}/upload",
-        params={"ingest": str(auto_ingest).lower()},
+        params={"ingest": str(auto_ingest).lower(), "background": str(auto_ingest).lower()},
         files=files,
         headers=headers,
-        timeout=900,
+        timeout=120,
     )
     if r.status_code != 200:
         st.sidebar.error(r.text)
         st.stop()
 
     st.sidebar.success("Uploaded ✅")
+    job_id = r.json().get("job_id")
+    if job_id:
+        job = wait_for_job(job_id)
+        if job.get("status") != "done":
+            st.sidebar.error(job.get("error") or f"Ingest {job.get('status')}")
+            st.stop()
+        st.sidebar.success("Ingested ✅")
     cached_get_docs.clear()
     st.session_state.refresh_key += 1
 
@@ -281,10 +317,16 @@ manage_file_id = label_to_id.get(selected_manage)
 m1, m2 = st.sidebar.columns(2)
 
 if m1.button("📥 Ingest", disabled=not manage_file_id or not api_key, use_container_width=True):
-    r = requests.post(f"{BACKEND_URL}/ingest/{manage_file_id}", headers=headers, timeout=1200)
+    r = requests.post(f"{BACKEND_URL}/jobs/ingest/{manage_file_id}", headers=headers, timeout=30)
     if r.status_code != 200:
         st.sidebar.error(r.text)
         st.stop()
+
+    # Ingest runs as a background job on the backend; poll its progress.
+    job = wait_for_job(r.json()["job_id"])
+    if job.get("status") != "done":
+        st.sidebar.error(job.get("error") or f"Ingest {job.get('status')}")
+        st.stop()
     st.sidebar.success("Ingested ✅")
     cached_get_docs.clear()
     st.session_state.refresh_key += 1
@@ -407,6 +449,13 @@ with left:
                             provider = msg.get("provider", "") or ""
                             model = msg.get("model", "") or ""
 
+                        elif msg.get("type") == "status":
+                            # waiting for a free LLM slot
+                            if msg.get("state") == "queued":
+                                box.info(f"Queued… position {msg.get('position')}")
+                            else:
+                                box.empty()
+
                         elif msg.get("type") == "refused":
                             # backend may also send final after refused
                             warn = (msg.get("answer") or "Refused").strip()